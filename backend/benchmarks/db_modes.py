@@ -0,0 +1,142 @@
+"""Compare GET /api/events throughput with the sync and async database paths.
+
+Each mode runs in its own process (DB_ASYNC is read at import time) against
+the same database, driving the app in-process through httpx's ASGI transport
+with a fixed number of concurrent clients:
+
+    python benchmarks/db_modes.py --database-url postgresql://... --concurrency 50
+
+Without --database-url a throwaway SQLite file is used; that is fine for a
+smoke run, but SQLite serialises access, so use Postgres for real numbers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def seed(events: int):
+    import database
+    import models
+    from routers.auth import create_access_token
+
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.email == "bench@example.com").first()
+        if user is None:
+            user = models.User(
+                email="bench@example.com",
+                hashed_password="x",
+                first_name="Bench",
+                last_name="User",
+                date_of_birth=datetime(1990, 1, 1),
+                sex=models.Sex.OTHER,
+                tennis_level=models.TennisLevel.INTERMEDIATE,
+            )
+            db.add(user)
+            db.flush()
+            start = datetime.utcnow() + timedelta(days=1)
+            for i in range(events):
+                event = models.Event(
+                    court_location=f"Bench Court {i}",
+                    latitude=40.7 + i * 0.001,
+                    longitude=-74.0,
+                    event_date=start + timedelta(hours=i),
+                    event_time=start + timedelta(hours=i),
+                    max_participants=4,
+                    participant_count=1,
+                    organizer_id=user.id,
+                )
+                event.registrations.append(models.EventRegistration(user_id=user.id))
+                db.add(event)
+            db.commit()
+        return create_access_token({"sub": user.email})
+    finally:
+        db.close()
+
+
+async def drive(path: str, token: str, requests: int, concurrency: int, page_size: int):
+    import httpx
+    from main import app
+
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def client_loop(client):
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.get(path, params={"limit": page_size})
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        await client.get(path, params={"limit": page_size})  # warm-up
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+    }
+
+
+def run_worker(args):
+    sys.path.insert(0, BACKEND_DIR)
+    token = seed(args.events)
+    result = asyncio.run(drive("/api/events/", token, args.requests, args.concurrency, args.page_size))
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="database to benchmark against (default: temporary SQLite file)")
+    parser.add_argument("--events", type=int, default=200, help="events to seed if the database is empty")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+    results = {}
+    for mode in ("sync", "async"):
+        env = dict(os.environ, DATABASE_URL=database_url, DB_ASYNC="true" if mode == "async" else "false")
+        env.pop("ASYNC_DATABASE_URL", None)
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker"] + sys.argv[1:],
+            env=env, cwd=BACKEND_DIR, check=True, stdout=subprocess.PIPE, text=True,
+        ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'mode':<6} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode, result in results.items():
+        print(f"{mode:<6} {result['requests']:>8} {result['throughput_rps']:>8} {result['p50_ms']:>8} {result['p99_ms']:>8}")
+
+
+if __name__ == "__main__":
+    main()
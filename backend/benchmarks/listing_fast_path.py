@@ -0,0 +1,149 @@
+"""CPU cost per request of the listing endpoints, ORM path vs the Core/orjson fast path.
+
+Each setting of LISTING_FAST_PATH runs in its own process (it is read at
+import time) against the same seeded database. Every endpoint is requested
+sequentially through httpx's ASGI transport and the process CPU time is
+divided by the request count. The response bodies of both paths are hashed
+so the run also confirms they are byte-identical.
+
+    python benchmarks/listing_fast_path.py --events 100 --registrants 4
+
+Without --database-url a throwaway SQLite file is used.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ENDPOINTS = ("/api/events/", "/api/events/my-events", "/api/events/my-registrations")
+
+
+def seed(events: int, registrants: int, users: int):
+    """The benchmark user organises and attends every event, so all three
+    listings return a full page."""
+    import database
+    import models
+    from routers.auth import create_access_token
+
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        pool = (
+            db.query(models.User)
+            .filter(models.User.email.like("fastpath%@example.com"))
+            .order_by(models.User.id)
+            .all()
+        )
+        if not pool:
+            for i in range(users):
+                pool.append(models.User(
+                    email=f"fastpath{i}@example.com",
+                    hashed_password="x",
+                    first_name=f"Player{i}",
+                    last_name="Bench",
+                    date_of_birth=datetime(1990, 1, 1),
+                    sex=models.Sex.OTHER,
+                    tennis_level=models.TennisLevel.INTERMEDIATE,
+                ))
+            db.add_all(pool)
+            db.flush()
+            start = datetime.utcnow() + timedelta(days=1)
+            for i in range(events):
+                attendees = [pool[0]] + [pool[1 + (i + offset) % (len(pool) - 1)] for offset in range(registrants - 1)]
+                event = models.Event(
+                    court_location=f"Fast Court {i}",
+                    latitude=40.7 + i * 0.001,
+                    longitude=-74.0,
+                    event_date=start + timedelta(hours=i),
+                    event_time=start + timedelta(hours=i),
+                    max_participants=registrants + 2,
+                    participant_count=len(attendees),
+                    description="Singles ladder match",
+                    organizer_id=pool[0].id,
+                )
+                for attendee in attendees:
+                    event.registrations.append(models.EventRegistration(user_id=attendee.id))
+                db.add(event)
+            db.commit()
+        return create_access_token({"sub": pool[0].email, "uid": pool[0].id})
+    finally:
+        db.close()
+
+
+async def drive(token: str, requests: int, page_size: int) -> dict:
+    import httpx
+    from main import app
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        for path in ENDPOINTS:
+            params = {"limit": page_size}
+            body = (await client.get(path, params=params)).content  # warm-up
+            cpu_started = time.process_time()
+            started = time.perf_counter()
+            for _ in range(requests):
+                response = await client.get(path, params=params)
+                response.raise_for_status()
+            elapsed = time.perf_counter() - started
+            cpu = time.process_time() - cpu_started
+            results[path] = {
+                "cpu_ms": round(cpu / requests * 1000, 2),
+                "wall_ms": round(elapsed / requests * 1000, 2),
+                "bytes": len(body),
+                "sha256": hashlib.sha256(body).hexdigest(),
+            }
+    return results
+
+
+def run_worker(args):
+    sys.path.insert(0, BACKEND_DIR)
+    token = seed(args.events, args.registrants, args.users)
+    result = asyncio.run(drive(token, args.requests, args.events))
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="database to benchmark against (default: temporary SQLite file)")
+    parser.add_argument("--events", type=int, default=100, help="events seeded and page size (max 100)")
+    parser.add_argument("--registrants", type=int, default=4, help="registrations per event")
+    parser.add_argument("--users", type=int, default=40, help="size of the registrant pool")
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+    results = {}
+    for mode, setting in (("orm", "false"), ("fast", "true")):
+        env = dict(os.environ, DATABASE_URL=database_url, LISTING_FAST_PATH=setting)
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker"] + sys.argv[1:],
+            env=env, cwd=BACKEND_DIR, check=True, stdout=subprocess.PIPE, text=True,
+        ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'endpoint':<30} {'orm cpu ms':>10} {'fast cpu ms':>11} {'orm wall ms':>11} {'fast wall ms':>12} {'bytes':>8} identical")
+    for path in ENDPOINTS:
+        orm, fast = results["orm"][path], results["fast"][path]
+        identical = "yes" if orm["sha256"] == fast["sha256"] else "NO"
+        print(f"{path:<30} {orm['cpu_ms']:>10} {fast['cpu_ms']:>11} {orm['wall_ms']:>11} {fast['wall_ms']:>12} {fast['bytes']:>8} {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""Load test: a realistic request mix against a running server, with a baseline gate.
+
+Starts the app under uvicorn on a local port against a scratch database (a
+throwaway SQLite file unless --database-url is given) and points the
+geocode proxy at a LocationIQ stub served by a second uvicorn process with
+a fixed delay. After seeding users and events, every simulated user logs
+in and then loops over a weighted mix until --duration runs out:
+
+    dashboard         GET  /api/events/?limit=20
+    my-registrations  GET  /api/events/my-registrations
+    nearby            GET  /api/events/nearby
+    register          POST /api/events/{id}/register, or a withdrawal from an earlier one
+    create-event      POST /api/events/
+    geocode           GET  /api/geocode (Zipf-distributed queries, so the cache sees repeats)
+
+The report lists throughput and p50/p90/p99 latency per endpoint, ignoring
+the first --warmup seconds. --save-baseline stores the report as JSON;
+--baseline compares against a stored report and exits 1 when an endpoint's
+p99 latency (given enough samples) or throughput is more than --tolerance
+worse, or any request failed with a 5xx or a connection error:
+
+    python benchmarks/load_test.py --users 50 --duration 30 --save-baseline load_baseline.json
+    python benchmarks/load_test.py --users 50 --duration 30 --baseline load_baseline.json
+
+Baselines are only comparable on the same machine, database and settings.
+Server settings (DB_ASYNC, BCRYPT_ROUNDS, ...) are taken from the
+environment.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs
+
+import httpx
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BENCHMARKS_DIR = os.path.abspath(os.path.dirname(__file__))
+
+PASSWORD = "load-test"
+MIX = (
+    ("dashboard", 40),
+    ("my-registrations", 10),
+    ("nearby", 10),
+    ("register", 15),
+    ("create-event", 5),
+    ("geocode", 20),
+)
+# Where seeded events cluster (city centres), with a spread in degrees
+CLUSTERS = ((40.73, -73.99, 0.08), (40.68, -73.94, 0.05), (40.78, -73.97, 0.04), (40.85, -73.87, 0.06))
+STREETS = ("Park", "Court", "Tennis", "Riverside", "Hudson", "Ocean", "Forest", "Lake", "Hill", "Bay")
+
+# Below this many requests p99 is close to the maximum and too noisy to gate on
+MIN_P99_SAMPLES = 100
+
+STUB_DELAY = float(os.getenv("GEOCODE_STUB_DELAY_MS", "80")) / 1000
+
+
+async def stub_app(scope, receive, send):
+    """LocationIQ stand-in: one result per query after a fixed delay."""
+    if scope["type"] != "http":
+        return
+    await asyncio.sleep(STUB_DELAY)
+    query = parse_qs(scope["query_string"].decode()).get("q", [""])[0]
+    body = json.dumps([{"display_name": f"{query}, New York, NY, USA", "lat": "40.73", "lon": "-73.99"}])
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": body.encode()})
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app: str, port: int, env: dict, workers: int = 1, app_dir: str = BACKEND_DIR) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--app-dir", app_dir, "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        env=env, cwd=BACKEND_DIR,
+    )
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"server for {url} exited with {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit(f"server for {url} did not start within {timeout}s")
+
+
+def seed(users: int, events: int, rng: random.Random):
+    """Users ``loaduser{i}@example.com`` and upcoming events around the
+    clusters; an existing seed in the database is reused."""
+    sys.path.insert(0, BACKEND_DIR)
+    from sqlalchemy import insert, text
+
+    import database
+    import geo
+    import models
+    from passwords import pwd_context
+
+    models.Base.metadata.create_all(bind=database.engine)
+    with database.engine.begin() as conn:
+        if conn.execute(text("SELECT count(*) FROM users WHERE email LIKE 'loaduser%'")).scalar() < users:
+            now = datetime.utcnow()
+            hashed = pwd_context.hash(PASSWORD)
+            conn.execute(insert(models.User), [
+                {
+                    "email": f"loaduser{i}@example.com", "hashed_password": hashed,
+                    "first_name": "Load", "last_name": str(i), "date_of_birth": datetime(1990, 1, 1),
+                    "sex": rng.choice(list(models.Sex)), "tennis_level": rng.choice(list(models.TennisLevel)),
+                    "is_active": True, "created_at": now,
+                }
+                for i in range(users)
+            ])
+            organizers = conn.execute(text("SELECT id FROM users WHERE email LIKE 'loaduser%'")).scalars().all()
+            rows = []
+            for i in range(events):
+                lat, lon, spread = rng.choice(CLUSTERS)
+                lat, lon = lat + rng.gauss(0, spread), lon + rng.gauss(0, spread)
+                when = now + timedelta(hours=rng.randint(1, 24 * 60))
+                rows.append({
+                    "court_location": f"{rng.choice(STREETS)} Court {i}", "latitude": lat, "longitude": lon,
+                    "geohash": geo.encode(lat, lon), "event_date": when, "event_time": when,
+                    "max_participants": rng.choice((2, 4, 4, 6, 8, 12)), "participant_count": 0,
+                    "is_cancelled": False, "created_at": now, "organizer_id": rng.choice(organizers),
+                })
+            conn.execute(insert(models.Event), rows)
+        event_ids = conn.execute(text("SELECT id FROM events WHERE NOT is_cancelled")).scalars().all()
+    database.engine.dispose()
+    return event_ids
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class Recorder:
+    def __init__(self, measure_from: float):
+        self.measure_from = measure_from
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.rejected = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        elapsed = time.perf_counter() - started
+        if started >= self.measure_from:
+            self.latencies[name].append(elapsed)
+            if response is None or response.status_code >= 500:
+                self.errors[name] += 1
+            elif response.status_code >= 400:
+                self.rejected[name] += 1  # full event, already registered, ...
+        return response
+
+    def report(self, seconds: float) -> dict:
+        endpoints = {}
+        for name, latencies in sorted(self.latencies.items()):
+            latencies.sort()
+            endpoints[name] = {
+                "requests": len(latencies),
+                "errors": self.errors[name],
+                "rejected": self.rejected[name],
+                "throughput_rps": round(len(latencies) / seconds, 1),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+                "p90_ms": round(percentile(latencies, 0.90) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+                "max_ms": round(latencies[-1] * 1000, 2),
+            }
+        return endpoints
+
+
+GEOCODE_QUERIES = [f"{number} {street} Ave" for number in range(1, 41) for street in STREETS]
+GEOCODE_CUM_WEIGHTS = []
+for rank in range(1, len(GEOCODE_QUERIES) + 1):  # Zipf: a few addresses are searched far more often
+    GEOCODE_CUM_WEIGHTS.append((GEOCODE_CUM_WEIGHTS[-1] if GEOCODE_CUM_WEIGHTS else 0) + 1 / rank)
+
+
+class SimulatedUser:
+    def __init__(self, index: int, client: httpx.AsyncClient, recorder: Recorder, event_ids: list, rng: random.Random):
+        self.index = index
+        self.client = client
+        self.recorder = recorder
+        self.event_ids = event_ids
+        self.rng = rng
+        self.registered = set()
+        self.headers = {}
+
+    async def call(self, name, method, url, **kwargs):
+        return await self.recorder.call(self.client, name, method, url, headers=self.headers, **kwargs)
+
+    async def login(self):
+        response = await self.call(
+            "POST /api/auth/token", "POST", "/api/auth/token",
+            data={"username": f"loaduser{self.index}@example.com", "password": PASSWORD},
+        )
+        if response is None:
+            raise SystemExit(f"login for loaduser{self.index} failed to connect")
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def run(self, until: float):
+        actions, weights = zip(*MIX)
+        while time.perf_counter() < until:
+            action = self.rng.choices(actions, weights)[0]
+            await getattr(self, action.replace("-", "_"))()
+
+    async def dashboard(self):
+        await self.call("GET /api/events/", "GET", "/api/events/", params={"limit": 20})
+
+    async def my_registrations(self):
+        await self.call("GET /api/events/my-registrations", "GET", "/api/events/my-registrations", params={"limit": 20})
+
+    async def nearby(self):
+        lat, lon, spread = self.rng.choice(CLUSTERS)
+        await self.call("GET /api/events/nearby", "GET", "/api/events/nearby", params={
+            "latitude": round(lat + self.rng.gauss(0, spread), 4),
+            "longitude": round(lon + self.rng.gauss(0, spread), 4),
+            "radius_km": self.rng.choice((2, 5, 10)),
+        })
+
+    async def register(self):
+        if self.registered and self.rng.random() < 0.4:
+            event_id = self.rng.choice(sorted(self.registered))
+            self.registered.discard(event_id)
+            await self.call(
+                "POST /api/events/{id}/register?is_withdraw", "POST", f"/api/events/{event_id}/register",
+                params={"is_withdraw": "true"},
+            )
+            return
+        event_id = self.rng.choice(self.event_ids)
+        response = await self.call("POST /api/events/{id}/register", "POST", f"/api/events/{event_id}/register")
+        if response is not None and response.status_code == 200:
+            self.registered.add(event_id)
+
+    async def create_event(self):
+        lat, lon, spread = self.rng.choice(CLUSTERS)
+        when = (datetime.utcnow() + timedelta(days=self.rng.randint(1, 30))).isoformat()
+        response = await self.call("POST /api/events/", "POST", "/api/events/", json={
+            "court_location": f"{self.rng.choice(STREETS)} Court", "description": "Load test match",
+            "latitude": lat + self.rng.gauss(0, spread), "longitude": lon + self.rng.gauss(0, spread),
+            "event_date": when, "event_time": when, "max_participants": self.rng.choice((2, 4, 8)),
+        })
+        if response is not None and response.status_code == 200:
+            self.event_ids.append(response.json()["id"])
+
+    async def geocode(self):
+        query = self.rng.choices(GEOCODE_QUERIES, cum_weights=GEOCODE_CUM_WEIGHTS)[0]
+        await self.call("GET /api/geocode", "GET", "/api/geocode", params={"query": query})
+
+
+async def drive(base_url: str, args, event_ids: list) -> dict:
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        login_recorder = Recorder(0)
+        users = [
+            SimulatedUser(i, client, login_recorder, event_ids, random.Random(args.seed + i))
+            for i in range(args.users)
+        ]
+        started = time.perf_counter()
+        await asyncio.gather(*(user.login() for user in users))
+        login = login_recorder.report(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        recorder = Recorder(started + args.warmup)
+        for user in users:
+            user.recorder = recorder
+        await asyncio.gather(*(user.run(started + args.warmup + args.duration) for user in users))
+        measured = time.perf_counter() - started - args.warmup
+
+    endpoints = {**login, **recorder.report(measured)}
+    requests = sum(result["requests"] for name, result in endpoints.items() if name not in login)
+    return {
+        "settings": {"users": args.users, "duration": args.duration, "events": args.events,
+                     "workers": args.workers, "db_async": os.getenv("DB_ASYNC", "false")},
+        "throughput_rps": round(requests / measured, 1),
+        "endpoints": endpoints,
+    }
+
+
+def print_report(result: dict, baseline: dict = None):
+    print(f"{'endpoint':<46} {'requests':>8} {'err':>4} {'4xx':>5} {'req/s':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, row in result["endpoints"].items():
+        line = (f"{name:<46} {row['requests']:>8} {row['errors']:>4} {row['rejected']:>5} {row['throughput_rps']:>7} "
+                f"{row['p50_ms']:>8} {row['p90_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8}")
+        base = (baseline or {}).get("endpoints", {}).get(name)
+        if base:
+            line += f"   p99 {change(base['p99_ms'], row['p99_ms'])}, req/s {change(base['throughput_rps'], row['throughput_rps'])}"
+        print(line)
+    total = f"total {result['throughput_rps']} req/s"
+    if baseline:
+        total += f" ({change(baseline['throughput_rps'], result['throughput_rps'])} vs baseline)"
+    print(total)
+
+
+def change(before: float, after: float) -> str:
+    return f"{(after - before) / before * 100:+.0f}%" if before else "n/a"
+
+
+def regressions(result: dict, baseline: dict, tolerance: float) -> list:
+    problems = []
+    if baseline["settings"] != result["settings"]:
+        print(f"warning: baseline settings {baseline['settings']} differ from this run's {result['settings']}")
+    for name, row in result["endpoints"].items():
+        if row["errors"]:
+            problems.append(f"{name}: {row['errors']} failed requests")
+        base = baseline["endpoints"].get(name)
+        if base is None or name == "POST /api/auth/token":  # logins only run once per user
+            continue
+        enough_samples = min(row["requests"], base["requests"]) >= MIN_P99_SAMPLES
+        if enough_samples and row["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+            problems.append(f"{name}: p99 {row['p99_ms']} ms vs baseline {base['p99_ms']} ms")
+        if row["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            problems.append(f"{name}: {row['throughput_rps']} req/s vs baseline {base['throughput_rps']} req/s")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="scratch database to run against (default: temporary SQLite file)")
+    parser.add_argument("--users", type=int, default=50, help="simulated users, all active at once")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds run before measuring")
+    parser.add_argument("--events", type=int, default=5000, help="events to seed")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the data and the mix")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--save-baseline", help="write this run's report here")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p99/throughput regression (fraction)")
+    args = parser.parse_args()
+
+    database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "load.db")
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    event_ids = seed(max(args.users, 200), args.events, random.Random(args.seed))
+
+    stub_port, app_port = free_port(), free_port()
+    # Every simulated user logs in at once before the measured run
+    env = dict(os.environ, LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"), DATABASE_REPLICA_URL="",
+               LOCATIONIQ_URL=f"http://127.0.0.1:{stub_port}/v1/autocomplete",
+               PASSWORD_HASH_MAX_PENDING=os.getenv("PASSWORD_HASH_MAX_PENDING", str(max(args.users, 32))))
+    stub = start_server("load_test:stub_app", stub_port, env, app_dir=BENCHMARKS_DIR)
+    server = start_server("main:app", app_port, env, workers=args.workers)
+    try:
+        wait_until_up(f"http://127.0.0.1:{stub_port}/", stub)
+        wait_until_up(f"http://127.0.0.1:{app_port}/", server)
+        result = asyncio.run(drive(f"http://127.0.0.1:{app_port}", args, event_ids))
+    finally:
+        for process in (server, stub):
+            process.terminate()
+            process.wait()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"baseline written to {args.save_baseline}")
+    if baseline:
+        problems = regressions(result, baseline, args.tolerance)
+        for problem in problems:
+            print("REGRESSION " + problem)
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
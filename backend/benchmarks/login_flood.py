@@ -0,0 +1,132 @@
+"""Measure login throughput and the latency of unrelated requests during a login flood.
+
+Compares password hashing inline on the event loop (PASSWORD_HASH_WORKERS=0,
+the old behaviour) with the dedicated hashing pool. Each setting runs in its
+own process because the pool is configured at import time:
+
+    python benchmarks/login_flood.py --workers 0 2 4 --logins 200 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def seed(users: int):
+    import database
+    import models
+    from passwords import pwd_context
+
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        if db.query(models.User).filter(models.User.email.like("flood%@example.com")).count() < users:
+            hashed = pwd_context.hash("flood-password")
+            for i in range(users):
+                db.add(models.User(
+                    email=f"flood{i}@example.com",
+                    hashed_password=hashed,
+                    first_name="Flood",
+                    last_name=str(i),
+                    date_of_birth=datetime(1990, 1, 1),
+                    sex=models.Sex.OTHER,
+                    tennis_level=models.TennisLevel.BEGINNER,
+                ))
+            db.commit()
+    finally:
+        db.close()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def drive(logins: int, concurrency: int, users: int):
+    import httpx
+    from main import app
+
+    login_latencies = []
+    probe_latencies = []
+    remaining = list(range(logins))
+    done = asyncio.Event()
+
+    async def login_loop(client):
+        while remaining:
+            i = remaining.pop()
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/auth/token",
+                data={"username": f"flood{i % users}@example.com", "password": "flood-password"},
+            )
+            login_latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    async def probe_loop(client):
+        # An unrelated, cheap endpoint hit on a fixed schedule while logins are
+        # running. Latency is measured from the scheduled send time, so time
+        # the event loop spent blocked before the request went out counts too.
+        scheduled = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            (await client.get("/")).raise_for_status()
+            probe_latencies.append(time.perf_counter() - scheduled)
+            scheduled = max(scheduled + 0.01, time.perf_counter())
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        probe = asyncio.ensure_future(probe_loop(client))
+        started = time.perf_counter()
+        await asyncio.gather(*(login_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe
+
+    return {
+        "logins_per_s": round(len(login_latencies) / elapsed, 1),
+        "login_p99_ms": round(percentile(login_latencies, 0.99) * 1000, 1),
+        "other_p50_ms": round(statistics.median(probe_latencies) * 1000, 2),
+        "other_p99_ms": round(percentile(probe_latencies, 0.99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="database to use (default: temporary SQLite file)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2], help="PASSWORD_HASH_WORKERS settings to compare")
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        sys.path.insert(0, BACKEND_DIR)
+        seed(args.users)
+        print(json.dumps(asyncio.run(drive(args.logins, args.concurrency, args.users))))
+        return
+
+    database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    print(f"{'workers':<8} {'logins/s':>9} {'login p99':>10} {'other p50':>10} {'other p99':>10}")
+    for workers in args.workers:
+        env = dict(os.environ, DATABASE_URL=database_url, PASSWORD_HASH_WORKERS=str(workers))
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker"] + sys.argv[1:],
+            env=env, cwd=BACKEND_DIR, check=True, stdout=subprocess.PIPE, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        label = "inline" if workers == 0 else str(workers)
+        print(f"{label:<8} {result['logins_per_s']:>9} {result['login_p99_ms']:>10} "
+              f"{result['other_p50_ms']:>10} {result['other_p99_ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Compare the full and compact (?format=compact) event listing shapes.
+
+Seeds a page worth of events whose registrants are drawn from a shared pool
+of users, then reports for one page of GET /api/events:
+
+* response size in bytes,
+* validation + JSON serialisation time of the loaded page, per shape,
+* end-to-end request latency through the app (httpx ASGI transport).
+
+    python benchmarks/payload_shapes.py --events 100 --registrants 4 --users 40
+
+Without --database-url a throwaway SQLite file is used.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def seed(events: int, registrants: int, users: int):
+    import database
+    import models
+    from routers.auth import create_access_token
+
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        pool = db.query(models.User).filter(models.User.email.like("shape%@example.com")).all()
+        if not pool:
+            for i in range(users):
+                pool.append(models.User(
+                    email=f"shape{i}@example.com",
+                    hashed_password="x",
+                    first_name=f"Player{i}",
+                    last_name="Bench",
+                    date_of_birth=datetime(1990, 1, 1),
+                    sex=models.Sex.OTHER,
+                    tennis_level=models.TennisLevel.INTERMEDIATE,
+                    profile_image=f"profile_{i}_0123456789abcdef0123456789abcdef.jpg",
+                ))
+            db.add_all(pool)
+            db.flush()
+            start = datetime.utcnow() + timedelta(days=1)
+            for i in range(events):
+                organizer = pool[i % len(pool)]
+                attendees = [pool[(i + offset) % len(pool)] for offset in range(min(registrants, len(pool)))]
+                event = models.Event(
+                    court_location=f"Shape Court {i}",
+                    latitude=40.7 + i * 0.001,
+                    longitude=-74.0,
+                    event_date=start + timedelta(hours=i),
+                    event_time=start + timedelta(hours=i),
+                    max_participants=registrants + 2,
+                    participant_count=len(attendees),
+                    description="Friendly doubles, bring a can of balls",
+                    organizer_id=organizer.id,
+                )
+                for attendee in attendees:
+                    event.registrations.append(models.EventRegistration(user_id=attendee.id))
+                db.add(event)
+            db.commit()
+        return create_access_token({"sub": pool[0].email, "uid": pool[0].id})
+    finally:
+        db.close()
+
+
+def time_serialisation(events: int, rounds: int) -> dict:
+    from pydantic import TypeAdapter
+
+    import database
+    import models
+    import schemas
+    from routers.events import compact_listing, with_registrations
+
+    db = database.SessionLocal()
+    try:
+        page = (
+            db.query(models.Event)
+            .options(with_registrations())
+            .filter(models.Event.is_cancelled == False)
+            .order_by(models.Event.event_date, models.Event.id)
+            .limit(events)
+            .all()
+        )
+        shapes = {
+            "full": (TypeAdapter(List[schemas.EventWithRegistrations]), lambda: page),
+            "compact": (TypeAdapter(schemas.CompactEventList), lambda: compact_listing(page)),
+        }
+        results = {}
+        for name, (adapter, content) in shapes.items():
+            timings = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                body = adapter.dump_json(adapter.validate_python(content()))
+                timings.append(time.perf_counter() - started)
+            results[name] = {"bytes": len(body), "serialise_ms": round(statistics.median(timings) * 1000, 2)}
+        return results
+    finally:
+        db.close()
+
+
+async def time_requests(token: str, events: int, rounds: int) -> dict:
+    import httpx
+    from main import app
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        for name in ("full", "compact"):
+            params = {"limit": events, "format": name}
+            await client.get("/api/events/", params=params)  # warm-up
+            timings = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                response = await client.get("/api/events/", params=params)
+                timings.append(time.perf_counter() - started)
+                response.raise_for_status()
+            results[name] = {"request_ms": round(statistics.median(timings) * 1000, 2)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="database to benchmark against (default: temporary SQLite file)")
+    parser.add_argument("--events", type=int, default=100, help="events per page (max 100)")
+    parser.add_argument("--registrants", type=int, default=4, help="registrations per event")
+    parser.add_argument("--users", type=int, default=40, help="size of the registrant pool")
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    sys.path.insert(0, BACKEND_DIR)
+
+    token = seed(args.events, args.registrants, args.users)
+    results = time_serialisation(args.events, args.rounds)
+    for name, timing in asyncio.run(time_requests(token, args.events, args.rounds)).items():
+        results[name].update(timing)
+
+    print(f"{'shape':<8} {'bytes':>9} {'serialise ms':>13} {'request ms':>11}")
+    for name, result in results.items():
+        print(f"{name:<8} {result['bytes']:>9} {result['serialise_ms']:>13} {result['request_ms']:>11}")
+    full, compact = results["full"], results["compact"]
+    print(f"compact is {compact['bytes'] / full['bytes']:.0%} of the full payload, "
+          f"serialised in {compact['serialise_ms'] / full['serialise_ms']:.0%} of the time")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Live event updates pushed to open ``GET /api/events/stream`` connections.
+
+Handlers describe what they changed with a small delta (event created or
+cancelled, a registration added or removed with the new participant count)
+and queue it on their session with ``publish``. It goes out only if that
+transaction commits, so subscribers never see a change that rolled back.
+Clients patch their copy of the listing instead of refetching it.
+
+How deltas reach subscribers depends on ``EVENTS_BROADCAST``:
+
+* ``memory`` (default): delivered to this process's subscribers only, which
+  is enough with a single worker;
+* ``postgres``: sent with ``pg_notify`` inside the committing transaction.
+  Every worker LISTENs on its own connection (``BROADCAST_DATABASE_URL``,
+  default ``DATABASE_URL``; it must reach Postgres directly or through a
+  session-mode pooler, not a transaction-mode one) and relays to its
+  subscribers, including the worker that made the change.
+
+A subscriber that falls ``BROADCAST_QUEUE_SIZE`` deltas behind, or whose
+worker lost its LISTEN connection, is sent ``{"type": "resync"}`` and
+should reload the listing.
+"""
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Set
+
+from sqlalchemy import event as sa_event, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+import database
+import logs
+import models
+import schemas
+
+EVENTS_BROADCAST = os.getenv("EVENTS_BROADCAST", "memory").lower()
+BROADCAST_DATABASE_URL = os.getenv("BROADCAST_DATABASE_URL") or database.SQLALCHEMY_DATABASE_URL
+BROADCAST_CHANNEL = os.getenv("BROADCAST_CHANNEL", "racketbuddy_events")
+BROADCAST_QUEUE_SIZE = int(os.getenv("BROADCAST_QUEUE_SIZE", "100"))
+
+# pg_notify payloads must be shorter than 8000 bytes
+MAX_NOTIFY_BYTES = 7999
+LISTEN_RETRY_SECONDS = 5
+
+RESYNC = json.dumps({"type": "resync"})
+
+logger = logs.get_logger("broadcast")
+
+
+# Deltas. Registrations carry the registering user, so a client can add them
+# to the event's participant list as the listing shows it.
+
+def _json(model, value) -> dict:
+    return model.model_validate(value).model_dump(mode="json")
+
+
+def _registration(registration: models.EventRegistration, user: models.User) -> dict:
+    return {
+        **_json(schemas.RegistrationRef, registration),
+        "event_id": registration.event_id,
+        "user": _json(schemas.User, user),
+    }
+
+
+def event_created(event: models.Event, registration: models.EventRegistration, organizer: models.User) -> dict:
+    return {
+        "type": "event_created",
+        "event": {**_json(schemas.Event, event), "registrations": [_registration(registration, organizer)]},
+    }
+
+
+def event_cancelled(event_id: int) -> dict:
+    return {"type": "event_cancelled", "event_id": event_id}
+
+
+def registration_added(registration: models.EventRegistration, user: models.User, participant_count: int) -> dict:
+    return {
+        "type": "registration_added",
+        "event_id": registration.event_id,
+        "participant_count": participant_count,
+        "registration": _registration(registration, user),
+    }
+
+
+def registration_removed(registration: models.EventRegistration, participant_count: Optional[int]) -> dict:
+    return {
+        "type": "registration_removed",
+        "event_id": registration.event_id,
+        "registration_id": registration.id,
+        "user_id": registration.user_id,
+        "participant_count": participant_count,
+    }
+
+
+class Broadcaster:
+    """In-process fan-out to subscriber queues (``EVENTS_BROADCAST=memory``)."""
+
+    def __init__(self):
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self):
+        self._loop = None
+
+    def before_commit(self, session: Session, payloads: List[str]):
+        """Called inside the committing transaction."""
+
+    def after_commit(self, payloads: List[str]):
+        """Called once the transaction committed, from a worker thread or the loop."""
+        loop = self._loop
+        if loop is None:  # not serving (scripts, or a TestClient without lifespan)
+            return
+        for payload in payloads:
+            loop.call_soon_threadsafe(self.deliver, payload)
+
+    def deliver(self, payload: str):
+        """Hand ``payload`` to every subscriber; must run on the event loop."""
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # Too far behind to patch its copy; replace the backlog
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(BROADCAST_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+
+class PostgresBroadcaster(Broadcaster):
+    """``pg_notify`` on commit and a LISTEN connection per worker (``EVENTS_BROADCAST=postgres``)."""
+
+    def __init__(self, url: str, channel: str):
+        super().__init__()
+        self.dsn = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.channel = channel
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await super().start()
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await super().stop()
+
+    def before_commit(self, session: Session, payloads: List[str]):
+        for payload in payloads:
+            if len(payload.encode()) > MAX_NOTIFY_BYTES:
+                payload = RESYNC
+            session.execute(select(func.pg_notify(self.channel, payload)))
+
+    def after_commit(self, payloads: List[str]):
+        pass  # every worker, this one included, gets it through LISTEN
+
+    def _notified(self, connection, pid, channel, payload):
+        self.deliver(payload)
+
+    async def _listen(self):
+        import asyncpg
+
+        reconnecting = False
+        while True:
+            try:
+                connection = await asyncpg.connect(self.dsn)
+            except (OSError, asyncpg.PostgresError) as exc:
+                logger.warning("Broadcast LISTEN connection failed: %s", exc)
+                await asyncio.sleep(LISTEN_RETRY_SECONDS)
+                reconnecting = True
+                continue
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _connection: lost.set())
+            try:
+                await connection.add_listener(self.channel, self._notified)
+                if reconnecting:  # anything sent while disconnected was missed
+                    self.deliver(RESYNC)
+                await lost.wait()
+                logger.warning("Broadcast LISTEN connection lost; reconnecting")
+                reconnecting = True
+            finally:
+                if not connection.is_closed():
+                    await connection.close()
+
+
+if EVENTS_BROADCAST == "postgres":
+    broadcaster: Broadcaster = PostgresBroadcaster(BROADCAST_DATABASE_URL, BROADCAST_CHANNEL)
+elif EVENTS_BROADCAST == "memory":
+    broadcaster = Broadcaster()
+else:
+    raise ValueError(f"EVENTS_BROADCAST must be memory or postgres, not {EVENTS_BROADCAST!r}")
+
+
+def publish(db: Session, delta: dict):
+    """Send ``delta`` to stream subscribers once ``db``'s transaction commits.
+
+    Queue it after the flush that assigns the ids it mentions; on Postgres it
+    is notified from within the commit.
+    """
+    db.info.setdefault("broadcasts", []).append(json.dumps(delta, separators=(",", ":")))
+
+
+@sa_event.listens_for(Session, "before_commit")
+def _notify_in_transaction(session):
+    payloads = session.info.get("broadcasts")
+    if payloads:
+        broadcaster.before_commit(session, payloads)
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _notify_committed(session):
+    payloads = session.info.pop("broadcasts", None)
+    if payloads:
+        broadcaster.after_commit(payloads)
+
+
+@sa_event.listens_for(Session, "after_soft_rollback")
+def _discard(session, previous_transaction):
+    session.info.pop("broadcasts", None)
@@ -43,6 +43,7 @@ def check_and_fix_database():
                     registration_date=datetime.utcnow()
                 )
                 db.add(registration)
+                event.participant_count = (event.participant_count or 0) + 1
                 db.commit()
                 print("  Registration created successfully")
             else:
@@ -0,0 +1,215 @@
+"""Fail if any router query sequentially scans a large table.
+
+Seeds a database (a throwaway SQLite file by default) with enough users,
+events and registrations, drives every listing and write endpoint through
+the app on both listing paths, and captures each statement the routers
+send. Each distinct SELECT/UPDATE/DELETE is then run through EXPLAIN with
+its captured parameters:
+
+* PostgreSQL: ``EXPLAIN (FORMAT JSON)`` with ``enable_seqscan`` off, so a
+  Seq Scan only remains where no index can serve the query;
+* SQLite: ``EXPLAIN QUERY PLAN``, where ``SCAN <table>`` without an index
+  is a full table scan.
+
+    python check_query_plans.py
+    python check_query_plans.py --database-url postgresql://.../racketbuddy_plans
+
+Exits non-zero and prints the offending plans if a scan is found. The
+requests also run with ``QUERY_WATCH=strict``, so a repeated statement or
+a route over its budget in ``querywatch.QUERY_BUDGETS`` fails the run too.
+The database should be a scratch one: the script creates its tables and
+writes seed rows into it.
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# Tables large enough in production that a full scan per request is a bug
+LARGE_TABLES = {"users", "events", "event_registrations"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="scratch database to seed and explain against (default: temporary SQLite file)")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--registrants", type=int, default=4, help="registrations per event")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan, not just failures")
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ["DATABASE_URL"] = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "plans.db")
+os.environ["DB_ASYNC"] = "false"  # statements are captured on the sync engine
+os.environ["DATABASE_REPLICA_URL"] = ""  # ... of the scratch database, not a replica from .env
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ["QUERY_WATCH"] = "strict"
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event as sa_event, insert, text
+
+import database
+import geo
+import listings
+import models
+from passwords import pwd_context
+
+PASSWORD = "plan-check"
+
+
+def seed():
+    models.Base.metadata.create_all(bind=database.engine)
+    with database.engine.begin() as conn:
+        if conn.execute(text("SELECT count(*) FROM users")).scalar():
+            return
+        now = datetime.utcnow()
+        hashed = pwd_context.hash(PASSWORD)
+        conn.execute(insert(models.User), [
+            {
+                "id": i, "email": f"plan{i}@example.com", "hashed_password": hashed,
+                "first_name": "Plan", "last_name": str(i), "date_of_birth": datetime(1990, 1, 1),
+                "sex": models.Sex.OTHER, "tennis_level": models.TennisLevel.INTERMEDIATE,
+                "is_active": True, "created_at": now,
+            }
+            for i in range(1, args.users + 1)
+        ])
+        events, registrations = [], []
+        for i in range(1, args.events + 1):
+            when = now + timedelta(hours=i - args.events // 2)  # half past, half upcoming
+            lat, lon = 40.0 + (i % 100) * 0.01, -74.0 + (i // 100) * 0.01
+            attendees = {1 + (i * 7 + k * 13) % args.users for k in range(args.registrants)}
+            events.append({
+                "id": i, "court_location": f"Court {i}", "latitude": lat, "longitude": lon,
+                "geohash": geo.encode(lat, lon), "event_date": when, "event_time": when,
+                "max_participants": args.registrants + 2, "participant_count": len(attendees),
+                "is_cancelled": i % 10 == 0, "created_at": now, "organizer_id": 1 + i % args.users,
+            })
+            registrations.extend({"event_id": i, "user_id": user_id, "registration_date": now} for user_id in attendees)
+        conn.execute(insert(models.Event), events)
+        conn.execute(insert(models.EventRegistration), registrations)
+        conn.execute(text("ANALYZE"))
+
+
+def exercise(client: TestClient, label):
+    """Drive the endpoints; ``label`` is updated so captured statements can
+    be traced back to the request that sent them."""
+    def call(method, path, **kwargs):
+        label[0] = f"{method} {path}"
+        response = client.request(method, path, **kwargs)
+        assert response.status_code < 500, (path, response.status_code, response.text)
+        return response
+
+    token = call("POST", "/api/auth/token", data={"username": "plan2@example.com", "password": PASSWORD}).json()["access_token"]
+    client.headers["Authorization"] = f"Bearer {token}"
+    upcoming = (datetime.utcnow() + timedelta(days=3)).isoformat()
+
+    for fast_path in (True, False):
+        listings.LISTING_FAST_PATH = fast_path
+        for path in ("/api/events/", "/api/events/my-events", "/api/events/my-registrations"):
+            first = call("GET", path, params={"limit": 20})
+            cursor = first.headers.get("X-Next-Cursor")
+            if cursor:
+                call("GET", path, params={"limit": 20, "cursor": cursor})
+        call("GET", "/api/events/", params={"limit": 20, "format": "compact"})
+        call("GET", "/api/events/", params={
+            "limit": 20, "date_from": upcoming, "open_spots": "true",
+            "organizer_level": "advanced", "exclude_registered": "true",
+        })
+    call("GET", "/api/events/nearby", params={"latitude": 40.3, "longitude": -73.5, "radius_km": 5})
+    call("GET", "/api/events/nearby", params={
+        "min_latitude": 40.2, "max_latitude": 40.4, "min_longitude": -73.6, "max_longitude": -73.4,
+    })
+    call("GET", "/api/users/me")
+    call("GET", "/api/users/me/events")
+    call("PUT", "/api/users/me", params={"first_name": "Planned"})
+
+    created = call("POST", "/api/events/", json={
+        "court_location": "Plan Court", "latitude": 40.5, "longitude": -73.9,
+        "event_date": upcoming, "event_time": upcoming, "max_participants": 4,
+    }).json()
+    other = call("GET", "/api/events/", params={"limit": 1}).json()[0]["id"]
+    call("POST", f"/api/events/{other}/register")
+    call("POST", f"/api/events/{other}/register", params={"is_withdraw": "true"})
+    registration = call("POST", f"/api/events/{other}/register").json()
+    if "id" in registration:
+        call("DELETE", f"/api/events/registrations/{registration['id']}")
+    call("DELETE", f"/api/events/{created['id']}")
+
+
+def capture(statements, label):
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not re.match(r"\s*(SELECT|UPDATE|DELETE)\b", statement, re.IGNORECASE):
+            return
+        statements.setdefault(statement, (label[0], parameters))
+    sa_event.listen(database.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _table(name: str) -> str:
+    return re.sub(r"_\d+$", "", name)  # events_1 -> events
+
+
+def postgres_scans(conn, statement, parameters):
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+    plan = plan[0]["Plan"] if isinstance(plan, list) else plan
+    scans, lines, stack = [], [], [(plan, 0)]
+    while stack:
+        node, depth = stack.pop()
+        relation = node.get("Relation Name")
+        lines.append("  " * depth + node["Node Type"] + (f" on {relation}" if relation else ""))
+        if node["Node Type"] == "Seq Scan" and relation in LARGE_TABLES:
+            scans.append(relation)
+        stack.extend((child, depth + 1) for child in reversed(node.get("Plans", [])))
+    return scans, lines
+
+
+def sqlite_scans(conn, statement, parameters):
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    scans, lines = [], []
+    for row in rows:
+        detail = row[-1]
+        lines.append(detail)
+        match = re.match(r"SCAN (\w+)(?: AS (\w+))?$", detail)
+        if match and _table(match.group(1)) in LARGE_TABLES:
+            scans.append(_table(match.group(1)))
+    return scans, lines
+
+
+def main():
+    seed()
+
+    from main import app
+
+    statements = OrderedDict()
+    label = ["startup"]
+    capture(statements, label)
+    with TestClient(app) as client:
+        exercise(client, label)
+
+    is_postgres = database.engine.dialect.name == "postgresql"
+    failures = 0
+    with database.engine.connect() as conn:
+        if is_postgres:
+            conn.exec_driver_sql("SET enable_seqscan = off")
+        for statement, (source, parameters) in statements.items():
+            explain = postgres_scans if is_postgres else sqlite_scans
+            scans, lines = explain(conn, statement, parameters)
+            if scans:
+                failures += 1
+            if scans or args.verbose:
+                status = "SEQ SCAN on " + ", ".join(sorted(set(scans))) if scans else "ok"
+                print(f"[{status}] {source}")
+                print("    " + " ".join(statement.split()))
+                for line in lines:
+                    print("      " + line)
+        conn.rollback()
+
+    print(f"{len(statements)} statements explained, {failures} with sequential scans on {', '.join(sorted(LARGE_TABLES))}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
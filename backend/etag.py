@@ -0,0 +1,90 @@
+"""Version-based ETags for listings and the current user's profile.
+
+Each write that can change a listing bumps a row in ``change_stamps`` in the
+same transaction. A GET first reads the relevant stamps (one small indexed
+query). When the client's ``If-None-Match`` still matches, the endpoint
+answers 304 and skips loading, hydrating and serialising the payload.
+Stamps are read before the data, so a concurrent write can only cause an
+extra full response, never a stale 304.
+"""
+import hashlib
+from typing import Iterable
+
+from fastapi import Request, Response
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+import models
+
+EVENTS_STAMP = "events"  # events and registrations
+USERS_STAMP = "users"  # user profiles embedded in listings
+
+# Browsers keep the response but revalidate it on every use
+CACHE_CONTROL = "private, no-cache"
+
+
+def bump(db: Session, *names: str):
+    """Advance the given stamps; commits with the caller's transaction.
+
+    The caller's pending changes are flushed first, so every write locks the
+    rows it changes before ``change_stamps`` (the sessions do not autoflush);
+    taking the two in different orders on different paths could deadlock.
+    """
+    db.flush()
+    advance(db, *names)
+
+
+def advance(executor, *names: str):
+    """``bump`` without the flush, on a Session or a Connection (e.g. from a
+    mapper event in the middle of a flush)."""
+    for name in names:
+        result = executor.execute(
+            update(models.ChangeStamp)
+            .where(models.ChangeStamp.name == name)
+            .values(version=models.ChangeStamp.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            executor.execute(insert(models.ChangeStamp).values(name=name, version=1))
+
+
+def read(db: Session, names: Iterable[str]) -> dict:
+    rows = db.execute(
+        select(models.ChangeStamp.name, models.ChangeStamp.version)
+        .where(models.ChangeStamp.name.in_(list(names)))
+    ).all()
+    return dict(rows)
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {value.strip() for value in header.split(",")}
+    return "*" in candidates or etag in candidates or etag[2:] in candidates
+
+
+def check(db: Session, request: Request, response: Response, stamps: Iterable[str], *scope) -> bool:
+    """Set the ETag for a listing on ``response``; True if the client's copy is current.
+
+    ``scope`` distinguishes responses that share stamps (path, query string,
+    user id).
+    """
+    stamps = sorted(stamps)
+    versions = read(db, stamps)
+    etag = make_etag(request.url.path, str(request.url.query), [versions.get(name, 0) for name in stamps], *scope)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return matches(request, etag)
+
+
+def not_modified(response: Response) -> Response:
+    return Response(
+        status_code=304,
+        headers={"ETag": response.headers["ETag"], "Cache-Control": CACHE_CONTROL},
+    )
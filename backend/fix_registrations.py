@@ -26,6 +26,7 @@ def fix_missing_organizer_registrations():
                     registration_date=datetime.utcnow()
                 )
                 db.add(registration)
+                event.participant_count = (event.participant_count or 0) + 1
             else:
                 print(f"Event {event.id} already has organizer registration")
         
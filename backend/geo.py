@@ -0,0 +1,152 @@
+"""Geohash helpers used to index and search events by location.
+
+Events store a geohash of their coordinates in ``Event.geohash``. A radius
+search covers the circle with the cells of a geohash precision fine enough
+that only a few dozen are needed, dropping cells the circle does not reach.
+Those cells become indexed range predicates in SQL, and the candidates are
+then refined with an exact haversine distance.
+"""
+import math
+from typing import List, Optional, Tuple
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9  # ~5m cells, stored on every event
+EARTH_RADIUS_KM = 6371.0088
+
+
+def encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def cell_size_degrees(precision: int) -> Tuple[float, float]:
+    """Return the (height, width) of a geohash cell in degrees."""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Most geohash cells one search may cover; the precision is the finest that
+# keeps the circle's bounding box within this many cells
+MAX_COVERING_CELLS = 64
+
+
+def _wrap_longitude(longitude: float) -> float:
+    return (longitude + 180.0) % 360.0 - 180.0
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lon, max_lon) around the circle; the longitudes
+    wrap, so min_lon > max_lon means the box crosses the antimeridian.
+    Spans covering every longitude come back as -180..180."""
+    lat_span = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(latitude - lat_span, -90.0), min(latitude + lat_span, 90.0)
+    cos_lat = min(math.cos(math.radians(lat)) for lat in (min_lat, max_lat, latitude))
+    if cos_lat <= 0 or lat_span / max(cos_lat, 1e-12) >= 180:
+        return min_lat, max_lat, -180.0, 180.0
+    lon_span = lat_span / cos_lat
+    return min_lat, max_lat, _wrap_longitude(longitude - lon_span), _wrap_longitude(longitude + lon_span)
+
+
+def _meridian_distance_km(latitude: float, longitude: float, meridian: float, south: float, north: float) -> float:
+    """Distance from the point to the meridian ``meridian`` between two latitudes."""
+    dlon = math.radians(meridian - longitude)
+    if math.cos(dlon) > 0:
+        nearest = math.degrees(math.atan(math.tan(math.radians(latitude)) / math.cos(dlon)))
+    else:  # the meridian is on the far side of the globe; closest at the pole
+        nearest = 90.0 if latitude >= 0 else -90.0
+    return haversine_km(latitude, longitude, min(max(nearest, south), north), meridian)
+
+
+def _cell_distance_km(latitude: float, longitude: float, south: float, west: float, height: float, width: float) -> float:
+    """Distance from the point to the nearest point of a cell."""
+    if (longitude - west) % 360.0 <= width:
+        # Within the cell's longitudes: straight along the point's meridian
+        return haversine_km(latitude, longitude, min(max(latitude, south), south + height), longitude)
+    return min(
+        _meridian_distance_km(latitude, longitude, edge, south, south + height)
+        for edge in (west, west + width)
+    )
+
+
+def covering_ranges(latitude: float, longitude: float, radius_km: float) -> List[Tuple[str, Optional[str]]]:
+    """Geohash ranges ``(lower, upper)`` whose cells cover the search circle.
+
+    Uses the finest cells that keep the circle's bounding box within
+    ``MAX_COVERING_CELLS``, skips those the circle does not reach, and merges
+    runs of consecutive cells. A hash ``h`` is in a range when
+    ``lower <= h < upper``; ``upper`` is None when the range runs to the end.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+    lon_extent = 360.0 if (min_lon, max_lon) == (-180.0, 180.0) else (max_lon - min_lon) % 360.0
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size_degrees(precision)
+        first_row = math.floor((min_lat + 90.0) / height)
+        rows = min(math.floor((max_lat + 90.0) / height), round(180.0 / height) - 1) - first_row + 1
+        first_column = math.floor((min_lon + 180.0) / width)
+        columns = min(math.floor(lon_extent / width) + 2, round(360.0 / width))
+        if rows * columns <= MAX_COVERING_CELLS:
+            break
+
+    hashes = set()
+    for row in range(first_row, first_row + rows):
+        south = row * height - 90.0
+        for column in range(first_column, first_column + columns):
+            west = (column * width) % 360.0 - 180.0
+            if _cell_distance_km(latitude, longitude, south, west, height, width) <= radius_km:
+                hashes.add(encode(south + height / 2, west + width / 2, precision))
+
+    ranges: List[Tuple[str, Optional[str]]] = []
+    for cell in sorted(hashes):
+        upper = prefix_upper_bound(cell)
+        # Hashes only use BASE32 characters, so nothing sorts between "dr5s"
+        # and "dr5s0": the next cell after "dr5rz" continues the range
+        if ranges and ranges[-1][1] is not None and cell.rstrip(BASE32[0]) == ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], upper)
+        else:
+            ranges.append((cell, upper))
+    return ranges
+
+
+def prefix_upper_bound(prefix: str):
+    """Smallest geohash string greater than every hash starting with ``prefix``.
+
+    Returns ``None`` when no upper bound exists (prefix of all ``z``).
+    """
+    chars = list(prefix)
+    while chars:
+        index = BASE32.index(chars[-1])
+        if index + 1 < len(BASE32):
+            chars[-1] = BASE32[index + 1]
+            return "".join(chars)
+        chars.pop()
+    return None
@@ -0,0 +1,326 @@
+"""LocationIQ address lookup with caching.
+
+Results are cached per normalised query in a size-bounded in-memory TTL/LRU
+cache, optionally backed by a SQLite file (``GEOCODE_CACHE_DB``) so they
+survive restarts. Concurrent identical lookups share one upstream call.
+
+Upstream calls go through one app-lifetime ``httpx.AsyncClient`` (opened and
+closed by the FastAPI lifespan in ``main.py``) so connections are pooled and
+kept alive instead of paying a TCP+TLS handshake per lookup.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from cache import TTLCache
+import logs
+import metrics
+
+LOCATIONIQ_URL = os.getenv("LOCATIONIQ_URL", 'https://us1.locationiq.com/v1/autocomplete')
+LOCATIONIQ_API_KEY = os.getenv("LOCATIONIQ_API_KEY", 'pk.a77154f1765f87458c4552e06abea27d')
+
+GEOCODE_CACHE_TTL = int(os.getenv("GEOCODE_CACHE_TTL", str(24 * 60 * 60)))
+GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "2048"))
+GEOCODE_CACHE_DB = os.getenv("GEOCODE_CACHE_DB")  # e.g. "geocode_cache.sqlite3"
+
+GEOCODE_TIMEOUT = httpx.Timeout(5.0, connect=2.0)
+GEOCODE_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+
+logger = logs.get_logger("geocoding")
+
+
+class UpstreamError(Exception):
+    """LocationIQ failed; the result must not be cached."""
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def upstream_params(query: str) -> dict:
+    return {
+        'key': LOCATIONIQ_API_KEY,
+        'q': query,
+        'format': 'json',
+        'limit': 10,
+        'addressdetails': 1,
+        'dedupe': 1,
+        'extratags': 1,
+        'namedetails': 1,
+        'layer': 'poi,address,venue',  # Focus on points of interest
+        'countrycodes': 'us',  # Keep US restriction since Impett Park is in US
+        'bounded': 1,  # Enable bounded search
+        'normalizeaddress': 0  # Disable address normalization
+    }
+
+
+def format_results(results: list) -> list:
+    formatted_results = []
+    for result in results:
+        address = result.get('address', {})
+        display_name = []
+
+        # Build a more detailed address
+        if result.get('display_name'):
+            display_name = [result['display_name']]
+        else:
+            # Fallback to building address components
+            if address.get('name'):
+                display_name.append(address['name'])
+            if address.get('road'):
+                display_name.append(address['road'])
+            if address.get('city'):
+                display_name.append(address['city'])
+            elif address.get('town'):
+                display_name.append(address['town'])
+            elif address.get('village'):
+                display_name.append(address['village'])
+            if address.get('state'):
+                display_name.append(address['state'])
+            if address.get('country'):
+                display_name.append(address['country'])
+
+        # If we couldn't build a nice address, use the display_name
+        if not display_name:
+            display_name = [result.get('display_name', '')]
+
+        formatted_results.append({
+            'display_name': ', '.join(display_name),
+            'lat': result.get('lat', ''),
+            'lon': result.get('lon', '')
+        })
+    return formatted_results
+
+
+http_client: Optional[httpx.AsyncClient] = None
+sync_http_client: Optional[httpx.Client] = None
+
+
+def _new_http_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=GEOCODE_TIMEOUT,
+        limits=GEOCODE_LIMITS,
+        headers={'Accept': 'application/json'},
+    )
+
+
+async def start_http_client(transport: Optional[httpx.AsyncBaseTransport] = None):
+    """Open the shared pooled client; ``transport`` lets tests plug in a mock."""
+    global http_client
+    await close_http_client()
+    http_client = _new_http_client(transport)
+
+
+async def close_http_client():
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+
+def _parse_response(response: httpx.Response) -> list:
+    logger.debug("LocationIQ response", extra={"status": response.status_code})
+    if response.status_code != 200:
+        raise UpstreamError(f"Error from LocationIQ: {response.status_code} - {response.text[:200]}")
+    return format_results(response.json())
+
+
+async def fetch_upstream(query: str) -> list:
+    global http_client
+    if http_client is None:
+        http_client = _new_http_client()  # app used without its lifespan (e.g. bare TestClient)
+    try:
+        response = await http_client.get(LOCATIONIQ_URL, params=upstream_params(query))
+    except httpx.HTTPError as e:
+        raise UpstreamError(f"Request error: {str(e)}")
+    return _parse_response(response)
+
+
+def fetch_upstream_sync(query: str) -> list:
+    """Blocking lookup for the serverless handler; the pooled client is reused
+    across warm invocations of the same lambda."""
+    global sync_http_client
+    if sync_http_client is None:
+        sync_http_client = httpx.Client(
+            timeout=GEOCODE_TIMEOUT, limits=GEOCODE_LIMITS, headers={'Accept': 'application/json'}
+        )
+    try:
+        response = sync_http_client.get(LOCATIONIQ_URL, params=upstream_params(query))
+    except httpx.HTTPError as e:
+        raise UpstreamError(f"Request error: {str(e)}")
+    return _parse_response(response)
+
+
+class DiskCache:
+    """SQLite second tier so cached lookups survive restarts."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocode_cache "
+                "(query TEXT PRIMARY KEY, results TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[tuple]:
+        """Return ``(results, seconds_left)`` or None if missing/expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, expires_at FROM geocode_cache WHERE query = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        ttl = row[1] - time.time()
+        if ttl <= 0:
+            return None
+        return json.loads(row[0]), ttl
+
+    def set(self, key: str, results: list, ttl: float):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode_cache (query, results, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(results), time.time() + ttl),
+            )
+            self._conn.execute("DELETE FROM geocode_cache WHERE expires_at < ?", (time.time(),))
+
+
+class GeocodeCache:
+    def __init__(self, maxsize: int, ttl: float, disk_path: Optional[str] = None):
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize, ttl)
+        self.disk = DiskCache(disk_path) if disk_path else None
+        self.disk_hits = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+        self.upstream_seconds = 0.0
+        self._inflight = {}
+
+    def load_from_disk(self, key: str):
+        """Disk-tier lookup; hits are promoted into memory."""
+        entry = self.disk.get(key) if self.disk is not None else None
+        if entry is None:
+            return None
+        results, ttl = entry
+        self.disk_hits += 1
+        self.memory.set(key, results, ttl)
+        return results
+
+    def lookup(self, key: str):
+        results = self.memory.get(key)
+        if results is None:
+            results = self.load_from_disk(key)
+        return results
+
+    def store(self, key: str, results: list):
+        self.memory.set(key, results)
+        if self.disk is not None:
+            self.disk.set(key, results, self.ttl)
+
+    @contextmanager
+    def _upstream_call(self):
+        started = time.perf_counter()
+        self.upstream_calls += 1
+        try:
+            yield
+        except UpstreamError:
+            self.upstream_errors += 1
+            metrics.geocode_upstream_errors.inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.upstream_seconds += elapsed
+            metrics.geocode_upstream_duration.observe(elapsed)
+
+    async def fetch(self, key: str) -> list:
+        with self._upstream_call():
+            results = await fetch_upstream(key)
+        if self.disk is not None:
+            await run_in_threadpool(self.store, key, results)
+        else:
+            self.store(key, results)
+        return results
+
+    def fetch_sync(self, key: str) -> list:
+        with self._upstream_call():
+            results = fetch_upstream_sync(key)
+        self.store(key, results)
+        return results
+
+    async def get(self, query: str) -> list:
+        key = normalize_query(query)
+        results = self.memory.get(key)
+        if results is not None:
+            return results
+        if self.disk is not None:
+            results = await run_in_threadpool(self.load_from_disk, key)
+            if results is not None:
+                return results
+
+        # Coalesce concurrent misses for the same query onto one upstream call
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+        task = asyncio.ensure_future(self.fetch(key))
+        self._inflight[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        memory = self.memory.stats()
+        hits = memory["hits"] + self.disk_hits
+        average_upstream = self.upstream_seconds / self.upstream_calls if self.upstream_calls else 0.0
+        return {
+            "memory": memory,
+            "disk_enabled": self.disk is not None,
+            "disk_hits": self.disk_hits,
+            "coalesced": self.coalesced,
+            "upstream_calls": self.upstream_calls,
+            "upstream_errors": self.upstream_errors,
+            "avg_upstream_ms": round(average_upstream * 1000, 1),
+            # Every hit or coalesced wait is an upstream call (and its quota) saved
+            "upstream_calls_saved": hits + self.coalesced,
+            "estimated_seconds_saved": round((hits + self.coalesced) * average_upstream, 2),
+        }
+
+
+geocode_cache = GeocodeCache(GEOCODE_CACHE_SIZE, GEOCODE_CACHE_TTL, GEOCODE_CACHE_DB)
+
+
+async def geocode(query: str) -> list:
+    """Geocode an address, returning [] if LocationIQ is unavailable."""
+    if not query or not normalize_query(query):
+        return []
+    try:
+        return await geocode_cache.get(query)
+    except UpstreamError as e:
+        logger.warning("Geocoding failed: %s", e)
+        return []
+    except Exception:
+        logger.exception("Unexpected geocoding error")
+        return []
+
+
+def geocode_sync(query: str) -> list:
+    """Blocking variant for the standalone serverless handler (no coalescing)."""
+    key = normalize_query(query)
+    if not key:
+        return []
+    results = geocode_cache.lookup(key)
+    if results is None:
+        results = geocode_cache.fetch_sync(key)
+    return results
@@ -0,0 +1,216 @@
+"""Read-only fast path for the event listings.
+
+The ORM path hydrates an Event, EventRegistration and User object per row
+and then runs everything through the ``from_attributes`` schemas before
+encoding. Here the listings select only the columns the schemas expose
+(SQLAlchemy Core rows, no identity map), build plain dicts in the schemas'
+field order, and encode them with orjson. The bytes are the same as what
+FastAPI's default encoder produces for ``schemas.EventWithRegistrations`` /
+``EventRegistrationResponse``.
+
+``LISTING_FAST_PATH=false`` switches back to the ORM path, which is only
+useful for comparing the two (``benchmarks/listing_fast_path.py``).
+"""
+import json
+import os
+from datetime import datetime
+from typing import Iterable, Optional
+
+from fastapi import Response
+from sqlalchemy.orm import Session
+
+try:
+    import orjson
+except ImportError:  # the standard library encoder produces the same bytes, just slower
+    orjson = None
+
+import models
+from pagination import paginate
+
+LISTING_FAST_PATH = os.getenv("LISTING_FAST_PATH", "true").lower() in ("1", "true", "yes")
+
+# Column order follows the field order of the matching schema
+EVENT_COLUMNS = (
+    models.Event.court_location,
+    models.Event.latitude,
+    models.Event.longitude,
+    models.Event.event_date,
+    models.Event.event_time,
+    models.Event.max_participants,
+    models.Event.description,
+    models.Event.id,
+    models.Event.is_cancelled,
+    models.Event.created_at,
+    models.Event.organizer_id,
+    models.Event.participant_count,
+)
+REGISTRATION_COLUMNS = (
+    models.EventRegistration.event_id,
+    models.EventRegistration.id.label("registration_id"),
+    models.EventRegistration.user_id,
+    models.EventRegistration.registration_date,
+)
+USER_COLUMNS = (
+    models.User.email,
+    models.User.first_name,
+    models.User.last_name,
+    models.User.date_of_birth,
+    models.User.sex,
+    models.User.tennis_level,
+    models.User.id,
+    models.User.is_active,
+    models.User.created_at,
+    models.User.profile_image,
+    models.User.profile_thumbnail,
+)
+
+
+def event_dict(values) -> dict:
+    (court_location, latitude, longitude, event_date, event_time, max_participants,
+     description, event_id, is_cancelled, created_at, organizer_id, participant_count) = values
+    return {
+        "court_location": court_location,
+        "latitude": float(latitude),
+        "longitude": float(longitude),
+        "event_date": event_date,
+        "event_time": event_time,
+        "max_participants": max_participants,
+        "description": description,
+        "id": event_id,
+        "is_cancelled": is_cancelled,
+        "created_at": created_at,
+        "organizer_id": organizer_id,
+        "participant_count": participant_count,
+        "available_spots": models.spots_left(max_participants, participant_count),
+    }
+
+
+def user_dict(values) -> dict:
+    (email, first_name, last_name, date_of_birth, sex, tennis_level,
+     user_id, is_active, created_at, profile_image, profile_thumbnail) = values
+    return {
+        "email": email,
+        "first_name": first_name,
+        "last_name": last_name,
+        "date_of_birth": date_of_birth,
+        "sex": sex,
+        "tennis_level": tennis_level,
+        "id": user_id,
+        "is_active": is_active,
+        "created_at": created_at,
+        "profile_image": profile_image,
+        "profile_thumbnail": profile_thumbnail,
+    }
+
+
+def _isoformat(value):
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _plain_float(value: float) -> bool:
+    # json.dumps writes 1e-05 where orjson writes 1e-5
+    return value == 0 or 1e-4 <= abs(value) < 1e16
+
+
+def render(content, events: Iterable[dict]) -> bytes:
+    if orjson is not None and all(
+        _plain_float(event["latitude"]) and _plain_float(event["longitude"]) for event in events
+    ):
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_isoformat
+    ).encode("utf-8")
+
+
+def json_response(content, events: Iterable[dict], response: Response) -> Response:
+    """Wrap pre-built content, keeping the headers already set on ``response``
+    (next cursor, ETag) since FastAPI does not merge them into returned responses."""
+    return Response(content=render(content, events), media_type="application/json", headers=response.headers)
+
+
+def events_page(
+    db: Session, condition, cursor: Optional[str], limit: int, response: Response, compact: bool = False
+) -> Response:
+    """One page of events matching ``condition``, with their registrations."""
+    rows = paginate(
+        db.query(*EVENT_COLUMNS).filter(condition), models.Event.event_date, models.Event.id,
+        lambda row: (row.event_date, row.id), cursor, limit, response
+    )
+    events = [event_dict(row) for row in rows]
+
+    registrations = {event["id"]: [] for event in events}
+    users = {}
+    if events:
+        registration_rows = (
+            db.query(*REGISTRATION_COLUMNS, *USER_COLUMNS)
+            .join(models.EventRegistration.user)
+            .filter(models.EventRegistration.event_id.in_(registrations))
+            .order_by(models.EventRegistration.id)
+        )
+        for row in registration_rows:
+            user = users.get(row.user_id)
+            if user is None:
+                user = users[row.user_id] = user_dict(row[4:])
+            registrations[row.event_id].append(row)
+
+    if compact:
+        listed_users = {}
+        page = []
+        for event in events:
+            refs = []
+            for event_id, registration_id, user_id, registration_date, *_ in registrations[event["id"]]:
+                refs.append({"id": registration_id, "user_id": user_id, "registration_date": registration_date})
+                listed_users.setdefault(user_id, users[user_id])
+            page.append({**event, "registrations": refs})
+        return json_response({"events": page, "users": listed_users}, events, response)
+
+    page = [
+        {
+            **event,
+            "registrations": [
+                {
+                    "event_id": event_id,
+                    "id": registration_id,
+                    "user_id": user_id,
+                    "registration_date": registration_date,
+                    "user": users[user_id],
+                    "event": event,
+                }
+                for event_id, registration_id, user_id, registration_date, *_ in registrations[event["id"]]
+            ],
+        }
+        for event in events
+    ]
+    return json_response(page, events, response)
+
+
+def registrations_page(
+    db: Session, user: models.User, cursor: Optional[str], limit: int, response: Response
+) -> Response:
+    """One page of ``user``'s registrations with their events, by event date."""
+    rows = paginate(
+        db.query(*REGISTRATION_COLUMNS, *EVENT_COLUMNS)
+        .join(models.EventRegistration.event)
+        .filter(models.EventRegistration.user_id == user.id),
+        models.Event.event_date, models.EventRegistration.id,
+        lambda row: (row.event_date, row.registration_id), cursor, limit, response
+    )
+    # Every registration belongs to ``user``, which is already loaded
+    registrant = user_dict([getattr(user, column.key) for column in USER_COLUMNS])
+    events = []
+    page = []
+    for row in rows:
+        event = event_dict(row[4:])
+        events.append(event)
+        page.append({
+            "event_id": row.event_id,
+            "id": row.registration_id,
+            "user_id": row.user_id,
+            "registration_date": row.registration_date,
+            "user": registrant,
+            "event": event,
+        })
+    return json_response(page, events, response)
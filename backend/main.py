@@ -1,28 +1,65 @@
-from fastapi import FastAPI, UploadFile, File
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Response, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
+from typing import Optional
+import hmac
 import os
-from fastapi.staticfiles import StaticFiles
-import httpx
-import requests
+
+import broadcast
+import database
+import geocoding
+import logs
+import metrics
+import querywatch
+from routers.auth import WRITE_MARKER_HEADER, WriteMarkerMiddleware
+from uploads import UPLOAD_DIR, UploadLimitMiddleware, UploadStaticFiles
 
 # Load environment variables
 load_dotenv()
 
+# Queue-backed logging; records are written by a background thread
+logs.configure()
+
 # Get environment variables
 DATABASE_URL = os.getenv("DATABASE_URL")
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 OPENCAGE_API_KEY = os.getenv("OPENCAGE_API_KEY")
+# Bearer token for /metrics and the stats endpoints; unset, they are not served
+INTERNAL_TOKEN = os.getenv("INTERNAL_TOKEN")
+
+def require_internal_token(authorization: Optional[str] = Header(None)):
+    """Operational endpoints are for the scraper and operators only."""
+    if not INTERNAL_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    expected = f"Bearer {INTERNAL_TOKEN}".encode()
+    if authorization is None or not hmac.compare_digest(authorization.encode(), expected):
+        raise HTTPException(status_code=401, detail="Invalid internal token", headers={"WWW-Authenticate": "Bearer"})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled upstream client for the whole process
+    await geocoding.start_http_client()
+    # Fan-out of event deltas to /api/events/stream subscribers
+    await broadcast.broadcaster.start()
+    yield
+    await broadcast.broadcaster.stop()
+    await geocoding.close_http_client()
 
 # Create FastAPI app
 app = FastAPI(
     title="Racket Buddy API",
     description="API for managing tennis match events and user profiles",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Reject oversized profile image uploads before their body is read (inside
+# CORS, so browsers can see the 413)
+app.add_middleware(UploadLimitMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -30,15 +67,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", WRITE_MARKER_HEADER],
 )
 
-# Create uploads directory if it doesn't exist
-UPLOAD_DIR = "uploads"
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
+# Read-your-writes with a read replica: marks responses to committed writes
+if database.DATABASE_REPLICA_URL is not None:
+    app.add_middleware(WriteMarkerMiddleware)
+
+# Repeated statements and per-route query budgets (QUERY_WATCH)
+if querywatch.QUERY_WATCH:
+    app.add_middleware(querywatch.QueryWatchMiddleware)
 
-# Mount the uploads directory
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+# Per-route request counts, latency and database usage for GET /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Mount the uploads directory; file names are content hashes, so they can be
+# cached forever
+app.mount("/uploads", UploadStaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 @app.get("/")
 async def root():
@@ -68,99 +113,34 @@ async def root():
 @app.get("/api/geocode")
 async def geocode(query: str):
     """Geocode an address using LocationIQ."""
-    if not query:
-        return []
-        
-    try:
-        # Create a session with proper headers
-        session = requests.Session()
-        
-        # Make the request to LocationIQ using autocomplete endpoint
-        response = session.get(
-            'https://us1.locationiq.com/v1/autocomplete',
-            params={
-                'key': 'pk.a77154f1765f87458c4552e06abea27d',  # LocationIQ API key
-                'q': query,
-                'format': 'json',
-                'limit': 10,
-                'addressdetails': 1,
-                'dedupe': 1,
-                'extratags': 1,
-                'namedetails': 1,
-                'layer': 'poi,address,venue',  # Focus on points of interest
-                'countrycodes': 'us',  # Keep US restriction since Impett Park is in US
-                'bounded': 1,  # Enable bounded search
-                'normalizeaddress': 0  # Disable address normalization
-            },
-            headers={
-                'Accept': 'application/json'
-            },
-            timeout=5
-        )
-        
-        print(f"LocationIQ Response Status: {response.status_code}")
-        print(f"LocationIQ Response: {response.text}")
-        
-        if response.status_code == 200:
-            results = response.json()
-            
-            # Format the results
-            formatted_results = []
-            for result in results:
-                address = result.get('address', {})
-                display_name = []
-                
-                # Build a more detailed address
-                if result.get('display_name'):
-                    display_name = [result['display_name']]
-                else:
-                    # Fallback to building address components
-                    if address.get('name'):
-                        display_name.append(address['name'])
-                    if address.get('road'):
-                        display_name.append(address['road'])
-                    if address.get('city'):
-                        display_name.append(address['city'])
-                    elif address.get('town'):
-                        display_name.append(address['town'])
-                    elif address.get('village'):
-                        display_name.append(address['village'])
-                    if address.get('state'):
-                        display_name.append(address['state'])
-                    if address.get('country'):
-                        display_name.append(address['country'])
-                
-                # If we couldn't build a nice address, use the display_name
-                if not display_name:
-                    display_name = [result.get('display_name', '')]
-                
-                formatted_results.append({
-                    'display_name': ', '.join(display_name),
-                    'lat': result.get('lat', ''),
-                    'lon': result.get('lon', '')
-                })
-            
-            return formatted_results
-        else:
-            print(f"Error from LocationIQ: {response.status_code} - {response.text}")
-            return []
-            
-    except requests.exceptions.RequestException as e:
-        print(f"Request error: {str(e)}")
-        return []
-    except Exception as e:
-        print(f"Unexpected error: {str(e)}")
-        return []
+    return await geocoding.geocode(query)
+
+@app.get("/api/geocode/stats", dependencies=[Depends(require_internal_token)])
+async def geocode_stats():
+    """Cache effectiveness for the geocode proxy."""
+    return geocoding.geocode_cache.stats()
+
+@app.get("/api/db/pool", dependencies=[Depends(require_internal_token)])
+async def db_pool_stats():
+    """Connection pool usage and checkout waits, for sizing DB_POOL_SIZE."""
+    return database.pool_status()
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_internal_token)])
+async def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.render(), headers={"Content-Type": metrics.CONTENT_TYPE})
 
 # Import and include routers
-from routers import users, events, auth
+from routers import users, events, auth, batch
 
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
 app.include_router(events.router, prefix="/api/events", tags=["Events"])
+app.include_router(batch.router, prefix="/api", tags=["Batch"])
 
 # For local development
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port) 
\ No newline at end of file
+    # Open /api/events/stream connections never finish on their own
+    uvicorn.run(app, host="0.0.0.0", port=port, timeout_graceful_shutdown=5) 
\ No newline at end of file
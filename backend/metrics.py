@@ -0,0 +1,326 @@
+"""Prometheus metrics, served as text from ``GET /metrics``.
+
+A small self-contained registry (counters, gauges and histograms with
+labels) so the app does not need the full prometheus_client package.
+What gets recorded:
+
+* ``MetricsMiddleware``: request count and latency per route template
+  (``/api/events/{event_id}``, not the raw path), plus the number of
+  queries and the database time each request spent;
+* ``instrument_engine``: every statement's duration, and connection pool
+  checkouts, with the pool's size/overflow read at scrape time;
+* ``passwords`` and ``geocoding`` record bcrypt and LocationIQ timings
+  through the histograms below.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# From an idle connection handed straight out up to DB_POOL_TIMEOUT
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield self.name, _format_labels(self.labels, label_values), value
+
+
+class Gauge(Metric):
+    """Either set directly, or computed at scrape time by ``collect``, which
+    returns a number or a ``{label values: number}`` mapping."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 collect: Optional[Callable[[], object]] = None):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+        self._values: Dict[tuple, float] = {}
+
+    def set(self, value: float, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+    def samples(self):
+        if self.collect is not None:
+            collected = self.collect()
+            values = collected.items() if isinstance(collected, dict) else [((), collected)]
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        for label_values, value in values:
+            if value is not None:
+                yield self.name, _format_labels(self.labels, label_values), value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: Dict[tuple, list] = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[index] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = [(label_values, list(entry)) for label_values, entry in self._values.items()]
+        for label_values, entry in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                labels = _format_labels(self.labels + ("le",), label_values + (_format_value(bound),))
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum", labels, entry[-2]
+            yield f"{self.name}_count", labels, entry[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labels))
+
+
+def gauge(name: str, documentation: str, labels: Sequence[str] = (), collect=None) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labels, collect))
+
+
+def histogram(name: str, documentation: str, labels: Sequence[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labels, buckets))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+http_requests = counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_request_duration = histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")
+)
+http_requests_in_progress = gauge("http_requests_in_progress", "HTTP requests being served.")
+request_db_queries = histogram(
+    "http_request_db_queries", "Database statements executed per request.", ("method", "route"), COUNT_BUCKETS
+)
+request_db_time = histogram(
+    "http_request_db_seconds", "Database time spent per request.", ("method", "route"), QUERY_BUCKETS
+)
+
+db_queries = counter("db_queries_total", "Statements executed.", ("engine",))
+db_query_duration = histogram("db_query_duration_seconds", "Statement latency.", ("engine",), QUERY_BUCKETS)
+db_pool_checkouts = counter("db_pool_checkouts_total", "Connections checked out of the pool.", ("engine",))
+db_pool_connects = counter("db_pool_connections_opened_total", "New database connections opened.", ("engine",))
+db_pool_wait = histogram(
+    "db_pool_checkout_wait_seconds", "Time a checkout waited for a free or newly opened connection.", ("engine",),
+    POOL_WAIT_BUCKETS,
+)
+db_pool_timeouts = counter("db_pool_timeouts_total", "Checkouts that gave up waiting for a connection.", ("engine",))
+
+password_hash_duration = histogram(
+    "password_hash_seconds", "bcrypt hash/verify time, excluding queueing.", ("operation",)
+)
+password_hash_wait = histogram(
+    "password_hash_wait_seconds", "Time bcrypt work waited for a free hashing worker.", ("operation",)
+)
+password_hash_rejected = counter(
+    "password_hash_rejected_total", "bcrypt work turned away because PASSWORD_HASH_MAX_PENDING was reached.", ("operation",)
+)
+
+geocode_upstream_duration = histogram("geocode_upstream_seconds", "LocationIQ request latency.")
+geocode_upstream_errors = counter("geocode_upstream_errors_total", "Failed LocationIQ requests.")
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# Set by the middleware for the duration of each request; threadpool workers
+# and AsyncSession.run_sync see the same object through the copied context
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+_engines: Dict[str, Engine] = {}
+
+
+def _pool_stat(method: str):
+    def collect():
+        values = {}
+        for label, engine in _engines.items():
+            reader = getattr(engine.pool, method, None)  # the pool is replaced by engine.dispose()
+            values[(label,)] = reader() if callable(reader) else None
+        return values
+    return collect
+
+
+gauge("db_pool_size", "Configured pool size.", ("engine",), _pool_stat("size"))
+gauge("db_pool_checked_out", "Connections currently checked out.", ("engine",), _pool_stat("checkedout"))
+gauge("db_pool_overflow", "Connections open beyond the pool size (negative while below it).", ("engine",), _pool_stat("overflow"))
+
+
+def instrument_engine(engine: Engine, label: str):
+    """Time every statement on ``engine`` and count its pool checkouts."""
+    _engines[label] = engine
+
+    @sa_event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @sa_event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_queries.inc(label)
+        db_query_duration.observe(elapsed, label)
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+    @sa_event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+    @sa_event.listens_for(engine.pool, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        db_pool_checkouts.inc(label)
+
+    @sa_event.listens_for(engine.pool, "connect")
+    def connect(dbapi_connection, connection_record):
+        db_pool_connects.inc(label)
+
+
+def route_label(scope) -> str:
+    """The matched route template, so ids in paths do not create new series."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if "endpoint" in scope:  # inside a mount such as /uploads
+        return scope.get("root_path") or "/"
+    return "<unmatched>"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware) recording per-route metrics."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        http_requests_in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            http_requests_in_progress.dec()
+            method = scope["method"]
+            route = route_label(scope)
+            http_requests.inc(method, route, str(status[0]))
+            http_request_duration.observe(elapsed, method, route)
+            request_db_queries.observe(stats.queries, method, route)
+            request_db_time.observe(stats.db_seconds, method, route)
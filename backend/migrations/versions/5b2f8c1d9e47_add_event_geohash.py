@@ -0,0 +1,51 @@
+"""add event geohash
+
+Revision ID: 5b2f8c1d9e47
+Revises: 39ddab5ee597
+Create Date: 2026-10-17 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+import geo
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2f8c1d9e47'
+down_revision: Union[str, None] = '39ddab5ee597'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('events', sa.Column('geohash', sa.String(length=12), nullable=True))
+    op.create_index(op.f('ix_events_geohash'), 'events', ['geohash'], unique=False)
+
+    # Backfill existing events
+    conn = op.get_bind()
+    events = sa.table(
+        'events',
+        sa.column('id', sa.Integer),
+        sa.column('latitude', sa.Float),
+        sa.column('longitude', sa.Float),
+        sa.column('geohash', sa.String),
+    )
+    rows = conn.execute(
+        sa.select(events.c.id, events.c.latitude, events.c.longitude)
+        .where(events.c.latitude.isnot(None), events.c.longitude.isnot(None))
+    ).all()
+    if rows:
+        conn.execute(
+            events.update()
+            .where(events.c.id == sa.bindparam('event_id'))
+            .values(geohash=sa.bindparam('hash')),
+            [{'event_id': row.id, 'hash': geo.encode(row.latitude, row.longitude)} for row in rows],
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_events_geohash'), table_name='events')
+    op.drop_column('events', 'geohash')
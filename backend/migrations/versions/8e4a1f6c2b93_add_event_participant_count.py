@@ -0,0 +1,34 @@
+"""add event participant count
+
+Revision ID: 8e4a1f6c2b93
+Revises: 5b2f8c1d9e47
+Create Date: 2026-10-17 11:40:05.527913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4a1f6c2b93'
+down_revision: Union[str, None] = '5b2f8c1d9e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('events', sa.Column('participant_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        """
+        UPDATE events SET participant_count = (
+            SELECT count(*) FROM event_registrations
+            WHERE event_registrations.event_id = events.id
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('events', 'participant_count')
@@ -0,0 +1,43 @@
+"""add event search
+
+Revision ID: a3e9c5d17b64
+Revises: f2b6d8e4a913
+Create Date: 2026-10-17 18:41:09.527316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+import search
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3e9c5d17b64'
+down_revision: Union[str, None] = 'f2b6d8e4a913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(search.TRIGRAM_EXTENSION)
+        op.create_index('ix_events_search', 'events', [sa.text(search.SEARCH_VECTOR)], unique=False, postgresql_using='gin')
+        op.create_index(
+            'ix_events_court_location_trgm', 'events', ['court_location'], unique=False,
+            postgresql_using='gin', postgresql_ops={'court_location': 'gin_trgm_ops'},
+        )
+    else:
+        # FTS5 tables, the triggers keeping them in step, then existing rows
+        for statement in search.SQLITE_DDL + search.SQLITE_REBUILD:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_events_court_location_trgm', table_name='events')
+        op.drop_index('ix_events_search', table_name='events')
+    else:
+        for statement in search.SQLITE_DROP:
+            op.execute(statement)
@@ -0,0 +1,34 @@
+"""add change stamps
+
+Revision ID: c7d93a0e5f12
+Revises: 8e4a1f6c2b93
+Create Date: 2026-10-17 14:22:37.804113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d93a0e5f12'
+down_revision: Union[str, None] = '8e4a1f6c2b93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    change_stamps = op.create_table('change_stamps',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(change_stamps, [
+        {'name': 'events', 'version': 1},
+        {'name': 'users', 'version': 1},
+    ])
+
+
+def downgrade() -> None:
+    op.drop_table('change_stamps')
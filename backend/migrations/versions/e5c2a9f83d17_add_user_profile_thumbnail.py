@@ -0,0 +1,27 @@
+"""add user profile thumbnail
+
+Revision ID: e5c2a9f83d17
+Revises: a3e9c5d17b64
+Create Date: 2026-10-17 21:32:08.611457
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5c2a9f83d17'
+down_revision: Union[str, None] = 'a3e9c5d17b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Filled in by `python uploads.py` once the thumbnails exist on disk
+    op.add_column('users', sa.Column('profile_thumbnail', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'profile_thumbnail')
@@ -0,0 +1,53 @@
+"""add listing indexes
+
+Revision ID: f2b6d8e4a913
+Revises: c7d93a0e5f12
+Create Date: 2026-10-17 16:05:12.418302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b6d8e4a913'
+down_revision: Union[str, None] = 'c7d93a0e5f12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Drop duplicate registrations (keeping the earliest) so the unique index
+    # can be built, then recount the places they were holding
+    op.execute(
+        """
+        DELETE FROM event_registrations WHERE id NOT IN (
+            SELECT min(id) FROM event_registrations GROUP BY event_id, user_id
+        )
+        """
+    )
+    op.execute(
+        """
+        UPDATE events SET participant_count = (
+            SELECT count(*) FROM event_registrations
+            WHERE event_registrations.event_id = events.id
+        )
+        """
+    )
+    op.create_index('uq_event_registrations_event_id_user_id', 'event_registrations', ['event_id', 'user_id'], unique=True)
+    op.create_index('ix_event_registrations_user_id', 'event_registrations', ['user_id'], unique=False)
+    op.create_index('ix_events_organizer_id_event_date', 'events', ['organizer_id', 'event_date', 'id'], unique=False)
+    op.create_index(
+        'ix_events_active_event_date', 'events', ['event_date', 'id'], unique=False,
+        postgresql_where=sa.text('is_cancelled = false'),
+        sqlite_where=sa.text('is_cancelled = 0'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_events_active_event_date', table_name='events')
+    op.drop_index('ix_events_organizer_id_event_date', table_name='events')
+    op.drop_index('ix_event_registrations_user_id', table_name='event_registrations')
+    op.drop_index('uq_event_registrations_event_id_user_id', table_name='event_registrations')
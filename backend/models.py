@@ -1,9 +1,13 @@
 from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Enum, Float
+from sqlalchemy import DDL, Index, event, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
+import geo
+import search
 import enum
 from datetime import datetime
+from typing import Optional
 
 class TennisLevel(str, enum.Enum):
     BEGINNER = "beginner"
@@ -29,11 +33,19 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     profile_image = Column(String, nullable=True)  # Store the path to the image
+    profile_thumbnail = Column(String, nullable=True)  # set once the avatar thumbnail has been written
 
     # Relationships
     created_events = relationship("Event", back_populates="organizer")
     event_registrations = relationship("EventRegistration", back_populates="user")
 
+def spots_left(max_participants: Optional[int], participant_count: Optional[int]) -> Optional[int]:
+    """Places left on an event, or None if it is unlimited: no (or a
+    non-positive) ``max_participants``, as in the routers' ``has_open_spot``."""
+    if max_participants is None or max_participants <= 0:
+        return None
+    return max(0, max_participants - (participant_count or 0))
+
 class Event(Base):
     __tablename__ = "events"
 
@@ -41,9 +53,11 @@ class Event(Base):
     court_location = Column(String)
     latitude = Column(Float)
     longitude = Column(Float)
+    geohash = Column(String(12), index=True)  # Derived from latitude/longitude for proximity search
     event_date = Column(DateTime)
     event_time = Column(DateTime)
     max_participants = Column(Integer, nullable=True)
+    participant_count = Column(Integer, nullable=False, default=0, server_default="0")  # Maintained alongside event_registrations
     description = Column(String, nullable=True)
     is_cancelled = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -51,7 +65,30 @@ class Event(Base):
 
     # Relationships
     organizer = relationship("User", back_populates="created_events")
-    registrations = relationship("EventRegistration", back_populates="event")
+    registrations = relationship("EventRegistration", back_populates="event", order_by="EventRegistration.id")
+
+    __table_args__ = (
+        # My events: one organiser's events in (event_date, id) page order
+        Index("ix_events_organizer_id_event_date", "organizer_id", "event_date", "id"),
+        # Public listing: only non-cancelled events, in (event_date, id) page
+        # order, so upcoming pages are a range scan and cancelled rows cost nothing
+        Index(
+            "ix_events_active_event_date", "event_date", "id",
+            postgresql_where=text("is_cancelled = false"),
+            sqlite_where=text("is_cancelled = 0"),
+        ),
+        # Full-text search on Postgres (see search.py); SQLite's FTS5 tables
+        # are created below
+        Index("ix_events_search", text(search.SEARCH_VECTOR), postgresql_using="gin").ddl_if(dialect="postgresql"),
+        Index(
+            "ix_events_court_location_trgm", "court_location",
+            postgresql_using="gin", postgresql_ops={"court_location": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
+    @property
+    def available_spots(self):
+        return spots_left(self.max_participants, self.participant_count)
 
 class EventRegistration(Base):
     __tablename__ = "event_registrations"
@@ -63,4 +100,31 @@ class EventRegistration(Base):
 
     # Relationships
     event = relationship("Event", back_populates="registrations")
-    user = relationship("User", back_populates="event_registrations") 
\ No newline at end of file
+    user = relationship("User", back_populates="event_registrations")
+
+    __table_args__ = (
+        # One registration per user and event; also serves lookups by event_id
+        Index("uq_event_registrations_event_id_user_id", "event_id", "user_id", unique=True),
+        Index("ix_event_registrations_user_id", "user_id"),
+    )
+
+class ChangeStamp(Base):
+    """Per-table version counters backing the listing ETags (see etag.py)."""
+    __tablename__ = "change_stamps"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+event.listen(Event.__table__, "before_create", DDL(search.TRIGRAM_EXTENSION).execute_if(dialect="postgresql"))
+for statement in search.SQLITE_DDL:
+    event.listen(Event.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in search.SQLITE_DROP:
+    event.listen(Event.__table__, "before_drop", DDL(statement).execute_if(dialect="sqlite"))
+
+@event.listens_for(Event, "before_insert")
+@event.listens_for(Event, "before_update")
+def set_event_geohash(mapper, connection, target):
+    if target.latitude is not None and target.longitude is not None:
+        target.geohash = geo.encode(target.latitude, target.longitude)
+    else:
+        target.geohash = None
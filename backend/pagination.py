@@ -0,0 +1,47 @@
+"""Keyset (cursor) pagination for listings ordered by (event_date, id).
+
+Cursors are opaque to clients: a url-safe base64 encoding of the last row's
+sort key. The next page is selected with a row-value comparison on that key,
+so page N costs the same as page 1, unlike OFFSET which has to walk every
+skipped row. The cursor for the next page is returned in the
+``X-Next-Cursor`` response header so list bodies keep their existing shape.
+"""
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+
+MAX_PAGE_SIZE = 100
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(event_date: datetime, item_id: int) -> str:
+    payload = json.dumps([event_date.isoformat() if event_date else None, item_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        event_date, item_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(event_date), int(item_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(query, date_column, id_column, key, cursor, limit, response: Response):
+    """Return one page of ``query`` ordered by ``(date_column, id_column)``.
+
+    ``key`` maps a result row to its ``(event_date, id)`` sort key. When more
+    rows follow, the cursor for the next page is set on ``response``.
+    """
+    query = query.order_by(date_column, id_column)
+    if cursor:
+        query = query.filter(tuple_(date_column, id_column) > tuple_(*decode_cursor(cursor)))
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*key(rows[-1]))
+    return rows
@@ -0,0 +1,75 @@
+"""Password hashing off the event loop.
+
+bcrypt costs ~250ms of CPU per call at the default cost. Hashes and
+verifications run in a small dedicated thread pool (bcrypt releases the GIL),
+so a burst of logins queues there instead of stalling every other request on
+the worker. ``PASSWORD_HASH_WORKERS=0`` runs them inline, as before, which is
+only useful for benchmarking.
+
+At most ``PASSWORD_HASH_MAX_PENDING`` jobs are queued or running at once;
+beyond that logins and signups get a 503 straight away rather than waiting
+behind a backlog that would outlast the client's timeout.
+
+The cost is set by ``BCRYPT_ROUNDS``. Hashes made with other parameters are
+verified as usual and transparently upgraded on the next successful login.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+import metrics
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_executor = (
+    ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+    if PASSWORD_HASH_WORKERS > 0 else None
+)
+# Only ever acquired without blocking, so it is safe from any event loop
+_pending = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+
+def _timed(operation: str, queued_at: float, fn, *args):
+    started = time.perf_counter()
+    metrics.password_hash_wait.observe(started - queued_at, operation)
+    try:
+        return fn(*args)
+    finally:
+        metrics.password_hash_duration.observe(time.perf_counter() - started, operation)
+
+
+async def _run(operation: str, fn, *args):
+    queued_at = time.perf_counter()
+    if _executor is None:
+        return _timed(operation, queued_at, fn, *args)
+    if not _pending.acquire(blocking=False):
+        metrics.password_hash_rejected.inc(operation)
+        raise HTTPException(
+            status_code=503, detail="Too many logins in progress, try again shortly", headers={"Retry-After": "1"},
+        )
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, _timed, operation, queued_at, fn, *args)
+    finally:
+        _pending.release()
+
+
+async def hash_password(password: str) -> str:
+    return await _run("hash", pwd_context.hash, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Check ``password``; also return a replacement hash if the stored one
+    uses outdated parameters (None otherwise)."""
+    if not hashed_password:
+        return False, None
+    return await _run("verify", pwd_context.verify_and_update, password, hashed_password)
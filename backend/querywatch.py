@@ -0,0 +1,232 @@
+"""Per-request statement recording, for catching N+1 queries before deploy.
+
+Off unless ``QUERY_WATCH`` is set. While on, every statement a request
+sends is recorded, and two things are reported:
+
+* the same statement shape (the SQL with literals and IN-lists normalised)
+  running ``QUERY_WATCH_REPEAT`` or more times in one request, which is
+  what a per-row query loop looks like;
+* a route sending more statements than its entry in ``QUERY_BUDGETS``.
+
+``QUERY_WATCH=warn`` logs both at the end of the request. ``strict``
+raises ``QueryWatchError`` at the offending statement instead, so the
+request fails with a traceback pointing at the loop; run tests and
+``check_query_plans.py`` with it.
+
+Tests can also record directly, whatever ``QUERY_WATCH`` is set to::
+
+    with querywatch.record(max_queries=3) as recorded:
+        client.get("/api/events/")
+    assert not recorded.repeated()
+
+and declare budgets for their own routes with ``set_budget``.
+"""
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import event as sa_event
+from sqlalchemy.engine import Engine
+
+import logs
+import metrics
+
+load_dotenv()
+
+_MODES = {"": None, "0": None, "false": None, "off": None, "1": "warn", "true": "warn", "warn": "warn", "strict": "strict"}
+QUERY_WATCH = _MODES[os.getenv("QUERY_WATCH", "").lower()]
+QUERY_WATCH_REPEAT = int(os.getenv("QUERY_WATCH_REPEAT", "3"))
+
+# Statements per request, including the current-user lookup (with its users
+# stamp check) and the ETag check. Listings load a page and its registrations
+# in a fixed number of queries however long the page is.
+QUERY_BUDGETS: Dict[Tuple[str, str], int] = {
+    ("POST", "/api/auth/register"): 3,
+    ("POST", "/api/auth/token"): 4,  # with the rehash of an outdated password hash
+    ("GET", "/api/events/"): 5,
+    ("GET", "/api/events/my-events"): 5,
+    ("GET", "/api/events/my-registrations"): 4,
+    ("GET", "/api/events/nearby"): 7,
+    ("GET", "/api/events/search"): 9,
+    ("POST", "/api/events/stream-ticket"): 2,
+    ("GET", "/api/events/stream"): 1,
+    ("POST", "/api/events/"): 11,
+    ("POST", "/api/events/{event_id}/register"): 9,
+    ("DELETE", "/api/events/{event_id}"): 6,
+    ("DELETE", "/api/events/registrations/{registration_id}"): 7,
+    ("GET", "/api/users/me"): 2,
+    ("PUT", "/api/users/me"): 9,  # with the avatar background task after an upload
+    ("GET", "/api/users/me/events"): 4,
+}
+
+logger = logs.get_logger("querywatch")
+
+_IN_LIST = re.compile(r"\((?:\s*(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class QueryWatchError(AssertionError):
+    pass
+
+
+def set_budget(method: str, route: str, max_queries: int):
+    QUERY_BUDGETS[(method.upper(), route)] = max_queries
+
+
+def statement_shape(statement: str) -> str:
+    """``statement`` with literals replaced and IN-lists of any length collapsed."""
+    shape = _LITERAL.sub("?", statement)
+    shape = _IN_LIST.sub("(...)", shape)
+    return " ".join(shape.split())
+
+
+class Recorder:
+    """Statements sent while it is active, by request or by ``record()`` block."""
+
+    def __init__(self, scope=None, strict: bool = False):
+        self.scope = scope
+        self.strict = strict
+        self.statements: List[str] = []
+        self.shapes: Counter = Counter()
+
+    @property
+    def route(self) -> Optional[Tuple[str, str]]:
+        if self.scope is None:
+            return None
+        return self.scope["method"], metrics.route_label(self.scope)
+
+    @property
+    def budget(self) -> Optional[int]:
+        return QUERY_BUDGETS.get(self.route) if self.scope is not None else None
+
+    def add(self, statement: str):
+        shape = statement_shape(statement)
+        self.statements.append(statement)
+        self.shapes[shape] += 1
+        if not self.strict:
+            return
+        if self.shapes[shape] == QUERY_WATCH_REPEAT:
+            raise QueryWatchError(
+                f"{self._describe()} ran the same statement {QUERY_WATCH_REPEAT} times "
+                f"(a query per row?): {shape}"
+            )
+        budget = self.budget
+        if budget is not None and len(self.statements) > budget:
+            raise QueryWatchError(f"{self._describe()} exceeded its budget of {budget} queries")
+
+    def repeated(self) -> Dict[str, int]:
+        """Statement shapes that ran ``QUERY_WATCH_REPEAT`` or more times."""
+        return {shape: count for shape, count in self.shapes.items() if count >= QUERY_WATCH_REPEAT}
+
+    def assert_within(self, max_queries: int):
+        if len(self.statements) > max_queries:
+            listing = "\n".join(f"  {' '.join(statement.split())}" for statement in self.statements)
+            raise QueryWatchError(
+                f"{self._describe()} ran {len(self.statements)} queries, budget {max_queries}:\n{listing}"
+            )
+
+    def report(self):
+        """Log repeated shapes and budget overruns (``QUERY_WATCH=warn``)."""
+        method, route = self.route
+        for shape, count in self.repeated().items():
+            logger.warning("Repeated statement", extra={"method": method, "route": route, "count": count, "statement": shape})
+        budget = self.budget
+        if budget is not None and len(self.statements) > budget:
+            logger.warning(
+                "Query budget exceeded",
+                extra={"method": method, "route": route, "queries": len(self.statements), "budget": budget},
+            )
+
+    def _describe(self) -> str:
+        return "{} {}".format(*self.route) if self.scope is not None else "Recorded block"
+
+
+_current: ContextVar[Optional[Recorder]] = ContextVar("querywatch_recorder", default=None)
+# Active ``record()`` blocks; the app may run in another thread (TestClient),
+# so these see every statement rather than only their own context's
+_blocks: List[Recorder] = []
+_lock = threading.Lock()
+_engines: List[Engine] = []
+_attached = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    for block in list(_blocks):
+        block.add(statement)
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.add(statement)
+
+
+def _attach():
+    global _attached
+    with _lock:
+        if _attached:
+            return
+        for engine in _engines:
+            sa_event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        _attached = True
+
+
+def instrument_engine(engine: Engine):
+    """Register ``engine``; statements are only recorded once watching is on."""
+    _engines.append(engine)
+    if _attached:
+        sa_event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    elif QUERY_WATCH:
+        _attach()
+
+
+@contextmanager
+def record(max_queries: Optional[int] = None) -> Iterator[Recorder]:
+    """Record every statement sent inside the block, from any thread."""
+    _attach()
+    recorder = Recorder()
+    with _lock:
+        _blocks.append(recorder)
+    try:
+        yield recorder
+    finally:
+        with _lock:
+            _blocks.remove(recorder)
+    if max_queries is not None:
+        recorder.assert_within(max_queries)
+
+
+@contextmanager
+def watch(scope) -> Iterator[Optional[Recorder]]:
+    """Record the statements sent inside the block against ``scope``'s route.
+
+    Used per request by the middleware, and per operation by ``POST
+    /api/batch`` so each batched endpoint is held to its own budget.
+    """
+    if not QUERY_WATCH:
+        yield None
+        return
+    recorder = Recorder(scope, strict=QUERY_WATCH == "strict")
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+        if not recorder.strict:
+            recorder.report()
+
+
+class QueryWatchMiddleware:
+    """Gives each request its own ``Recorder`` (added only when ``QUERY_WATCH`` is set)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        with watch(scope):
+            await self.app(scope, receive, send)
@@ -1,13 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from starlette.datastructures import MutableHeaders
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from typing import Optional
+import os
+import time
 
-from database import get_db
+from cache import TTLCache
+import database
+from database import DbSession, get_session, run_db
+import etag
 import models
+import passwords
+from passwords import pwd_context
 import schemas
 
 router = APIRouter()
@@ -17,8 +26,28 @@ SECRET_KEY = "your-secret-key"  # In production, use environment variable
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Authenticated users are cached per process by id, so most requests resolve
+# the caller without loading the users row. Every change to a user row, in
+# any worker and including bulk UPDATE/DELETE, advances the users change
+# stamp; an entry is only used while the stamp still has the version it was
+# cached at. The TTL bounds staleness for writes made outside the app.
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+
+# Responses to requests that committed a write carry a signed marker with the
+# write's time; clients send it back so their reads skip the read replica
+# until REPLICA_STICKY_SECONDS have passed, whichever worker serves them
+WRITE_MARKER_HEADER = "X-Last-Write"
+WRITE_MARKER_PURPOSE = "last_write"
+
+# EventSource cannot send headers, so GET /api/events/stream takes a ticket in
+# its query string instead of the access token: signed for that one purpose
+# and only valid for a minute, in case it ends up in a log
+STREAM_TICKET_SECONDS = 60
+STREAM_TICKET_PURPOSE = "stream"
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -36,7 +65,57 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def invalidate_user(user_id: int):
+    user_cache.pop(user_id)
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    invalidate_user(target.id)
+    session = object_session(target)
+    if session is None or session.is_modified(target, include_collections=False) or inspect(target).deleted:
+        etag.advance(connection, etag.USERS_STAMP)
+
+@event.listens_for(Session, "do_orm_execute")
+def _invalidate_cached_users(state):
+    """Bulk UPDATE/DELETE of users fire no mapper events; advance the users
+    stamp after them (users rows first, as with every write)."""
+    if not (state.is_update or state.is_delete) or state.bind_mapper is not models.User.__mapper__:
+        return None
+    result = state.invoke_statement()
+    if result.rowcount:
+        etag.advance(state.session, etag.USERS_STAMP)
+    return result
+
+def _cache_user(user: models.User, users_version: int):
+    """Store a detached copy of ``user``'s column state in the cache, with the
+    users stamp version it was read at."""
+    snapshot = models.User(**{
+        attr.key: getattr(user, attr.key) for attr in models.User.__mapper__.column_attrs
+    })
+    make_transient_to_detached(snapshot)
+    user_cache.set(user.id, (snapshot, users_version))
+
+def create_stream_ticket(user_id: int) -> str:
+    claims = {
+        "uid": user_id,
+        "purpose": STREAM_TICKET_PURPOSE,
+        "exp": datetime.utcnow() + timedelta(seconds=STREAM_TICKET_SECONDS),
+    }
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+def decode_stream_ticket(ticket: str) -> int:
+    """The user id of a valid stream ticket, without touching the database."""
+    try:
+        claims = jwt.decode(ticket, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        claims = {}
+    if claims.get("purpose") != STREAM_TICKET_PURPOSE or not isinstance(claims.get("uid"), int):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired stream ticket")
+    return claims["uid"]
+
+def decode_token(token: str) -> schemas.TokenData:
+    """The claims of a valid access token, without touching the database."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -47,48 +126,164 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-        token_data = schemas.TokenData(email=email)
+        return schemas.TokenData(email=email, user_id=payload.get("uid"))
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: DbSession = Depends(get_session)):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    token_data = decode_token(token)
+
+    # Commits through this request's session mark the user as a recent
+    # writer, whose reads then stay on the primary (see WriteMarkerMiddleware)
+    session = db.sync_session if isinstance(db, AsyncSession) else db
+
+    def load(db: Session):
+        # Read before the user, so a change committed in between leaves an
+        # entry that is reloaded next time rather than one that looks current
+        users_version = etag.read(db, [etag.USERS_STAMP]).get(etag.USERS_STAMP, 0)
+        cached = user_cache.get(token_data.user_id) if token_data.user_id is not None else None
+        if cached is not None:
+            snapshot, cached_version = cached
+            if cached_version == users_version and snapshot.email == token_data.email:
+                # Attach a copy of the cached row to this request's session
+                return db.merge(snapshot, load=False)
+        if token_data.user_id is not None:
+            user = db.get(models.User, token_data.user_id)
+        else:  # tokens issued before ids were added
+            user = db.query(models.User).filter(models.User.email == token_data.email).first()
+        if user is not None and user.email == token_data.email and user.is_active:
+            _cache_user(user, users_version)
+            return user
+        return None
+
+    user = await run_db(db, load)
     if user is None:
         raise credentials_exception
+    session.info["user_id"] = user.id
     return user
 
 
+def create_write_marker(user_id: int, wrote_at: float) -> str:
+    claims = {"uid": user_id, "wrote": wrote_at, "purpose": WRITE_MARKER_PURPOSE}
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+def wrote_recently(request: Request, user_id: int) -> bool:
+    """Whether the request carries ``user_id``'s marker from a write less
+    than REPLICA_STICKY_SECONDS ago."""
+    marker = request.headers.get(WRITE_MARKER_HEADER)
+    if not marker:
+        return False
+    try:
+        claims = jwt.decode(marker, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return False
+    if claims.get("purpose") != WRITE_MARKER_PURPOSE or claims.get("uid") != user_id:
+        return False
+    return time.time() - float(claims.get("wrote", 0)) < database.REPLICA_STICKY_SECONDS
+
+
+class WriteMarkerMiddleware:
+    """Adds the write marker to responses of requests whose session committed
+    for the current user (added only with a read replica)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        commit = {}
+
+        async def send_with_marker(message):
+            if message["type"] == "http.response.start" and "user_id" in commit:
+                MutableHeaders(scope=message).append(
+                    WRITE_MARKER_HEADER, create_write_marker(commit["user_id"], commit["at"])
+                )
+            await send(message)
+
+        token = database.last_commit.set(commit)
+        try:
+            await self.app(scope, receive, send_with_marker)
+        finally:
+            database.last_commit.reset(token)
+
+
+def _get_read_db(request: Request, current_user: models.User = Depends(get_current_user)):
+    yield from database.get_read_db(not wrote_recently(request, current_user.id))
+
+
+async def _get_read_async_db(request: Request, current_user: models.User = Depends(get_current_user)):
+    async for db in database.get_read_async_db(not wrote_recently(request, current_user.id)):
+        yield db
+
+
+# Session dependency for read-only handlers: the replica when one is
+# configured, unless the request's write marker is under
+# REPLICA_STICKY_SECONDS old
+if database.DATABASE_REPLICA_URL is None:
+    get_read_session = get_session
+else:
+    get_read_session = _get_read_async_db if database.DB_ASYNC else _get_read_db
+
+
 @router.post("/register", response_model=schemas.User)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    hashed_password = get_password_hash(user.password)
-    db_user = models.User(
-        email=user.email,
-        hashed_password=hashed_password,
-        first_name=user.first_name,
-        last_name=user.last_name,
-        date_of_birth=user.date_of_birth,
-        sex=user.sex,
-        tennis_level=user.tennis_level,
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+async def register_user(user: schemas.UserCreate, db: DbSession = Depends(get_session)):
+    hashed_password = await passwords.hash_password(user.password)
+
+    def create(db: Session):
+        db_user = db.query(models.User).filter(models.User.email == user.email).first()
+        if db_user:
+            raise HTTPException(status_code=400, detail="Email already registered")
+        
+        db_user = models.User(
+            email=user.email,
+            hashed_password=hashed_password,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            date_of_birth=user.date_of_birth,
+            sex=user.sex,
+            tennis_level=user.tennis_level,
+        )
+        db.add(db_user)
+        db.commit()
+        db.refresh(db_user)
+        return db_user
+
+    return await run_db(db, create)
 
 @router.post("/token")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: DbSession = Depends(get_session)):
+    user = await run_db(
+        db, lambda db: db.query(models.User).filter(models.User.email == form_data.username).first()
+    )
+    verified, new_hash = (
+        await passwords.verify_password(form_data.password, user.hashed_password)
+        if user else (False, None)
+    )
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    email, user_id = user.email, user.id
+    if new_hash:
+        # Hashing parameters changed since this password was stored
+        def rehash(db: Session):
+            user.hashed_password = new_hash
+            db.commit()
+
+        await run_db(db, rehash)
+    
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": email, "uid": user_id}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"} 
\ No newline at end of file
@@ -0,0 +1,203 @@
+"""POST /api/batch: several endpoints in one round trip.
+
+A page such as My Registrations needs the event listing and the user's
+registrations together. Sent separately, every request decodes the token,
+resolves the user and checks out a session of its own. A batch does each of
+those once and runs the operations one after another on the shared session:
+
+    POST /api/batch
+    {"requests": [
+        {"id": "events", "path": "/api/events/", "params": {"limit": 20}},
+        {"id": "registrations", "path": "/api/events/my-registrations", "etag": "W/\\"3f2a...\\""}
+    ]}
+
+Each result has the status, headers (ETag, X-Next-Cursor) and body the
+endpoint would have answered on its own for the same path and query string,
+so ETags are interchangeable between batched and plain requests. ``etag``
+acts as that operation's If-None-Match (304, no body). An operation that
+fails (404, 422...) gets its own error result; the rest still run.
+
+A few writes can be batched too (``"method": "POST"`` or ``"DELETE"``, with
+the JSON ``body`` the endpoint takes). Each commits as it runs, so later
+operations see it; a batch with a write runs on the primary, never the
+read replica.
+"""
+import json
+from inspect import iscoroutinefunction
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.dependencies.utils import request_body_to_args, request_params_to_args
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+from sqlalchemy.orm.attributes import set_committed_value
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import QueryParams
+from starlette.routing import Match
+
+from database import DbSession, get_session, run_db
+import models
+import querywatch
+import schemas
+from routers.auth import get_current_user, get_read_session
+
+router = APIRouter()
+
+# Endpoints that may be batched, by method. Their only dependencies must be
+# the ones the batch resolves once and shares: the session and the current
+# user.
+BATCHABLE_ROUTES = {
+    "GET": (
+        "/api/users/me",
+        "/api/users/me/events",
+        "/api/events/",
+        "/api/events/my-events",
+        "/api/events/my-registrations",
+        "/api/events/nearby",
+        "/api/events/search",
+    ),
+    "POST": (
+        "/api/events/",
+        "/api/events/{event_id}/register",
+    ),
+    "DELETE": (
+        "/api/events/{event_id}",
+        "/api/events/registrations/{registration_id}",
+    ),
+}
+SHARED_DEPENDENCIES = {"db", "current_user"}
+
+# Per-operation headers worth returning; content-type/length describe the
+# batch response as a whole
+RESULT_HEADERS = ("etag", "cache-control", "x-next-cursor")
+
+_routes: List[APIRoute] = []
+
+
+def _batchable_routes(app) -> List[APIRoute]:
+    if not _routes:
+        for route in app.router.routes:
+            if not isinstance(route, APIRoute):
+                continue
+            if any(route.path in BATCHABLE_ROUTES.get(method, ()) for method in route.methods):
+                names = {dependency.name for dependency in route.dependant.dependencies}
+                if not names <= SHARED_DEPENDENCIES:
+                    raise RuntimeError(f"{route.path} has dependencies a batch cannot share: {names - SHARED_DEPENDENCIES}")
+                _routes.append(route)
+    return _routes
+
+
+def _match_route(app, operation: schemas.BatchOperation) -> Optional[Tuple[APIRoute, dict]]:
+    """The batchable route for ``operation`` and its path parameters."""
+    scope = {"type": "http", "method": operation.method, "path": operation.path}
+    for route in _batchable_routes(app):
+        if route.path not in BATCHABLE_ROUTES[operation.method]:
+            continue
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            return route, child_scope["path_params"]
+    return None
+
+
+def _operation_scope(request: Request, route: APIRoute, path_params: dict, operation: schemas.BatchOperation) -> dict:
+    """The batch request's scope, rewritten as ``operation``."""
+    query_string = str(QueryParams({name: str(value).lower() if isinstance(value, bool) else str(value)
+                                    for name, value in operation.params.items()}))
+    headers = [(name, value) for name, value in request.scope["headers"]
+               if name not in (b"if-none-match", b"content-type", b"content-length")]
+    if operation.etag:
+        headers.append((b"if-none-match", operation.etag.encode("latin-1")))
+    return dict(
+        request.scope,
+        method=operation.method,
+        path=operation.path,
+        raw_path=operation.path.encode(),
+        query_string=query_string.encode(),
+        headers=headers,
+        route=route,
+        path_params=path_params,
+    )
+
+
+def _result_headers(response: Response) -> Dict[str, str]:
+    return {name: response.headers[name] for name in RESULT_HEADERS if name in response.headers}
+
+
+async def _run_operation(
+    request: Request, operation: schemas.BatchOperation, shared: dict
+) -> Tuple[int, Dict[str, str], Optional[bytes]]:
+    matched = _match_route(request.app, operation)
+    if matched is None:
+        return 404, {}, JSONResponse({"detail": f"{operation.method} {operation.path} cannot be batched"}).body
+    route, path_params = matched
+
+    scope = _operation_scope(request, route, path_params, operation)
+    sub_request = Request(scope)
+    values, errors = request_params_to_args(route.dependant.query_params, sub_request.query_params)
+    path_values, path_errors = request_params_to_args(route.dependant.path_params, path_params)
+    body_values, body_errors = await request_body_to_args(route.dependant.body_params, operation.body)
+    errors = errors + path_errors + body_errors
+    if errors:
+        return 422, {}, JSONResponse({"detail": jsonable_encoder(errors)}).body
+
+    sub_response = Response()
+    kwargs = {**values, **path_values, **body_values}
+    if route.dependant.request_param_name:
+        kwargs[route.dependant.request_param_name] = sub_request
+    if route.dependant.response_param_name:
+        kwargs[route.dependant.response_param_name] = sub_response
+    for dependency in route.dependant.dependencies:
+        kwargs[dependency.name] = shared[dependency.name]
+
+    try:
+        with querywatch.watch(scope):
+            if iscoroutinefunction(route.endpoint):
+                result = await route.endpoint(**kwargs)
+            else:
+                result = await run_in_threadpool(route.endpoint, **kwargs)
+    except HTTPException as exc:
+        return exc.status_code, dict(exc.headers or {}), JSONResponse({"detail": exc.detail}).body
+
+    if isinstance(result, Response):  # 304s and the pre-encoded listing fast path
+        headers = {**_result_headers(sub_response), **_result_headers(result)}
+        return result.status_code, headers, result.body if result.status_code != 304 else None
+    content = await serialize_response(field=route.response_field, response_content=result)
+    return route.status_code or 200, _result_headers(sub_response), JSONResponse(content).body
+
+
+def _reset_after_write(session, current_user: models.User, columns: dict, status: int):
+    """Roll back what a failed write left behind, then put back the user's
+    columns, which a commit or rollback expires. Batched endpoints do not
+    change the user row, so no reload is needed."""
+    if status >= 400:
+        session.rollback()
+    for key, value in columns.items():
+        set_committed_value(current_user, key, value)
+
+
+@router.post("/batch", response_model=schemas.BatchResponse)
+async def batch(
+    body: schemas.BatchRequest,
+    request: Request,
+    db: DbSession = Depends(get_read_session),
+    primary: DbSession = Depends(get_session),
+    current_user: models.User = Depends(get_current_user)
+):
+    # Reads after a write must see it, so a batch with writes stays on the
+    # primary session (the one the current user was loaded into)
+    writes = any(operation.method != "GET" for operation in body.requests)
+    if writes:
+        db = primary
+    shared = {"db": db, "current_user": current_user}
+    columns = {attr.key: getattr(current_user, attr.key) for attr in models.User.__mapper__.column_attrs}
+    parts: List[bytes] = []
+    for operation in body.requests:
+        status, headers, content = await _run_operation(request, operation, shared)
+        if operation.method != "GET":
+            await run_db(db, lambda session: _reset_after_write(session, current_user, columns, status))
+        # Bodies are already encoded (some straight from the fast path), so
+        # the envelope is assembled around them rather than re-parsed
+        head = json.dumps({"id": operation.id, "status": status, "headers": headers}, separators=(",", ":"))
+        parts.append(head[:-1].encode() + b',"body":' + (content if content is not None else b"null") + b"}")
+    return Response(b'{"results":[' + b",".join(parts) + b"]}", media_type="application/json")
@@ -1,282 +1,772 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from jose import JWTError, jwt
-from typing import List, Union
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, case, column, exists, func, literal, literal_column, or_, select, table, true, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, contains_eager, joinedload, selectinload
+from starlette.concurrency import run_in_threadpool
+from typing import List, Literal, Optional, Union
+from datetime import date, datetime, time, timedelta, timezone
+import asyncio
+import logging
+import math
 
-from database import get_db
+from database import DbSession, SessionLocal, get_session, run_db
+import broadcast
+import etag
+import geo
+import listings
+import logs
 import models
 import schemas
-from routers.auth import oauth2_scheme, get_current_user, SECRET_KEY, ALGORITHM
+import search
+from pagination import MAX_PAGE_SIZE, paginate
+from routers.auth import (
+    STREAM_TICKET_SECONDS, create_stream_ticket, decode_stream_ticket, get_current_user, get_read_session
+)
 
 router = APIRouter()
+logger = logs.get_logger("events")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
+MAX_NEARBY_RADIUS_KM = 500
+# Nearby searches start at this share of the radius and widen by the growth
+# factor until they find enough events (at most three rounds)
+NEARBY_FIRST_RING = 1 / 16
+NEARBY_RING_GROWTH = 4
+MAX_SEARCH_RESULTS = 50
+
+# SQLite full-text tables (see search.py); their rowid is the event id
+EVENTS_FTS = table("events_fts", column("rowid"))
+EVENTS_FTS_TRIGRAM = table("events_fts_trigram", column("rowid"))
+
+# Comment lines sent on an idle stream so proxies do not close it
+STREAM_HEARTBEAT_SECONDS = 15
+
+# "full" embeds a complete user and event in every registration; "compact"
+# returns {"events": [...], "users": {id: user}} with registrations by id
+ListingFormat = Literal["full", "compact"]
+
+# Listing date filters take a time (ISO 8601) or a plain date (a whole UTC day)
+DateOrTime = Union[datetime, date]
+
+def with_registrations():
+    """Loader option that fetches every event's registrations (and their users)
+    in one extra query for the whole result set instead of one per event."""
+    return selectinload(models.Event.registrations).joinedload(models.EventRegistration.user)
+
+def compact_listing(events: list) -> dict:
+    users = {}
+    for event in events:
+        for registration in event.registrations:
+            users.setdefault(registration.user_id, registration.user)
+    return {"events": events, "users": users}
+
+def has_open_spot():
+    """Events with a place left; no (or a non-positive) cap means unlimited,
+    as in ``models.spots_left``."""
+    return or_(
+        models.Event.max_participants == None,
+        models.Event.max_participants <= 0,
+        models.Event.participant_count < models.Event.max_participants,
+    )
+
+def longitude_between(west: float, east: float):
+    """Longitudes from ``west`` to ``east``, across the antimeridian if west > east."""
+    if (west, east) == (-180.0, 180.0):
+        return true()
+    if west <= east:
+        return models.Event.longitude.between(west, east)
+    return or_(models.Event.longitude >= west, models.Event.longitude <= east)
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Event dates are stored as naive UTC; convert aware query values to match."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def date_bound(value: Optional[DateOrTime], end: bool = False) -> Optional[datetime]:
+    """A listing date filter as naive UTC; a plain date starts at its midnight,
+    or as ``date_to`` (``end``) runs to the next one so the day is included."""
+    if value is None or isinstance(value, datetime):
+        return naive_utc(value)
+    return datetime.combine(value + timedelta(days=1) if end else value, time())
+
+def listing_filters(
+    current_user: models.User,
+    date_from: Optional[DateOrTime],
+    date_to: Optional[DateOrTime],
+    open_spots: bool,
+    organizer_level: Optional[models.TennisLevel],
+    exclude_registered: bool,
+) -> list:
+    """SQL conditions for the optional GET /api/events filters.
+
+    Each stays a predicate on the events scan the listing already does in
+    (event_date, id) order, so a page stops after ``limit`` matches: the
+    date range bounds the index range, and the organiser's level and "not
+    registered" are primary key / unique index probes per event. (An IN
+    over the organisers of a level makes SQLite fetch all their events and
+    sort them instead.)
+    """
+    date_from, date_to = date_bound(date_from), date_bound(date_to, end=True)
+    if date_from is not None and date_to is not None and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+    conditions = []
+    if date_from is not None:
+        conditions.append(models.Event.event_date >= date_from)
+    if date_to is not None:
+        conditions.append(models.Event.event_date < date_to)
+    if open_spots:
+        conditions.append(has_open_spot())
+    if organizer_level is not None:
+        conditions.append(exists().where(
+            models.User.id == models.Event.organizer_id,
+            models.User.tennis_level == organizer_level,
+        ))
+    if exclude_registered:
+        conditions.append(~exists().where(
+            models.EventRegistration.event_id == models.Event.id,
+            models.EventRegistration.user_id == current_user.id,
+        ))
+    return conditions
+
+def claim_spot(db: Session, event_id: int) -> Optional[int]:
+    """Atomically take one place on an event.
+
+    A single conditional UPDATE both checks capacity and bumps the counter, so
+    concurrent sign-ups cannot overbook. Returns the new participant count, or
+    None if the event is full (or cancelled/missing). The change commits with
+    the caller's transaction.
+    """
+    result = db.execute(
+        update(models.Event)
+        .where(
+            models.Event.id == event_id,
+            models.Event.is_cancelled == False,
+            has_open_spot(),
+        )
+        .values(participant_count=models.Event.participant_count + 1)
+        .returning(models.Event.participant_count)
+        .execution_options(synchronize_session=False)
+    )
+    return result.scalar_one_or_none()
+
+def release_spot(db: Session, event_id: int) -> Optional[int]:
+    """Give back one place; returns the new participant count."""
+    result = db.execute(
+        update(models.Event)
+        .where(models.Event.id == event_id, models.Event.participant_count > 0)
+        .values(participant_count=models.Event.participant_count - 1)
+        .returning(models.Event.participant_count)
+        .execution_options(synchronize_session=False)
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(email=email)
-    except JWTError:
-        raise credentials_exception
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
-    if user is None:
-        raise credentials_exception
-    return user
+    return result.scalar_one_or_none()
 
 @router.post("/", response_model=schemas.EventWithRegistrations)
-def create_event(
+async def create_event(
     event: schemas.EventCreate,
-    db: Session = Depends(get_db),
+    db: DbSession = Depends(get_session),
     current_user: models.User = Depends(get_current_user)
 ):
-    # Create the event
-    db_event = models.Event(
-        **event.dict(),
-        organizer_id=current_user.id
-    )
-    db.add(db_event)
-    db.commit()
-    db.refresh(db_event)
+    def create(db: Session):
+        # Create the event and register the organizer in one transaction, so
+        # no event is ever committed without its organizer's registration
+        db_event = models.Event(
+            **event.dict(),
+            organizer_id=current_user.id,
+            participant_count=1  # the organizer's own registration below
+        )
+        db.add(db_event)
+        db.flush()  # assigns the event id
     
-    # Automatically register the organizer
-    registration = models.EventRegistration(
-        event_id=db_event.id,
-        user_id=current_user.id
-    )
-    db.add(registration)
-    db.commit()
+        # Automatically register the organizer
+        registration = models.EventRegistration(
+            event_id=db_event.id,
+            user_id=current_user.id
+        )
+        db.add(registration)
+        etag.bump(db, etag.EVENTS_STAMP)
+        broadcast.publish(db, broadcast.event_created(db_event, registration, current_user))
+        db.commit()
     
-    # Load the event with registrations and user data
-    db_event = db.query(models.Event).filter(models.Event.id == db_event.id).first()
-    db_event.registrations = db.query(models.EventRegistration).filter(
-        models.EventRegistration.event_id == db_event.id
-    ).options(
-        joinedload(models.EventRegistration.user)
-    ).all()
+        # Load the event with registrations and user data
+        db_event = (
+            db.query(models.Event)
+            .options(with_registrations())
+            .filter(models.Event.id == db_event.id)
+            .first()
+        )
     
-    print(f"Created event {db_event.id} with {len(db_event.registrations)} registrations")
-    for reg in db_event.registrations:
-        print(f"Registration: user_id={reg.user_id}, user={reg.user.email}")
+        logger.info("Created event %s", db_event.id, extra={"organizer_id": current_user.id})
+        if logger.isEnabledFor(logging.DEBUG):
+            for reg in db_event.registrations:
+                logger.debug("Registration", extra={"event_id": db_event.id, "user_id": reg.user_id, "user": reg.user.email})
     
-    return db_event
+        return db_event
+
+    return await run_db(db, create)
 
-@router.get("/", response_model=List[schemas.EventWithRegistrations])
-def get_events(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+@router.get("/", response_model=Union[List[schemas.EventWithRegistrations], schemas.CompactEventList])
+async def get_events(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    listing_format: ListingFormat = Query("full", alias="format"),
+    date_from: Optional[DateOrTime] = None,
+    date_to: Optional[DateOrTime] = None,
+    open_spots: bool = False,
+    organizer_level: Optional[models.TennisLevel] = None,
+    exclude_registered: bool = False,
+    db: DbSession = Depends(get_read_session),
     current_user: models.User = Depends(get_current_user)
 ):
-    # Get only non-cancelled events
-    events = db.query(models.Event).filter(models.Event.is_cancelled == False).offset(skip).limit(limit).all()
-    # Load registrations for each event with user data
-    for event in events:
-        event.registrations = db.query(models.EventRegistration).filter(
-            models.EventRegistration.event_id == event.id
-        ).options(
-            joinedload(models.EventRegistration.user)
-        ).all()
-        print(f"Event {event.id} registrations:", [
-            {"user_id": reg.user_id, "user": reg.user.email} 
-            for reg in event.registrations
-        ])
-    return events
-
-@router.get("/my-events", response_model=List[schemas.EventWithRegistrations])
-def get_my_events(
-    db: Session = Depends(get_db),
+    """Non-cancelled events by date, optionally only those on or after
+    ``date_from`` and before ``date_to`` (through the end of the day for a
+    plain date), with a place left, organised by a player of
+    ``organizer_level``, or that the user has not registered for."""
+    conditions = [models.Event.is_cancelled == False] + listing_filters(
+        current_user, date_from, date_to, open_spots, organizer_level, exclude_registered
+    )
+    # Only the "not registered" filter makes the listing differ per user
+    scope = (current_user.id,) if exclude_registered else ()
+
+    def load(db: Session):
+        if etag.check(db, request, response, (etag.EVENTS_STAMP, etag.USERS_STAMP), *scope):
+            return None
+        if listings.LISTING_FAST_PATH:
+            return listings.events_page(
+                db, and_(*conditions), cursor, limit, response,
+                compact=listing_format == "compact"
+            )
+        
+        # Get only non-cancelled events, with registrations and user data batched
+        query = (
+            db.query(models.Event)
+            .options(with_registrations())
+            .filter(*conditions)
+        )
+        events = paginate(
+            query, models.Event.event_date, models.Event.id,
+            lambda event: (event.event_date, event.id), cursor, limit, response
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            for event in events:
+                logger.debug("Event registrations", extra={
+                    "event_id": event.id,
+                    "registrations": [{"user_id": reg.user_id, "user": reg.user.email} for reg in event.registrations],
+                })
+        return compact_listing(events) if listing_format == "compact" else events
+
+    result = await run_db(db, load)
+    return etag.not_modified(response) if result is None else result
+
+@router.get("/nearby", response_model=Union[List[schemas.EventWithDistance], schemas.CompactNearbyEventList])
+async def get_nearby_events(
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: float = Query(10, gt=0, le=MAX_NEARBY_RADIUS_KM),
+    min_latitude: Optional[float] = Query(None, ge=-90, le=90),
+    max_latitude: Optional[float] = Query(None, ge=-90, le=90),
+    min_longitude: Optional[float] = Query(None, ge=-180, le=180),
+    max_longitude: Optional[float] = Query(None, ge=-180, le=180),
+    limit: int = Query(50, ge=1, le=100),
+    include_past: bool = False,
+    listing_format: ListingFormat = Query("full", alias="format"),
+    db: DbSession = Depends(get_read_session),
     current_user: models.User = Depends(get_current_user)
 ):
-    events = db.query(models.Event).filter(models.Event.organizer_id == current_user.id).all()
-    # Load registrations for each event with user data
-    for event in events:
-        event.registrations = db.query(models.EventRegistration).filter(
-            models.EventRegistration.event_id == event.id
-        ).options(
-            joinedload(models.EventRegistration.user)
-        ).all()
-        print(f"Event {event.id} has {len(event.registrations)} registrations")
-        for reg in event.registrations:
-            print(f"Registration: user_id={reg.user_id}, user={reg.user.email}")
-    return events
+    """Upcoming events (past ones too with ``include_past``) within
+    ``radius_km`` of a point, or inside a bounding box, nearest first."""
+    bbox = (min_latitude, max_latitude, min_longitude, max_longitude)
+    if all(value is not None for value in bbox):
+        if min_latitude > max_latitude:
+            raise HTTPException(status_code=400, detail="min_latitude must not exceed max_latitude")
+        # Search the circle around the box centre that contains the whole box,
+        # then keep only the points inside the box
+        if latitude is None or longitude is None:
+            latitude = (min_latitude + max_latitude) / 2
+            if min_longitude <= max_longitude:
+                longitude = (min_longitude + max_longitude) / 2
+            else:  # box crosses the antimeridian
+                longitude = ((min_longitude + max_longitude + 360) / 2 + 180) % 360 - 180
+        radius_km = max(
+            geo.haversine_km(latitude, longitude, lat, lon)
+            for lat in (min_latitude, max_latitude)
+            for lon in (min_longitude, max_longitude)
+        )
+    elif any(value is not None for value in bbox):
+        raise HTTPException(status_code=400, detail="Bounding box requires all four bounds")
+    elif latitude is None or longitude is None:
+        raise HTTPException(status_code=400, detail="latitude and longitude are required")
+
+    # Coarse filters in SQL: the indexed geohash cells covering the circle,
+    # the box around it (or the requested box) and the date
+    conditions = [models.Event.is_cancelled == False]
+    now = datetime.utcnow()
+    if min_latitude is not None:
+        conditions.append(models.Event.latitude.between(min_latitude, max_latitude))
+        conditions.append(longitude_between(min_longitude, max_longitude))
+
+    # Ordering by squared equirectangular distance (longitude differences
+    # wrapped across the antimeridian) is close enough to pick candidates;
+    # the exact haversine distance decides
+    lon_offset = models.Event.longitude - longitude
+    lon_offset = case((lon_offset > 180, lon_offset - 360), (lon_offset < -180, lon_offset + 360), else_=lon_offset)
+    lat_offset = models.Event.latitude - latitude
+    approximate_distance = lat_offset * lat_offset + math.cos(math.radians(latitude)) ** 2 * lon_offset * lon_offset
+
+    def nearest(db: Session, search_km: float) -> list:
+        """Up to ``limit`` (distance, id) pairs within ``search_km``, nearest first."""
+        cells = []
+        for lower, upper in geo.covering_ranges(latitude, longitude, search_km):
+            condition = models.Event.geohash >= lower
+            if upper is not None:
+                condition = and_(condition, models.Event.geohash < upper)
+            cells.append(condition)
+        min_lat, max_lat, min_lon, max_lon = geo.bounding_box(latitude, longitude, search_km)
+        upcoming = []
+        if not include_past:
+            upcoming = [models.Event.event_date >= now]
+            if db.get_bind().dialect.name == "sqlite":
+                # Without the hint SQLite walks the date index through every
+                # upcoming event instead of reading the few geohash cells
+                upcoming = [func.likely(upcoming[0])]
+        candidates = (
+            db.query(models.Event.id, models.Event.latitude, models.Event.longitude)
+            .filter(
+                *conditions, *upcoming, or_(*cells),
+                models.Event.latitude.between(min_lat, max_lat),
+                longitude_between(min_lon, max_lon),
+            )
+            .order_by(approximate_distance)
+            .limit(limit * 2)
+        )
+        matches = []
+        for event_id, lat, lon in candidates:
+            distance = geo.haversine_km(latitude, longitude, lat, lon)
+            if distance <= search_km:
+                matches.append((distance, event_id))
+        matches.sort()
+        return matches[:limit]
+
+    def load(db: Session):
+        # Nearest first: search a small circle and widen it until it holds
+        # ``limit`` events, so dense areas never load every event in range
+        search_km = radius_km * NEARBY_FIRST_RING
+        while True:
+            matches = nearest(db, search_km)
+            if len(matches) >= limit or search_km >= radius_km:
+                break
+            search_km = min(search_km * NEARBY_RING_GROWTH, radius_km)
+        if not matches:
+            return compact_listing([]) if listing_format == "compact" else []
+
+        distances = {event_id: distance for distance, event_id in matches}
+        events = (
+            db.query(models.Event)
+            .options(with_registrations())
+            .filter(models.Event.id.in_(distances))
+            .all()
+        )
+        for event in events:
+            event.distance_km = round(distances[event.id], 3)
+        events.sort(key=lambda event: (distances[event.id], event.id))
+        return compact_listing(events) if listing_format == "compact" else events
+
+    return await run_db(db, load)
+
+def _search_tiers(db: Session, tiers: list, limit: int) -> List[int]:
+    """Ids from each tier query in turn, soonest first within a tier, until
+    ``limit`` are found."""
+    ids: List[int] = []
+    for tier in tiers:
+        if len(ids) >= limit:
+            break
+        if ids:
+            tier = tier.filter(models.Event.id.notin_(ids))
+        ids += [
+            event_id for event_id, in
+            tier.order_by(models.Event.event_date, models.Event.id).limit(limit - len(ids))
+        ]
+    return ids
+
+def search_postgres(db: Session, words: List[str], conditions: list, limit: int) -> List[int]:
+    """Ids of matching events, best first: court name matches, then matches
+    across both columns, then misspelt court names."""
+    vector = literal_column(search.SEARCH_VECTOR)
+    matching = db.query(models.Event.id).filter(*conditions)
+    ids = _search_tiers(db, [
+        matching.filter(vector.op("@@")(
+            func.to_tsquery(literal_column("'simple'::regconfig"), search.tsquery(words, court_only))
+        ))
+        for court_only in (True, False)
+    ], limit)
+    if len(ids) >= limit:
+        return ids
+
+    phrase = " ".join(words)
+    db.execute(select(func.set_config(
+        "pg_trgm.word_similarity_threshold", str(search.SIMILARITY_THRESHOLD), True
+    )))
+    score = func.word_similarity(phrase, models.Event.court_location)
+    fuzzy = matching.filter(literal(phrase).op("<%")(models.Event.court_location))
+    if ids:
+        fuzzy = fuzzy.filter(models.Event.id.notin_(ids))
+    ids += [
+        event_id for event_id, in
+        fuzzy.order_by(score.desc(), models.Event.event_date, models.Event.id).limit(limit - len(ids))
+    ]
+    return ids
+
+def search_sqlite(db: Session, words: List[str], conditions: list, limit: int) -> List[int]:
+    """``search_postgres`` on FTS5."""
+    # Matching rowids are collected first and the events then walked in date
+    # order, which beats joining every match for common words
+    matching = db.query(models.Event.id).filter(*conditions)
+    ids = _search_tiers(db, [
+        matching.filter(models.Event.id.in_(
+            select(EVENTS_FTS.c.rowid).where(
+                literal_column("events_fts").op("MATCH")(search.fts_query(words, court_only))
+            )
+        ))
+        for court_only in (True, False)
+    ], limit)
+    match = search.fuzzy_fts_query(words)
+    if len(ids) >= limit or not match:
+        return ids
+
+    # Trigram candidates are ranked per distinct court name, then the events
+    # at the best names are fetched
+    trigram = literal_column("events_fts_trigram")
+    candidates = (
+        db.query(models.Event.court_location)
+        .join(EVENTS_FTS_TRIGRAM, EVENTS_FTS_TRIGRAM.c.rowid == models.Event.id)
+        .filter(*conditions, trigram.op("MATCH")(match))
+    )
+    scored = sorted((-search.similarity(words, name), name) for name, in candidates.distinct())
+    names = [name for score, name in scored if -score >= search.SIMILARITY_THRESHOLD][:search.MAX_FUZZY_NAMES]
+    if not names:
+        return ids
+    fuzzy = candidates.with_entities(models.Event.id).filter(models.Event.court_location.in_(names))
+    if ids:
+        fuzzy = fuzzy.filter(models.Event.id.notin_(ids))
+    order = case({name: position for position, name in enumerate(names)}, value=models.Event.court_location)
+    ids += [
+        event_id for event_id, in
+        fuzzy.order_by(order, models.Event.event_date, models.Event.id).limit(limit - len(ids))
+    ]
+    return ids
+
+@router.get("/search", response_model=Union[List[schemas.EventWithRegistrations], schemas.CompactEventList])
+async def search_events(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS),
+    include_past: bool = False,
+    listing_format: ListingFormat = Query("full", alias="format"),
+    db: DbSession = Depends(get_read_session),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Events whose court name or description matches ``q``: court name
+    matches first, soonest first within each kind of match.
+
+    Words match as prefixes; court names also match with a typo. Only
+    non-cancelled events are searched, and only upcoming ones unless
+    ``include_past`` is set.
+    """
+    words = search.terms(q)
+    if not words:
+        raise HTTPException(status_code=400, detail="Search query has no words")
+    conditions = [models.Event.is_cancelled == False]
+    if not include_past:
+        conditions.append(models.Event.event_date >= datetime.utcnow())
+
+    def load(db: Session):
+        if db.get_bind().dialect.name == "postgresql":
+            ids = search_postgres(db, words, conditions, limit)
+        else:
+            ids = search_sqlite(db, words, conditions, limit)
+        events = []
+        if ids:
+            position = {event_id: index for index, event_id in enumerate(ids)}
+            events = (
+                db.query(models.Event)
+                .options(with_registrations())
+                .filter(models.Event.id.in_(ids))
+                .all()
+            )
+            events.sort(key=lambda event: position[event.id])
+        return compact_listing(events) if listing_format == "compact" else events
+
+    return await run_db(db, load)
+
+@router.post("/stream-ticket", response_model=schemas.StreamTicket)
+async def get_stream_ticket(current_user: models.User = Depends(get_current_user)):
+    """A short-lived ticket for opening GET /api/events/stream."""
+    return {"ticket": create_stream_ticket(current_user.id), "expires_in": STREAM_TICKET_SECONDS}
+
+@router.get("/stream")
+async def stream_events(ticket: str):
+    """Server-sent events: one JSON delta (see ``broadcast``) per committed
+    change to events or registrations, for patching a loaded listing.
+
+    EventSource cannot send headers, so the stream takes a ticket from POST
+    /api/events/stream-ticket rather than the access token. The user must
+    still be active when it opens; after that the stream holds no session.
+    """
+    user_id = decode_stream_ticket(ticket)
+
+    def is_active() -> bool:
+        with SessionLocal() as db:
+            return bool(db.execute(select(models.User.is_active).where(models.User.id == user_id)).scalar())
+
+    if not await run_in_threadpool(is_active):
+        raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+
+    async def deltas():
+        async with broadcast.broadcaster.subscribe() as queue:
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield f"data: {payload}\n\n"
+
+    return StreamingResponse(
+        deltas(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/my-events", response_model=Union[List[schemas.EventWithRegistrations], schemas.CompactEventList])
+async def get_my_events(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    listing_format: ListingFormat = Query("full", alias="format"),
+    db: DbSession = Depends(get_read_session),
+    current_user: models.User = Depends(get_current_user)
+):
+    def load(db: Session):
+        if etag.check(db, request, response, (etag.EVENTS_STAMP, etag.USERS_STAMP), current_user.id):
+            return None
+        if listings.LISTING_FAST_PATH:
+            return listings.events_page(
+                db, models.Event.organizer_id == current_user.id, cursor, limit, response,
+                compact=listing_format == "compact"
+            )
+        
+        query = (
+            db.query(models.Event)
+            .options(with_registrations())
+            .filter(models.Event.organizer_id == current_user.id)
+        )
+        events = paginate(
+            query, models.Event.event_date, models.Event.id,
+            lambda event: (event.event_date, event.id), cursor, limit, response
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            for event in events:
+                logger.debug("Event registrations", extra={
+                    "event_id": event.id,
+                    "registrations": [{"user_id": reg.user_id, "user": reg.user.email} for reg in event.registrations],
+                })
+        return compact_listing(events) if listing_format == "compact" else events
+
+    result = await run_db(db, load)
+    return etag.not_modified(response) if result is None else result
 
 @router.post("/{event_id}/register", response_model=Union[schemas.EventRegistrationResponse, schemas.WithdrawalResponse])
-def register_for_event(
+async def register_for_event(
     event_id: int,
     is_withdraw: bool = False,
-    db: Session = Depends(get_db),
+    db: DbSession = Depends(get_session),
     current_user: models.User = Depends(get_current_user)
 ):
-    event = db.query(models.Event).filter(models.Event.id == event_id).first()
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
+    def register(db: Session):
+        event = db.query(models.Event).filter(models.Event.id == event_id).first()
+        if not event:
+            raise HTTPException(status_code=404, detail="Event not found")
     
-    if event.is_cancelled:
-        raise HTTPException(status_code=400, detail="Event is cancelled")
+        if event.is_cancelled:
+            raise HTTPException(status_code=400, detail="Event is cancelled")
     
-    # Find existing registration
-    existing_registration = db.query(models.EventRegistration).filter(
-        models.EventRegistration.event_id == event_id,
-        models.EventRegistration.user_id == current_user.id
-    ).first()
+        # Find existing registration
+        existing_registration = db.query(models.EventRegistration).filter(
+            models.EventRegistration.event_id == event_id,
+            models.EventRegistration.user_id == current_user.id
+        ).first()
     
-    if is_withdraw:
-        if not existing_registration:
-            raise HTTPException(status_code=400, detail="Not registered for this event")
+        if is_withdraw:
+            if not existing_registration:
+                raise HTTPException(status_code=400, detail="Not registered for this event")
         
-        # Delete the registration
-        db.delete(existing_registration)
-        db.commit()
+            # Delete the registration and free its place
+            db.delete(existing_registration)
+            participant_count = release_spot(db, event_id)
+            etag.bump(db, etag.EVENTS_STAMP)
+            broadcast.publish(db, broadcast.registration_removed(existing_registration, participant_count))
+            db.commit()
         
-        # Return a success message
-        return {"message": "Successfully withdrew from event"}
+            # Return a success message
+            return {"message": "Successfully withdrew from event"}
     
-    if existing_registration:
-        raise HTTPException(status_code=400, detail="Already registered for this event")
+        if existing_registration:
+            raise HTTPException(status_code=400, detail="Already registered for this event")
     
-    if event.max_participants:
-        # Count current registrations
-        current_participants = db.query(models.EventRegistration).filter(
-            models.EventRegistration.event_id == event_id
-        ).count()
-        
-        # Check if adding one more participant would exceed max_participants
-        if current_participants >= event.max_participants:
+        # Reserve a place; fails without writing anything if the event is full
+        participant_count = claim_spot(db, event_id)
+        if participant_count is None:
+            db.rollback()
             raise HTTPException(status_code=400, detail="Event is full")
     
-    registration = models.EventRegistration(
-        event_id=event_id,
-        user_id=current_user.id
-    )
-    db.add(registration)
-    db.commit()
-    db.refresh(registration)
+        registration = models.EventRegistration(
+            event_id=event_id,
+            user_id=current_user.id
+        )
+        db.add(registration)
+        try:
+            db.flush()
+            etag.bump(db, etag.EVENTS_STAMP)
+            broadcast.publish(db, broadcast.registration_added(registration, current_user, participant_count))
+            db.commit()
+        except IntegrityError:
+            # A concurrent request registered the same user first; the
+            # rollback also returns the place claimed above
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Already registered for this event")
+        db.refresh(registration)
     
-    # Load the event and user data
-    registration = (
-        db.query(models.EventRegistration)
-        .options(
-            joinedload(models.EventRegistration.event),
-            joinedload(models.EventRegistration.user)
+        # Load the event and user data
+        registration = (
+            db.query(models.EventRegistration)
+            .options(
+                joinedload(models.EventRegistration.event),
+                joinedload(models.EventRegistration.user)
+            )
+            .filter(models.EventRegistration.id == registration.id)
+            .first()
         )
-        .filter(models.EventRegistration.id == registration.id)
-        .first()
-    )
     
-    return registration
+        return registration
+
+    return await run_db(db, register)
 
 @router.delete("/{event_id}")
-def cancel_event(
+async def cancel_event(
     event_id: int,
-    db: Session = Depends(get_db),
+    db: DbSession = Depends(get_session),
     current_user: models.User = Depends(get_current_user)
 ):
-    # Get the event
-    event = db.query(models.Event).filter(models.Event.id == event_id).first()
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
+    def cancel(db: Session):
+        # Get the event
+        event = db.query(models.Event).filter(models.Event.id == event_id).first()
+        if not event:
+            raise HTTPException(status_code=404, detail="Event not found")
     
-    # Check if the current user is the organizer
-    if event.organizer_id != current_user.id:
-        raise HTTPException(
-            status_code=403,
-            detail="Only the event organizer can cancel this event"
-        )
+        # Check if the current user is the organizer
+        if event.organizer_id != current_user.id:
+            raise HTTPException(
+                status_code=403,
+                detail="Only the event organizer can cancel this event"
+            )
     
-    # Check if event is already cancelled
-    if event.is_cancelled:
-        raise HTTPException(
-            status_code=400,
-            detail="Event is already cancelled"
-        )
+        # Check if event is already cancelled
+        if event.is_cancelled:
+            raise HTTPException(
+                status_code=400,
+                detail="Event is already cancelled"
+            )
     
-    # Cancel the event
-    event.is_cancelled = True
-    db.commit()
+        # Cancel the event
+        event.is_cancelled = True
+        etag.bump(db, etag.EVENTS_STAMP)
+        broadcast.publish(db, broadcast.event_cancelled(event.id))
+        db.commit()
     
-    return {"message": "Event cancelled successfully"}
+        return {"message": "Event cancelled successfully"}
+
+    return await run_db(db, cancel)
 
 @router.get("/my-registrations", response_model=List[schemas.EventRegistrationResponse])
-def get_my_registrations(
-    db: Session = Depends(get_db),
+async def get_my_registrations(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: DbSession = Depends(get_read_session),
     current_user: models.User = Depends(get_current_user)
 ):
-    print(f"Getting registrations for user {current_user.id}")
-    
-    # Get registrations with event and user data using a join
-    registrations = (
-        db.query(models.EventRegistration)
-        .options(
-            joinedload(models.EventRegistration.event),
-            joinedload(models.EventRegistration.user)
-        )
-        .filter(models.EventRegistration.user_id == current_user.id)
-        .all()
-    )
-    
-    # Load registrations for each event and calculate available spots
-    for registration in registrations:
-        if registration.event:
-            # Get all registrations for this event
-            event_registrations = db.query(models.EventRegistration).filter(
-                models.EventRegistration.event_id == registration.event.id
-            ).options(
+    def load(db: Session):
+        logger.debug("Getting registrations", extra={"user_id": current_user.id})
+        if etag.check(db, request, response, (etag.EVENTS_STAMP, etag.USERS_STAMP), current_user.id):
+            return None
+        if listings.LISTING_FAST_PATH:
+            return listings.registrations_page(db, current_user, cursor, limit, response)
+        
+        # Get registrations with event and user data using a join, ordered by
+        # event date; available spots come from the event's participant counter
+        query = (
+            db.query(models.EventRegistration)
+            .join(models.EventRegistration.event)
+            .options(
+                contains_eager(models.EventRegistration.event),
                 joinedload(models.EventRegistration.user)
-            ).all()
-            
-            # Update the event's registrations
-            registration.event.registrations = event_registrations
-            
-            # Calculate available spots
-            if registration.event.max_participants:
-                current_participants = len(event_registrations)
-                registration.event.available_spots = max(0, registration.event.max_participants - current_participants)
-            else:
-                registration.event.available_spots = None
+            )
+            .filter(models.EventRegistration.user_id == current_user.id)
+        )
+        registrations = paginate(
+            query, models.Event.event_date, models.EventRegistration.id,
+            lambda registration: (registration.event.event_date, registration.id),
+            cursor, limit, response
+        )
     
-    return registrations
+        return registrations
+
+    result = await run_db(db, load)
+    return etag.not_modified(response) if result is None else result
 
 @router.delete("/registrations/{registration_id}")
-def cancel_registration(
+async def cancel_registration(
     registration_id: int,
-    db: Session = Depends(get_db),
+    db: DbSession = Depends(get_session),
     current_user: models.User = Depends(get_current_user)
 ):
-    # Get the registration
-    registration = db.query(models.EventRegistration).filter(
-        models.EventRegistration.id == registration_id
-    ).first()
+    def cancel(db: Session):
+        # Get the registration
+        registration = db.query(models.EventRegistration).filter(
+            models.EventRegistration.id == registration_id
+        ).first()
     
-    if not registration:
-        raise HTTPException(status_code=404, detail="Registration not found")
+        if not registration:
+            raise HTTPException(status_code=404, detail="Registration not found")
     
-    # Check if the current user is the one who registered
-    if registration.user_id != current_user.id:
-        raise HTTPException(
-            status_code=403,
-            detail="You can only cancel your own registrations"
-        )
+        # Check if the current user is the one who registered
+        if registration.user_id != current_user.id:
+            raise HTTPException(
+                status_code=403,
+                detail="You can only cancel your own registrations"
+            )
     
-    # Check if the event is in the past
-    event = registration.event
-    event_date = event.event_date
-    if isinstance(event_date, str):
-        event_date = datetime.fromisoformat(event_date.replace('Z', '+00:00'))
-    if event_date < datetime.now():
-        raise HTTPException(
-            status_code=400,
-            detail="Cannot cancel registration for a past event"
-        )
+        # Check if the event is in the past
+        event = registration.event
+        event_date = event.event_date
+        if isinstance(event_date, str):
+            event_date = datetime.fromisoformat(event_date.replace('Z', '+00:00'))
+        if event_date < datetime.now():
+            raise HTTPException(
+                status_code=400,
+                detail="Cannot cancel registration for a past event"
+            )
     
-    # Delete the registration
-    db.delete(registration)
-    db.commit()
+        # Delete the registration and free its place
+        db.delete(registration)
+        participant_count = release_spot(db, event.id)
+        etag.bump(db, etag.EVENTS_STAMP)
+        broadcast.publish(db, broadcast.registration_removed(registration, participant_count))
+        db.commit()
     
-    return {"message": "Registration cancelled successfully"} 
\ No newline at end of file
+        return {"message": "Registration cancelled successfully"}
+
+    return await run_db(db, cancel)
\ No newline at end of file
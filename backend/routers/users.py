@@ -1,31 +1,51 @@
-import os
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, status, UploadFile, File
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
-from datetime import datetime
 
-from database import get_db
+import database
+from database import DbSession, get_session, run_db
+import etag
 import models
 import schemas
-from routers.auth import oauth2_scheme, get_current_user
+import uploads
+from routers.auth import get_current_user, get_read_session, invalidate_user
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
+def make_avatar(user_id: int, filename: str):
+    """Background task after an upload: thumbnails, then the avatar recorded
+    on the user so listings start pointing at it."""
+    with database.SessionLocal() as db:
+        if uploads.create_avatar(db, user_id, filename):
+            invalidate_user(user_id)
 
 @router.get("/me", response_model=schemas.User)
-def read_users_me(current_user: models.User = Depends(get_current_user)):
+def read_users_me(
+    request: Request,
+    response: Response,
+    current_user: models.User = Depends(get_current_user)
+):
+    # The profile is already loaded (usually from the user cache, checked
+    # against the users stamp), so the ETag is derived from its columns
+    profile_etag = etag.make_etag(*(
+        getattr(current_user, attr.key) for attr in models.User.__mapper__.column_attrs
+        if attr.key != "hashed_password"
+    ))
+    response.headers["ETag"] = profile_etag
+    response.headers["Cache-Control"] = etag.CACHE_CONTROL
+    if etag.matches(request, profile_etag):
+        return etag.not_modified(response)
     return current_user
 
 @router.put("/me", response_model=schemas.User)
 async def update_user(
+    background_tasks: BackgroundTasks,
     first_name: Optional[str] = None,
     last_name: Optional[str] = None,
     tennis_level: Optional[models.TennisLevel] = None,
     profile_image: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db),
+    db: DbSession = Depends(get_session),
     current_user: models.User = Depends(get_current_user)
 ):
     # Update text fields
@@ -38,38 +58,45 @@ async def update_user(
 
     # Handle profile image upload
     if profile_image is not None:
-        # Delete old image if exists
-        if current_user.profile_image:
-            old_image_path = os.path.join(UPLOAD_DIR, current_user.profile_image)
-            if os.path.exists(old_image_path):
-                os.remove(old_image_path)
+        # Stream the new image to disk in chunks (off the event loop)
+        new_filename = await run_in_threadpool(
+            uploads.store_profile_image, profile_image.file, profile_image.filename, current_user.id
+        )
 
-        # Save new image
-        file_extension = os.path.splitext(profile_image.filename)[1]
-        new_filename = f"profile_{current_user.id}_{datetime.utcnow().timestamp()}{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, new_filename)
-        
-        with open(file_path, "wb") as buffer:
-            content = await profile_image.read()
-            buffer.write(content)
+        # Thumbnails and removal of the old image happen after the response
+        old_filename = current_user.profile_image
+        if old_filename != new_filename:
+            background_tasks.add_task(uploads.remove_profile_image, old_filename)
+        background_tasks.add_task(make_avatar, current_user.id, new_filename)
         
         current_user.profile_image = new_filename
+        current_user.profile_thumbnail = None
 
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+    def save(db: Session):
+        # The users stamp advances as the row is flushed (see routers.auth)
+        db.commit()
+        db.refresh(current_user)
+        return current_user
+
+    user = await run_db(db, save)
+    # Drop anything cached by a concurrent request between flush and commit
+    invalidate_user(user.id)
+    return user
 
 @router.get("/me/events", response_model=List[schemas.Event])
-def get_user_events(
-    db: Session = Depends(get_db),
+async def get_user_events(
+    db: DbSession = Depends(get_read_session),
     current_user: models.User = Depends(get_current_user)
 ):
-    # Get events where user is registered
-    registrations = db.query(models.EventRegistration).filter(
-        models.EventRegistration.user_id == current_user.id
-    ).all()
-    
-    event_ids = [reg.event_id for reg in registrations]
-    events = db.query(models.Event).filter(models.Event.id.in_(event_ids)).all()
-    
-    return events 
\ No newline at end of file
+    def load(db: Session):
+        # Get events where user is registered
+        registrations = db.query(models.EventRegistration).filter(
+            models.EventRegistration.user_id == current_user.id
+        ).all()
+        
+        event_ids = [reg.event_id for reg in registrations]
+        events = db.query(models.Event).filter(models.Event.id.in_(event_ids)).all()
+        
+        return events
+
+    return await run_db(db, load) 
\ No newline at end of file
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List, ForwardRef
+from pydantic import BaseModel, EmailStr, Field
+from typing import Any, Dict, Optional, List, Literal, ForwardRef, Union
 from datetime import datetime
 from models import TennisLevel, Sex
 
@@ -19,6 +19,7 @@ class User(UserBase):
     is_active: bool
     created_at: datetime
     profile_image: Optional[str] = None
+    profile_thumbnail: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -40,6 +41,7 @@ class Event(EventBase):
     is_cancelled: bool
     created_at: datetime
     organizer_id: int
+    participant_count: int = 0
     available_spots: Optional[int] = None
 
     class Config:
@@ -67,16 +69,75 @@ class EventWithRegistrations(Event):
     class Config:
         from_attributes = True
 
+class EventWithDistance(EventWithRegistrations):
+    distance_km: float
+
+    class Config:
+        from_attributes = True
+
+# Compact listing shape (?format=compact): registrations reference users by id
+# and every user is sent once in the side-loaded ``users`` map
+class RegistrationRef(BaseModel):
+    id: int
+    user_id: int
+    registration_date: datetime
+
+    class Config:
+        from_attributes = True
+
+class CompactEvent(Event):
+    registrations: List[RegistrationRef] = []
+
+class CompactEventWithDistance(CompactEvent):
+    distance_km: float
+
+class CompactEventList(BaseModel):
+    events: List[CompactEvent]
+    users: Dict[int, User]
+
+class CompactNearbyEventList(BaseModel):
+    events: List[CompactEventWithDistance]
+    users: Dict[int, User]
+
 class Token(BaseModel):
     access_token: str
     token_type: str
 
+class StreamTicket(BaseModel):
+    ticket: str
+    expires_in: int
+
 class TokenData(BaseModel):
     email: Optional[str] = None
+    user_id: Optional[int] = None
 
 class WithdrawalResponse(BaseModel):
     message: str
 
+# POST /api/batch: several GET endpoints in one round trip
+MAX_BATCH_SIZE = 10
+
+class BatchOperation(BaseModel):
+    id: Optional[str] = None
+    method: Literal["GET", "POST", "DELETE"] = "GET"
+    path: str
+    params: Dict[str, Union[str, int, float, bool]] = {}
+    body: Any = None  # the JSON body of a POST
+    etag: Optional[str] = None  # sent as this operation's If-None-Match
+
+class BatchRequest(BaseModel):
+    requests: List[BatchOperation] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class BatchResult(BaseModel):
+    id: Optional[str] = None
+    status: int
+    headers: Dict[str, str] = {}
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    results: List[BatchResult]
+
 # Update forward references
 EventRegistrationResponse.model_rebuild()
-EventWithRegistrations.model_rebuild() 
\ No newline at end of file
+EventWithRegistrations.model_rebuild()
+EventWithDistance.model_rebuild() 
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""Full-text search over events' court_location and description.
+
+Two kinds of match, both index-backed:
+
+* words: every query word must start a word in either column ("centr ct"
+  finds "Central Court"). Events whose court name has every word come
+  first, then those matching across both columns. Postgres uses a GIN index
+  over a weighted ``tsvector`` of both columns (court name words weigh A);
+  SQLite an FTS5 table (``events_fts``) with prefix indexes.
+* misspelt court names: when the word matches find fewer results than
+  asked for, courts whose names are trigram-similar to the query fill the
+  rest ("centarl park" still finds Central Park). Postgres uses pg_trgm's
+  ``<%`` on a trigram GIN index; SQLite an FTS5 trigram table
+  (``events_fts_trigram``) narrows the candidates and ``similarity`` below
+  ranks them.
+
+The SQLite tables are external-content FTS5 tables kept in step with
+``events`` by triggers, so Core bulk inserts are indexed too. The DDL here
+is applied by ``create_all`` (see models.py) and by the migration.
+"""
+import re
+from typing import List, Set
+
+MAX_TERMS = 8
+MAX_TERM_LENGTH = 40
+
+# Minimum share of a query word's trigrams found in a court name word for
+# the name to count as a misspelling of it; one wrong letter in a word of
+# five or more letters keeps at least half
+SIMILARITY_THRESHOLD = 0.5
+# Distinct court names considered per misspelt query on SQLite
+MAX_FUZZY_NAMES = 20
+
+_WORD = re.compile(r"[^\W_]+")
+
+# Postgres: court name words weigh A, description words B (parenthesised,
+# as an index expression must be)
+SEARCH_VECTOR = (
+    "(setweight(to_tsvector('simple'::regconfig, coalesce(court_location, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(description, '')), 'B'))"
+)
+TRIGRAM_EXTENSION = "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+
+SQLITE_DDL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+        court_location, description, content='events', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS events_fts_trigram USING fts5(
+        court_location, content='events', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN
+        INSERT INTO events_fts (rowid, court_location, description)
+        VALUES (new.id, new.court_location, new.description);
+        INSERT INTO events_fts_trigram (rowid, court_location) VALUES (new.id, new.court_location);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN
+        INSERT INTO events_fts (events_fts, rowid, court_location, description)
+        VALUES ('delete', old.id, old.court_location, old.description);
+        INSERT INTO events_fts_trigram (events_fts_trigram, rowid, court_location)
+        VALUES ('delete', old.id, old.court_location);
+    END
+    """,
+    # Only text changes reindex; counters and cancellations leave FTS alone
+    """
+    CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF court_location, description ON events BEGIN
+        INSERT INTO events_fts (events_fts, rowid, court_location, description)
+        VALUES ('delete', old.id, old.court_location, old.description);
+        INSERT INTO events_fts_trigram (events_fts_trigram, rowid, court_location)
+        VALUES ('delete', old.id, old.court_location);
+        INSERT INTO events_fts (rowid, court_location, description)
+        VALUES (new.id, new.court_location, new.description);
+        INSERT INTO events_fts_trigram (rowid, court_location) VALUES (new.id, new.court_location);
+    END
+    """,
+)
+SQLITE_DROP = (
+    "DROP TRIGGER IF EXISTS events_fts_update",
+    "DROP TRIGGER IF EXISTS events_fts_delete",
+    "DROP TRIGGER IF EXISTS events_fts_insert",
+    "DROP TABLE IF EXISTS events_fts_trigram",
+    "DROP TABLE IF EXISTS events_fts",
+)
+# Index existing rows after creating the tables
+SQLITE_REBUILD = (
+    "INSERT INTO events_fts (events_fts) VALUES ('rebuild')",
+    "INSERT INTO events_fts_trigram (events_fts_trigram) VALUES ('rebuild')",
+)
+
+
+def terms(query: str) -> List[str]:
+    """Lowercased words of ``query``, the only characters that reach SQL."""
+    return [word[:MAX_TERM_LENGTH] for word in _WORD.findall(query.lower())][:MAX_TERMS]
+
+
+def tsquery(words: List[str], court_only: bool = False) -> str:
+    """Postgres ``to_tsquery`` text: every word as a prefix, of the court
+    name (weight A) only if ``court_only``."""
+    weight = "A" if court_only else ""
+    return " & ".join(f"{word}:*{weight}" for word in words)
+
+
+def fts_query(words: List[str], court_only: bool = False) -> str:
+    """FTS5 MATCH text: every word as a prefix, of the court name only if
+    ``court_only``."""
+    match = " ".join(f'"{word}"*' for word in words)
+    return "{court_location}: (" + match + ")" if court_only else match
+
+
+def fuzzy_fts_query(words: List[str]) -> str:
+    """FTS5 trigram MATCH text finding names that may be misspellings of ``words``.
+
+    A single wrong letter leaves one half of a word intact, so each word
+    matches on either half (substrings of three or more letters). Words
+    shorter than three letters are not used.
+    """
+    clauses = []
+    for word in words:
+        if len(word) < 3:
+            continue
+        if len(word) < 6:
+            halves = {word[:3], word[-3:]}
+        else:
+            halves = {word[:len(word) // 2], word[len(word) // 2:]}
+        clauses.append("(" + " OR ".join(f'"{half}"' for half in sorted(halves)) + ")")
+    return " AND ".join(clauses)
+
+
+def _trigrams(word: str) -> Set[str]:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(words: List[str], text: str) -> float:
+    """How well ``text`` matches ``words`` allowing for typos, from 0 to 1.
+
+    For each query word, the largest share of its trigrams found in one word
+    of ``text`` (as pg_trgm's word_similarity does), averaged over the query.
+    """
+    candidates = [_trigrams(word) for word in _WORD.findall((text or "").lower())]
+    if not words or not candidates:
+        return 0.0
+    total = 0.0
+    for word in words:
+        wanted = _trigrams(word)
+        total += max(len(wanted & candidate) for candidate in candidates) / len(wanted)
+    return total / len(words)
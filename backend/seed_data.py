@@ -0,0 +1,314 @@
+"""Fill a database with synthetic users, events and registrations.
+
+Rows are generated from a seeded random number generator, so the same
+arguments (and --reference-date) always produce the same dataset, and are
+written in bulk: multi-row INSERTs through SQLAlchemy Core, or COPY on
+PostgreSQL. No ORM objects are created, so a million rows take minutes,
+not hours.
+
+The data is shaped like real usage rather than uniform noise:
+
+* events happen at a fixed set of courts clustered around US cities, and a
+  few popular courts host most of them;
+* users have a mix of tennis levels, sexes and ages;
+* some events are in the past and some upcoming, mostly in the evening,
+  and a few are cancelled;
+* event popularity is heavy-tailed: many events only have their organiser,
+  some fill up. Every organiser is registered for their own event, as the
+  API does, and ``participant_count`` matches the registrations.
+
+    python seed_data.py --database-url postgresql://.../racketbuddy_load \\
+        --users 100000 --events 300000 --registrations 1000000
+
+New rows get ids after the existing ones, so the script can add to a
+database that already has data. It creates missing tables but does not run
+migrations. Every seeded user's password is --password.
+"""
+import argparse
+import csv
+import io
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", required=True, help="database to fill (never defaults to DATABASE_URL)")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--events", type=int, default=30000)
+    parser.add_argument("--registrations", type=int, default=100000,
+                        help="target total, organisers included; events cannot take more than max_participants")
+    parser.add_argument("--courts", type=int, default=2000, help="distinct court locations")
+    parser.add_argument("--past-fraction", type=float, default=0.4, help="share of events already played")
+    parser.add_argument("--cancelled-fraction", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--reference-date", type=lambda value: datetime.strptime(value, "%Y-%m-%d"),
+                        default=datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0),
+                        help="YYYY-MM-DD that 'past' and 'upcoming' are relative to (default: today)")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--batch-size", type=int, default=10000, help="rows per INSERT/COPY batch")
+    parser.add_argument("--method", choices=("auto", "copy", "insert"), default="auto",
+                        help="auto uses COPY on PostgreSQL and multi-row INSERTs elsewhere")
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ["DATABASE_URL"] = args.database_url
+os.environ["DB_ASYNC"] = "false"
+
+from sqlalchemy import func, insert, select, text
+
+import database
+import etag
+import geo
+import models
+from passwords import pwd_context
+
+# (name, latitude, longitude, spread in km, share of courts)
+CITIES = (
+    ("New York", 40.7128, -74.0060, 15, 20),
+    ("Los Angeles", 34.0522, -118.2437, 25, 16),
+    ("Chicago", 41.8781, -87.6298, 15, 10),
+    ("Houston", 29.7604, -95.3698, 20, 8),
+    ("Phoenix", 33.4484, -112.0740, 20, 6),
+    ("Miami", 25.7617, -80.1918, 15, 8),
+    ("Atlanta", 33.7490, -84.3880, 15, 6),
+    ("Dallas", 32.7767, -96.7970, 20, 6),
+    ("San Francisco", 37.7749, -122.4194, 12, 8),
+    ("Seattle", 47.6062, -122.3321, 12, 5),
+    ("Boston", 42.3601, -71.0589, 10, 5),
+    ("Denver", 39.7392, -104.9903, 12, 4),
+)
+COURT_NAMES = ("Park", "Tennis Center", "Recreation Center", "Community Courts", "Racquet Club", "High School Courts")
+STREETS = ("Oak", "Maple", "Riverside", "Lincoln", "Washington", "Lakeview", "Hillside", "Central", "Sunset", "Harbor")
+FIRST_NAMES = ("James", "Maria", "Wei", "Aisha", "Carlos", "Emma", "Noah", "Priya", "Liam", "Sofia", "Yuki", "Omar")
+LAST_NAMES = ("Smith", "Garcia", "Chen", "Johnson", "Patel", "Kim", "Nguyen", "Brown", "Lopez", "Williams", "Khan")
+DESCRIPTIONS = (None, None, "Casual rally, all welcome", "Doubles, bring balls", "Singles ladder match",
+                "Drills then match play", "Looking for a hitting partner")
+
+LEVELS = ((models.TennisLevel.BEGINNER, 35), (models.TennisLevel.INTERMEDIATE, 45), (models.TennisLevel.ADVANCED, 20))
+SEXES = ((models.Sex.MALE, 52), (models.Sex.FEMALE, 44), (models.Sex.OTHER, 4))
+MAX_PARTICIPANTS = ((2, 30), (4, 45), (6, 10), (8, 10), (12, 5))
+# Start hours: mornings and especially evenings
+HOURS = tuple(range(7, 22))
+HOUR_WEIGHTS = (3, 5, 5, 4, 2, 2, 3, 2, 3, 4, 8, 10, 10, 7, 3)
+
+# Registrations per event beyond the organiser scale with a lognormal weight:
+# most events stay small, a few are popular
+POPULARITY_SIGMA = 1.2
+
+USER_COLUMNS = ("id", "email", "hashed_password", "first_name", "last_name", "date_of_birth", "sex",
+                "tennis_level", "is_active", "created_at")
+EVENT_COLUMNS = ("id", "court_location", "latitude", "longitude", "geohash", "event_date", "event_time",
+                 "max_participants", "participant_count", "description", "is_cancelled", "created_at", "organizer_id")
+REGISTRATION_COLUMNS = ("id", "event_id", "user_id", "registration_date")
+
+
+def split(pairs):
+    values, weights = zip(*pairs)
+    return values, weights
+
+
+def make_courts(rng: random.Random, count: int):
+    """(name, latitude, longitude) per court, and cumulative Zipf weights so a
+    few courts are busy."""
+    cities = [city[:4] for city in CITIES]
+    shares = [city[4] for city in CITIES]
+    courts = []
+    for index in range(count):
+        name, lat, lon, spread_km = rng.choices(cities, shares)[0]
+        lat += rng.gauss(0, spread_km / 111)
+        lon += rng.gauss(0, spread_km / (111 * math.cos(math.radians(lat))))
+        courts.append((f"{rng.choice(STREETS)} {rng.choice(COURT_NAMES)}, {name}", round(lat, 6), round(lon, 6)))
+    return courts, list(accumulate(1 / rank for rank in range(1, count + 1)))
+
+
+def user_rows(rng: random.Random, first_id: int, count: int, reference: datetime, hashed_password: str):
+    levels, level_weights = split(LEVELS)
+    sexes, sex_weights = split(SEXES)
+    for user_id in range(first_id, first_id + count):
+        age = min(75, max(16, rng.gauss(34, 11)))
+        yield (
+            user_id, f"seed{user_id}@example.com", hashed_password,
+            rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+            reference - timedelta(days=int(age * 365.25)),
+            rng.choices(sexes, sex_weights)[0], rng.choices(levels, level_weights)[0],
+            True, reference - timedelta(days=rng.uniform(0, 730)),
+        )
+
+
+def popularity_scale(rng: random.Random, extra_per_event: float, max_extra: int) -> float:
+    """Factor for the popularity weights so that, once each event is capped at
+    its capacity, events average ``extra_per_event`` registrations besides the
+    organiser's (found by bisection over a sample)."""
+    capacities, capacity_weights = split(MAX_PARTICIPANTS)
+    sample = [
+        (rng.lognormvariate(0, POPULARITY_SIGMA), min(rng.choices(capacities, capacity_weights)[0] - 1, max_extra))
+        for _ in range(10000)
+    ]
+
+    def average(scale):
+        return sum(min(room, scale * weight) for weight, room in sample) / len(sample)
+
+    low, high = 0.0, 1.0
+    while average(high) < extra_per_event and high < 1e6:
+        high *= 2
+    for _ in range(50):
+        middle = (low + high) / 2
+        low, high = (middle, high) if average(middle) < extra_per_event else (low, middle)
+    return high
+
+
+def event_and_registration_rows(rng: random.Random, first_event_id: int, first_registration_id: int,
+                                user_ids: range, reference: datetime, courts, court_weights):
+    """Yields (event row, [registration rows]) per event."""
+    capacities, capacity_weights = split(MAX_PARTICIPANTS)
+    extra_per_event = max(0, args.registrations - args.events) / max(1, args.events)
+    scale = popularity_scale(random.Random(args.seed), extra_per_event, len(user_ids) - 1)
+    registration_id = first_registration_id
+    for event_id in range(first_event_id, first_event_id + args.events):
+        location, lat, lon = rng.choices(courts, cum_weights=court_weights)[0]
+        if rng.random() < args.past_fraction:
+            day = reference - timedelta(days=rng.randint(1, 365))
+        else:
+            day = reference + timedelta(days=rng.randint(0, 60))
+        when = day + timedelta(hours=rng.choices(HOURS, HOUR_WEIGHTS)[0], minutes=rng.choice((0, 30)))
+        created = min(when - timedelta(days=rng.uniform(1, 30)), reference)
+        last_signup = min(when, reference)
+        capacity = rng.choices(capacities, capacity_weights)[0]
+        organizer_id = rng.choice(user_ids)
+
+        expected = scale * rng.lognormvariate(0, POPULARITY_SIGMA)
+        extra = int(expected) + (rng.random() < expected % 1)
+        extra = min(extra, capacity - 1, len(user_ids) - 1)
+        attendees = [organizer_id] + [user for user in rng.sample(user_ids, extra + 1) if user != organizer_id][:extra]
+
+        registrations = []
+        for position, user_id in enumerate(attendees):
+            signed_up = created if position == 0 else created + (last_signup - created) * rng.random()
+            registrations.append((registration_id, event_id, user_id, signed_up))
+            registration_id += 1
+        yield (
+            event_id, location, lat, lon, geo.encode(lat, lon), when, when, capacity, len(attendees),
+            rng.choice(DESCRIPTIONS), rng.random() < args.cancelled_fraction, created, organizer_id,
+        ), registrations
+
+
+def _copy_value(value):
+    if value is None:
+        return ""  # NULL in COPY's csv format
+    if isinstance(value, (models.Sex, models.TennisLevel)):
+        return value.name  # SQLAlchemy stores enum names
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+
+def write_copy(conn, table, columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(value) for value in row])
+    buffer.seek(0)
+    cursor = conn.connection.dbapi_connection.cursor()
+    cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def write_insert(conn, table, columns, rows):
+    conn.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+
+
+class Writer:
+    """Buffers rows per table and writes them a batch at a time."""
+
+    def __init__(self, use_copy: bool):
+        self.write = write_copy if use_copy else write_insert
+        self.counts = {}
+
+    def flush(self, table, columns, rows):
+        if not rows:
+            return
+        with database.engine.begin() as conn:
+            self.write(conn, table, columns, rows)
+        self.counts[table.name] = self.counts.get(table.name, 0) + len(rows)
+
+
+def next_id(conn, model) -> int:
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def main():
+    if args.events and not args.users:
+        sys.exit("--events needs --users: organisers and registrants are drawn from the seeded users")
+    is_postgres = database.engine.dialect.name == "postgresql"
+    use_copy = args.method == "copy" or (args.method == "auto" and is_postgres)
+    if use_copy and not is_postgres:
+        sys.exit("--method copy needs PostgreSQL")
+
+    models.Base.metadata.create_all(bind=database.engine)
+    with database.engine.connect() as conn:
+        first_user, first_event, first_registration = (
+            next_id(conn, models.User), next_id(conn, models.Event), next_id(conn, models.EventRegistration)
+        )
+
+    rng = random.Random(args.seed)
+    writer = Writer(use_copy)
+    started = time.perf_counter()
+    hashed_password = pwd_context.hash(args.password)
+
+    users = models.User.__table__
+    batch = []
+    for row in user_rows(rng, first_user, args.users, args.reference_date, hashed_password):
+        batch.append(row)
+        if len(batch) >= args.batch_size:
+            writer.flush(users, USER_COLUMNS, batch)
+            batch = []
+    writer.flush(users, USER_COLUMNS, batch)
+    print(f"users: {writer.counts.get('users', 0)} rows in {time.perf_counter() - started:.1f}s")
+
+    courts, court_weights = make_courts(rng, args.courts)
+    events, registrations = models.Event.__table__, models.EventRegistration.__table__
+    event_batch, registration_batch = [], []
+    rows = event_and_registration_rows(
+        rng, first_event, first_registration, range(first_user, first_user + args.users),
+        args.reference_date, courts, court_weights,
+    )
+    for event_row, registration_rows in rows:
+        event_batch.append(event_row)
+        registration_batch.extend(registration_rows)
+        if len(event_batch) >= args.batch_size or len(registration_batch) >= args.batch_size:
+            writer.flush(events, EVENT_COLUMNS, event_batch)  # before the registrations referencing them
+            writer.flush(registrations, REGISTRATION_COLUMNS, registration_batch)
+            event_batch, registration_batch = [], []
+    writer.flush(events, EVENT_COLUMNS, event_batch)
+    writer.flush(registrations, REGISTRATION_COLUMNS, registration_batch)
+    print(f"events: {writer.counts.get('events', 0)} rows, registrations: "
+          f"{writer.counts.get('event_registrations', 0)} rows in {time.perf_counter() - started:.1f}s")
+
+    with database.engine.begin() as conn:
+        if is_postgres:
+            # Ids were assigned here, so move the serial sequences past them
+            for table in (users, events, registrations):
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                    f"(SELECT coalesce(max(id), 1) FROM {table.name}))"
+                ))
+        conn.execute(text("ANALYZE"))
+    db = database.SessionLocal()
+    try:
+        etag.bump(db, etag.EVENTS_STAMP, etag.USERS_STAMP)  # listings cached by clients are stale now
+        db.commit()
+    finally:
+        db.close()
+    print(f"done in {time.perf_counter() - started:.1f}s ({'COPY' if use_copy else 'multi-row INSERT'})")
+
+
+if __name__ == "__main__":
+    main()
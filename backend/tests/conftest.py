@@ -0,0 +1,82 @@
+"""Fixtures running the app against a throwaway SQLite database.
+
+The settings are read at import time, so they are set before any app
+module is imported. ``DB_ASYNC=true`` creates the aiosqlite engine next to
+the sync one, and every test using ``client`` runs twice: once with the
+routers on the async driver, once with their sessions overridden back to
+the threadpool (DB_ASYNC=false).
+"""
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "tests.db")
+os.environ["DB_ASYNC"] = "true"
+os.environ["DATABASE_REPLICA_URL"] = ""
+os.environ["EVENTS_BROADCAST"] = "memory"
+os.environ["QUERY_WATCH"] = "strict"
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+import models
+from main import app
+from routers import auth
+
+PASSWORD = "secret-password"
+
+
+@pytest.fixture(params=["sync", "async"])
+def client(request):
+    models.Base.metadata.drop_all(bind=database.engine)
+    models.Base.metadata.create_all(bind=database.engine)
+    auth.user_cache.clear()
+    if request.param == "sync":
+        app.dependency_overrides[database.get_async_db] = database.get_db
+    try:
+        with TestClient(app) as client:
+            yield client
+            # Its connections belong to this client's event loop
+            client.portal.call(database.async_engine.dispose)
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def signup(client):
+    """Register a user and return the Authorization header for them."""
+    def signup(email: str, tennis_level: str = "intermediate") -> dict:
+        response = client.post("/api/auth/register", json={
+            "email": email,
+            "password": PASSWORD,
+            "first_name": "Test",
+            "last_name": "Player",
+            "date_of_birth": "1990-01-01T00:00:00Z",
+            "sex": "male",
+            "tennis_level": tennis_level,
+        })
+        assert response.status_code == 200, response.text
+        token = client.post("/api/auth/token", data={"username": email, "password": PASSWORD}).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+    return signup
+
+
+@pytest.fixture
+def create_event(client):
+    """Create an upcoming event as ``headers``' user and return it."""
+    def create_event(headers: dict, days: float = 1, **fields) -> dict:
+        when = (datetime.utcnow() + timedelta(days=days)).isoformat()
+        body = {
+            "court_location": "Central Park Tennis Center",
+            "latitude": 40.78,
+            "longitude": -73.96,
+            "event_date": when,
+            "event_time": when,
+            **fields,
+        }
+        response = client.post("/api/events/", headers=headers, json=body)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return create_event
@@ -0,0 +1,54 @@
+import database
+import models
+import querywatch
+from routers import auth
+
+
+def users_queries(recorded) -> list:
+    return [statement for statement in recorded.statements if "FROM users" in statement]
+
+
+def test_cached_user_is_used_until_a_user_changes(client, signup):
+    headers = signup("player@example.com")
+    assert client.get("/api/users/me", headers=headers).status_code == 200
+
+    with querywatch.record() as recorded:
+        assert client.get("/api/users/me", headers=headers).status_code == 200
+    assert users_queries(recorded) == []
+
+    # Any change to a user advances the users stamp, which drops the entry
+    other = client.put("/api/users/me", headers=signup("third@example.com"), params={"first_name": "Renamed"})
+    assert other.status_code == 200, other.text
+    with querywatch.record() as recorded:
+        assert client.get("/api/users/me", headers=headers).status_code == 200
+    assert len(users_queries(recorded)) == 1
+
+
+def test_deactivated_user_is_rejected_on_the_next_request(client, signup):
+    headers = signup("player@example.com")
+    assert client.get("/api/users/me", headers=headers).status_code == 200
+
+    # A bulk UPDATE, as another worker or a script would run it: no mapper
+    # events, and nothing clears this process's cache
+    with database.SessionLocal() as db:
+        db.query(models.User).filter(models.User.email == "player@example.com").update({models.User.is_active: False})
+        db.commit()
+
+    assert client.get("/api/users/me", headers=headers).status_code == 401
+
+
+def test_edited_user_is_not_served_stale(client, signup, monkeypatch):
+    headers = signup("player@example.com")
+    first = client.get("/api/users/me", headers=headers)
+
+    # As if the edit ran in another worker, whose invalidation cannot reach
+    # this process's cache
+    monkeypatch.setattr(auth, "invalidate_user", lambda user_id: None)
+    with database.SessionLocal() as db:
+        user = db.query(models.User).filter(models.User.email == "player@example.com").one()
+        user.first_name = "Edited"
+        db.commit()
+
+    second = client.get("/api/users/me", headers=headers)
+    assert second.json()["first_name"] == "Edited"
+    assert second.headers["ETag"] != first.headers["ETag"]
@@ -0,0 +1,72 @@
+def run_batch(client, headers: dict, *operations: dict) -> list:
+    response = client.post("/api/batch", headers=headers, json={"requests": list(operations)})
+    assert response.status_code == 200, response.text
+    return response.json()["results"]
+
+
+def test_mixed_batch_reads_its_own_writes(client, signup, create_event):
+    organiser = signup("organiser@example.com")
+    player = signup("player@example.com")
+    event = create_event(organiser)
+    when = event["event_date"]
+
+    results = run_batch(
+        client, player,
+        {"id": "before", "path": "/api/events/my-registrations"},
+        {"id": "register", "method": "POST", "path": f"/api/events/{event['id']}/register"},
+        {"id": "create", "method": "POST", "path": "/api/events/", "body": {
+            "court_location": "Riverside Courts", "latitude": 40.8, "longitude": -73.97,
+            "event_date": when, "event_time": when,
+        }},
+        {"id": "after", "path": "/api/events/my-registrations"},
+        {"id": "events", "path": "/api/events/"},
+    )
+    by_id = {result["id"]: result for result in results}
+    assert [result["id"] for result in results] == ["before", "register", "create", "after", "events"]
+    assert all(result["status"] == 200 for result in results), results
+    assert by_id["before"]["body"] == []
+    created = by_id["create"]["body"]
+    assert [registration["event_id"] for registration in by_id["after"]["body"]] == [event["id"], created["id"]]
+    listed = {item["id"]: item for item in by_id["events"]["body"]}
+    assert listed[event["id"]]["participant_count"] == 2
+    assert created["id"] in listed
+
+    # The writes were committed, not just visible inside the batch
+    assert len(client.get("/api/events/my-registrations", headers=player).json()) == 2
+
+
+def test_failed_operation_does_not_poison_later_ones(client, signup, create_event):
+    organiser = signup("organiser@example.com")
+    player = signup("player@example.com")
+    event = create_event(organiser, max_participants=2)
+
+    results = run_batch(
+        client, player,
+        {"method": "POST", "path": "/api/events/999/register"},
+        {"method": "POST", "path": "/api/events/abc/register"},
+        {"method": "POST", "path": f"/api/events/{event['id']}/register"},
+        {"method": "POST", "path": f"/api/events/{event['id']}/register"},
+        {"method": "DELETE", "path": f"/api/events/{event['id']}"},
+        {"path": "/api/events/my-registrations"},
+        {"path": "/api/users/me"},
+    )
+    assert [result["status"] for result in results] == [404, 422, 200, 400, 403, 200, 200]
+    assert results[3]["body"] == {"detail": "Already registered for this event"}
+    assert [registration["event_id"] for registration in results[5]["body"]] == [event["id"]]
+    assert results[6]["body"]["email"] == "player@example.com"
+
+
+def test_unknown_and_unbatchable_paths(client, signup):
+    headers = signup("player@example.com")
+    results = run_batch(
+        client, headers,
+        {"path": "/api/nope"},
+        {"method": "POST", "path": "/api/events/stream-ticket"},
+        {"method": "POST", "path": "/api/batch"},
+        {"path": "/api/users/me"},
+    )
+    assert [result["status"] for result in results] == [404, 404, 404, 200]
+    assert results[0]["body"] == {"detail": "GET /api/nope cannot be batched"}
+
+    response = client.post("/api/batch", headers=headers, json={"requests": [{"method": "PATCH", "path": "/api/users/me"}]})
+    assert response.status_code == 422
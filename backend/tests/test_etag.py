@@ -0,0 +1,71 @@
+"""Conditional GETs on the event listing (ETag / If-None-Match)."""
+
+import querywatch
+
+
+def listing_etag(client, headers) -> str:
+    response = client.get("/api/events/", headers=headers)
+    assert response.status_code == 200
+    return response.headers["etag"]
+
+
+def assert_changed(client, headers, old: str) -> str:
+    """The listing's ETag moved on and the old one no longer gets a 304."""
+    response = client.get("/api/events/", headers={**headers, "If-None-Match": old})
+    assert response.status_code == 200
+    assert response.headers["etag"] != old
+    return response.headers["etag"]
+
+
+def test_unchanged_listing_is_not_modified(client, signup, create_event):
+    headers = signup("organizer@example.com")
+    create_event(headers)
+    etag = listing_etag(client, headers)
+
+    response = client.get("/api/events/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_writes_change_the_etag(client, signup, create_event):
+    organizer = signup("organizer@example.com")
+    player = signup("player@example.com")
+    etag = listing_etag(client, organizer)
+
+    event = create_event(organizer)
+    etag = assert_changed(client, organizer, etag)
+
+    assert client.post(f"/api/events/{event['id']}/register", headers=player).status_code == 200
+    etag = assert_changed(client, organizer, etag)
+
+    withdraw = client.post(f"/api/events/{event['id']}/register", headers=player, params={"is_withdraw": "true"})
+    assert withdraw.status_code == 200
+    etag = assert_changed(client, organizer, etag)
+
+    assert client.delete(f"/api/events/{event['id']}", headers=organizer).status_code == 200
+    assert_changed(client, organizer, etag)
+
+
+def stamp_after_events(statements) -> bool:
+    """Whether ``change_stamps`` is written only after the ``events`` row."""
+    writes = [s.split()[1] for s in statements if s.lstrip().upper().startswith("UPDATE")]
+    return "events" in writes and writes.index("events") < writes.index("change_stamps")
+
+
+def test_writes_lock_events_before_change_stamps(client, signup, create_event):
+    # Cancel and register take row locks in the same order, so a cancel
+    # racing a registration cannot deadlock on Postgres
+    organizer = signup("organizer@example.com")
+    player = signup("player@example.com")
+    event = create_event(organizer)
+
+    with querywatch.record() as registering:
+        client.post(f"/api/events/{event['id']}/register", headers=player)
+    with querywatch.record() as withdrawing:
+        client.post(f"/api/events/{event['id']}/register", headers=player, params={"is_withdraw": "true"})
+    with querywatch.record() as cancelling:
+        client.delete(f"/api/events/{event['id']}", headers=organizer)
+
+    for recorded in (registering, withdrawing, cancelling):
+        assert stamp_after_events(recorded.statements), recorded.statements
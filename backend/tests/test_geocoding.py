@@ -0,0 +1,85 @@
+import asyncio
+
+import httpx
+import pytest
+
+import geocoding
+
+PLACE = {"display_name": "Central Park Tennis Center, New York", "lat": "40.7896", "lon": "-73.9619"}
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Serve LocationIQ from a MockTransport; returns the requests it received."""
+    monkeypatch.setattr(geocoding, "geocode_cache", geocoding.GeocodeCache(16, 60))
+    requests = []
+    state = {"status": 200, "release": None}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if state["release"] is not None:
+            await state["release"].wait()
+        if state["status"] != 200:
+            return httpx.Response(state["status"], text="upstream down")
+        return httpx.Response(200, json=[PLACE])
+
+    def run(coroutine_function):
+        async def with_client():
+            await geocoding.start_http_client(httpx.MockTransport(handler))
+            try:
+                return await coroutine_function(state)
+            finally:
+                await geocoding.close_http_client()
+        return asyncio.run(with_client())
+
+    return requests, run
+
+
+def test_lookups_are_formatted_and_cached(upstream):
+    requests, run = upstream
+
+    async def lookups(state):
+        first = await geocoding.geocode("Central Park")
+        again = await geocoding.geocode("  central   PARK ")
+        return first, again
+
+    first, again = run(lookups)
+    expected = [{"display_name": PLACE["display_name"], "lat": PLACE["lat"], "lon": PLACE["lon"]}]
+    assert first == again == expected
+    assert len(requests) == 1
+    assert requests[0].url.params["q"] == "central park"
+    assert requests[0].url.params["key"] == geocoding.LOCATIONIQ_API_KEY
+
+
+def test_concurrent_misses_share_one_upstream_call(upstream):
+    requests, run = upstream
+
+    async def lookups(state):
+        state["release"] = asyncio.Event()
+        pending = asyncio.gather(*(geocoding.geocode("Central Park") for _ in range(5)))
+        while not requests:
+            await asyncio.sleep(0)
+        state["release"].set()
+        return await pending
+
+    results = run(lookups)
+    assert len(requests) == 1
+    assert all(result == results[0] != [] for result in results)
+    assert geocoding.geocode_cache.stats()["coalesced"] == 4
+
+
+def test_upstream_errors_are_not_cached(upstream):
+    requests, run = upstream
+
+    async def lookups(state):
+        state["status"] = 500
+        failed = await geocoding.geocode("Central Park")
+        state["status"] = 200
+        recovered = await geocoding.geocode("Central Park")
+        return failed, recovered
+
+    failed, recovered = run(lookups)
+    assert failed == []
+    assert recovered != []
+    assert len(requests) == 2
+    assert geocoding.geocode_cache.stats()["upstream_errors"] == 1
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import listings
+import querywatch
+
+LISTINGS = ("/api/events/", "/api/events/my-events", "/api/events/my-registrations", "/api/users/me/events")
+
+
+def test_plain_date_filters_cover_whole_days(client, signup, create_event):
+    headers = signup("organiser@example.com")
+    tomorrow = create_event(headers, days=1)
+    later = create_event(headers, days=3)
+    day = (datetime.utcnow() + timedelta(days=1)).date().isoformat()
+
+    def listed(**params):
+        response = client.get("/api/events/", headers=headers, params=params)
+        assert response.status_code == 200, response.text
+        return [event["id"] for event in response.json()]
+
+    assert listed(date_from=day, date_to=day) == [tomorrow["id"]]
+    assert listed(date_from=day) == [tomorrow["id"], later["id"]]
+    assert listed(date_to=day) == [tomorrow["id"]]
+    assert listed(date_from=later["event_date"]) == [later["id"]]
+    response = client.get("/api/events/", headers=headers, params={"date_from": day, "date_to": "2000-01-01"})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("fast_path", [True, False])
+def test_listings_query_count_does_not_grow_with_events(client, signup, create_event, monkeypatch, fast_path):
+    monkeypatch.setattr(listings, "LISTING_FAST_PATH", fast_path)
+    organiser = signup("organiser@example.com")
+    players = [signup(f"player{n}@example.com") for n in range(3)]
+
+    def add_events(count: int):
+        for _ in range(count):
+            event = create_event(organiser, max_participants=10)
+            for headers in players:
+                response = client.post(f"/api/events/{event['id']}/register", headers=headers)
+                assert response.status_code == 200, response.text
+
+    def statements(path: str) -> int:
+        client.get(path, headers=organiser)  # caches the user
+        with querywatch.record() as recorded:
+            response = client.get(path, headers=organiser)
+        assert response.status_code == 200, response.text
+        assert not recorded.repeated(), recorded.statements
+        recorded.assert_within(querywatch.QUERY_BUDGETS[("GET", path)])
+        return len(recorded.statements)
+
+    add_events(2)
+    few = {path: statements(path) for path in LISTINGS}
+    add_events(8)
+    many = {path: statements(path) for path in LISTINGS}
+    assert many == few
+
+
+@pytest.mark.parametrize("path", ["/api/events/", "/api/events/my-events"])
+@pytest.mark.parametrize("fast_path", [True, False])
+def test_compact_format_sends_each_user_once(client, signup, create_event, monkeypatch, fast_path, path):
+    monkeypatch.setattr(listings, "LISTING_FAST_PATH", fast_path)
+    organiser = signup("organiser@example.com")
+    players = [signup(f"player{n}@example.com") for n in range(2)]
+    for n in range(5):
+        event = create_event(organiser, days=1 + n)
+        for headers in players[:n % 3]:
+            assert client.post(f"/api/events/{event['id']}/register", headers=headers).status_code == 200
+
+    def pages(**params) -> list:
+        """Every page of the listing, following X-Next-Cursor."""
+        result, cursor = [], None
+        while True:
+            page_params = {**params, "limit": 2, **({"cursor": cursor} if cursor else {})}
+            response = client.get(path, headers=organiser, params=page_params)
+            assert response.status_code == 200, response.text
+            result.append(response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                return result
+
+    full = [event for page in pages() for event in page]
+    compact = pages(format="compact")
+    assert len(compact) == 3  # 5 events, 2 per page: the cursor is kept
+
+    listed = []
+    for page in compact:
+        assert set(page) == {"events", "users"}
+        referenced = set()
+        for event in page["events"]:
+            for registration in event["registrations"]:
+                assert set(registration) == {"id", "user_id", "registration_date"}
+                referenced.add(registration["user_id"])
+        # One entry per user on the page, however many events they joined
+        assert sorted(int(user_id) for user_id in page["users"]) == sorted(referenced)
+        for user_id, user in page["users"].items():
+            assert user["id"] == int(user_id)
+        listed.extend(page["events"])
+
+    # The same events and registrations as the full shape, resolved by id
+    users = {user_id: user for page in compact for user_id, user in page["users"].items()}
+    assert [event["id"] for event in listed] == [event["id"] for event in full]
+    for compact_event, full_event in zip(listed, full):
+        resolved = [
+            {**registration, "user": users[str(registration["user_id"])]}
+            for registration in compact_event["registrations"]
+        ]
+        expected = [
+            {key: registration[key] for key in ("id", "user_id", "registration_date", "user")}
+            for registration in full_event["registrations"]
+        ]
+        assert resolved == expected
+    # Nine registrations by three users, each user sent once per page
+    assert sum(len(event["registrations"]) for event in listed) == 9
+    assert [len(page["users"]) for page in compact] == [2, 3, 2]
@@ -0,0 +1,62 @@
+import re
+
+import pytest
+
+import main
+import querywatch
+
+TOKEN = "scrape-token"
+INTERNAL_ENDPOINTS = ["/metrics", "/api/db/pool", "/api/geocode/stats"]
+
+
+def sample(text: str, name: str, **labels) -> float:
+    """The value of one series in a Prometheus text exposition, 0 if absent."""
+    wanted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf"^{re.escape(name)}\{{{re.escape(wanted)}\}} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+@pytest.mark.parametrize("path", INTERNAL_ENDPOINTS)
+def test_internal_endpoints_need_the_token(client, monkeypatch, path):
+    monkeypatch.setattr(main, "INTERNAL_TOKEN", None)
+    assert client.get(path).status_code == 404
+    assert client.get(path, headers={"Authorization": f"Bearer {TOKEN}"}).status_code == 404
+
+    monkeypatch.setattr(main, "INTERNAL_TOKEN", TOKEN)
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get(path, headers={"Authorization": f"Bearer {TOKEN}"}).status_code == 200
+
+
+def test_metrics_count_requests_and_queries(client, signup, create_event, monkeypatch):
+    monkeypatch.setattr(main, "INTERNAL_TOKEN", TOKEN)
+    headers = signup("player@example.com")
+    create_event(headers)
+
+    def scrape() -> str:
+        response = client.get("/metrics", headers={"Authorization": f"Bearer {TOKEN}"})
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        return response.text
+
+    route = {"method": "GET", "route": "/api/events/"}
+    before = scrape()
+    with querywatch.record() as recorded:
+        for _ in range(3):
+            assert client.get("/api/events/", headers=headers).status_code == 200
+        assert client.get("/api/events/", headers=headers, params={"limit": 0}).status_code == 422
+    after = scrape()
+
+    def delta(name: str, **labels) -> float:
+        return sample(after, name, **labels) - sample(before, name, **labels)
+
+    assert delta("http_requests_total", **route, status="200") == 3
+    assert delta("http_requests_total", **route, status="422") == 1
+    assert delta("http_request_duration_seconds_count", **route) == 4
+    # Every statement the listings sent is counted against their route and
+    # against the engine
+    assert len(recorded.statements) > 0
+    assert delta("http_request_db_queries_count", **route) == 4
+    assert delta("http_request_db_queries_sum", **route) == len(recorded.statements)
+    engines = delta("db_queries_total", engine="sync") + delta("db_queries_total", engine="async")
+    assert engines >= len(recorded.statements)
@@ -0,0 +1,54 @@
+"""Nearby search: geohash covering and the /api/events/nearby endpoint."""
+import math
+import random
+
+import geo
+
+
+def destination(latitude, longitude, distance_km, bearing):
+    """The point ``distance_km`` from a start point along ``bearing`` (radians)."""
+    phi, angle = math.radians(latitude), distance_km / geo.EARTH_RADIUS_KM
+    phi2 = math.asin(math.sin(phi) * math.cos(angle) + math.cos(phi) * math.sin(angle) * math.cos(bearing))
+    dlambda = math.atan2(
+        math.sin(bearing) * math.sin(angle) * math.cos(phi),
+        math.cos(angle) - math.sin(phi) * math.sin(phi2),
+    )
+    return math.degrees(phi2), (longitude + math.degrees(dlambda) + 180) % 360 - 180
+
+
+def test_covering_ranges_contain_every_point_of_the_circle():
+    rng = random.Random(7)
+    for _ in range(500):
+        latitude, longitude = rng.uniform(-90, 90), rng.uniform(-180, 180)
+        radius_km = 10 ** rng.uniform(-1.5, 2.7)
+        ranges = geo.covering_ranges(latitude, longitude, radius_km)
+        assert len(ranges) <= geo.MAX_COVERING_CELLS
+        for _ in range(20):
+            point = destination(latitude, longitude, radius_km * math.sqrt(rng.random()), rng.uniform(0, 2 * math.pi))
+            geohash = geo.encode(*point)
+            assert any(lower <= geohash and (upper is None or geohash < upper) for lower, upper in ranges)
+
+
+def test_covering_ranges_stay_close_to_the_circle():
+    # A 10 km search in a city reads a few precision-5 cells, not a 40 km block
+    ranges = geo.covering_ranges(40.7128, -74.0060, 10)
+    assert all(len(lower) >= 5 for lower, upper in ranges)
+
+
+def test_nearby_returns_upcoming_events_nearest_first(client, signup, create_event):
+    headers = signup("organizer@example.com")
+    here = (40.7128, -74.0060)
+    for distance_km, days in ((3, 1), (1, 2), (8, 3), (20, 4), (2, -1)):
+        latitude, longitude = destination(*here, distance_km, 1.0)
+        create_event(headers, days=days, latitude=latitude, longitude=longitude, court_location=f"{distance_km} km")
+
+    response = client.get("/api/events/nearby", headers=headers, params={
+        "latitude": here[0], "longitude": here[1], "radius_km": 10,
+    })
+    assert response.status_code == 200
+    assert [event["court_location"] for event in response.json()] == ["1 km", "3 km", "8 km"]
+
+    with_past = client.get("/api/events/nearby", headers=headers, params={
+        "latitude": here[0], "longitude": here[1], "radius_km": 10, "include_past": "true", "limit": 2,
+    })
+    assert [event["court_location"] for event in with_past.json()] == ["1 km", "2 km"]
@@ -0,0 +1,49 @@
+import threading
+
+from passlib.hash import bcrypt
+
+import database
+import models
+import passwords
+from conftest import PASSWORD
+
+
+def login(client, email: str):
+    return client.post("/api/auth/token", data={"username": email, "password": PASSWORD})
+
+
+def stored_hash(email: str) -> str:
+    with database.SessionLocal() as db:
+        return db.query(models.User.hashed_password).filter(models.User.email == email).scalar()
+
+
+def test_login_upgrades_an_outdated_hash(client, signup):
+    signup("player@example.com")
+    old_hash = bcrypt.using(rounds=passwords.BCRYPT_ROUNDS + 1).hash(PASSWORD)
+    with database.SessionLocal() as db:
+        db.query(models.User).filter(models.User.email == "player@example.com").update({models.User.hashed_password: old_hash})
+        db.commit()
+
+    assert login(client, "player@example.com").status_code == 200
+    new_hash = stored_hash("player@example.com")
+    assert new_hash != old_hash
+    assert new_hash.startswith(f"$2b${passwords.BCRYPT_ROUNDS:02d}$")
+    assert passwords.pwd_context.verify(PASSWORD, new_hash)
+
+    # Up to date now, so the next login leaves it alone
+    assert login(client, "player@example.com").status_code == 200
+    assert stored_hash("player@example.com") == new_hash
+
+
+def test_hashing_backlog_is_turned_away(client, signup, monkeypatch):
+    signup("player@example.com")
+    # Every slot taken by hashes still in flight
+    monkeypatch.setattr(passwords, "_pending", threading.BoundedSemaphore(1))
+    passwords._pending.acquire()
+
+    response = login(client, "player@example.com")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    passwords._pending.release()
+    assert login(client, "player@example.com").status_code == 200
@@ -0,0 +1,16 @@
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_no_router_query_scans_a_large_table(tmp_path):
+    # The script configures the app from its environment at import time, so
+    # it runs in its own process against its own scratch database
+    result = subprocess.run(
+        [sys.executable, "check_query_plans.py", "--database-url", "sqlite:///" + str(tmp_path / "plans.db")],
+        cwd=BACKEND, capture_output=True, text=True, timeout=300,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert " 0 with sequential scans" in result.stdout.splitlines()[-1]
@@ -0,0 +1,57 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import broadcast
+import listings
+
+
+@pytest.mark.parametrize("fast_path", [True, False])
+@pytest.mark.parametrize("cap", [0, -1])
+def test_non_positive_cap_means_unlimited(client, signup, create_event, monkeypatch, fast_path, cap):
+    monkeypatch.setattr(listings, "LISTING_FAST_PATH", fast_path)
+    organiser = signup("organiser@example.com")
+    event = create_event(organiser, max_participants=cap)
+    assert event["available_spots"] is None
+
+    player = signup("player@example.com")
+    response = client.post(f"/api/events/{event['id']}/register", headers=player)
+    assert response.status_code == 200, response.text
+
+    listed = client.get("/api/events/", headers=organiser, params={"open_spots": True}).json()
+    assert [(item["id"], item["available_spots"], item["participant_count"]) for item in listed] == [(event["id"], None, 2)]
+
+
+def test_event_and_organiser_registration_commit_together(client, signup, create_event, monkeypatch):
+    organiser = signup("organiser@example.com")
+
+    def fail(db, delta):
+        raise RuntimeError("publish failed")
+
+    # Fails after both rows are added; neither may be left behind
+    monkeypatch.setattr(broadcast, "publish", fail)
+    with pytest.raises(RuntimeError):
+        create_event(organiser)
+    monkeypatch.undo()
+
+    assert client.get("/api/events/", headers=organiser).json() == []
+    assert client.get("/api/events/my-registrations", headers=organiser).json() == []
+
+
+def test_concurrent_registrations_do_not_overbook(client, signup, create_event):
+    organiser = signup("organiser@example.com")
+    event = create_event(organiser, max_participants=4)  # the organiser takes one
+    players = [signup(f"player{n}@example.com") for n in range(12)]
+    start = threading.Barrier(len(players))
+
+    def register(headers: dict) -> int:
+        start.wait()
+        return client.post(f"/api/events/{event['id']}/register", headers=headers).status_code
+
+    with ThreadPoolExecutor(len(players)) as pool:
+        statuses = list(pool.map(register, players))
+
+    assert sorted(statuses) == [200] * 3 + [400] * 9
+    listed = client.get("/api/events/", headers=organiser).json()
+    assert [(item["participant_count"], len(item["registrations"])) for item in listed] == [(4, 4)]
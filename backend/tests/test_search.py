@@ -0,0 +1,17 @@
+import time
+
+
+def test_search_compares_event_dates_in_utc(client, signup, create_event, monkeypatch):
+    headers = signup("organiser@example.com")
+    soon = create_event(headers, days=2 / 24, court_location="Riverside Courts")
+
+    # Local time 14 hours ahead of UTC must not hide events starting in two hours
+    monkeypatch.setenv("TZ", "Etc/GMT-14")
+    time.tzset()
+    try:
+        response = client.get("/api/events/search", headers=headers, params={"q": "riverside"})
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    assert response.status_code == 200, response.text
+    assert [event["id"] for event in response.json()] == [soon["id"]]
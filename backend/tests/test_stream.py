@@ -0,0 +1,45 @@
+import time
+from datetime import datetime, timedelta
+
+from jose import jwt
+
+import database
+import models
+from routers import auth
+
+
+def test_stream_ticket_is_short_lived_and_single_purpose(client, signup):
+    headers = signup("player@example.com")
+    response = client.post("/api/events/stream-ticket", headers=headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["expires_in"] == auth.STREAM_TICKET_SECONDS
+
+    claims = jwt.decode(body["ticket"], auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+    assert claims["purpose"] == auth.STREAM_TICKET_PURPOSE
+    assert claims["exp"] - time.time() <= auth.STREAM_TICKET_SECONDS + 1
+
+    # The ticket does not work as an access token
+    ticket_headers = {"Authorization": f"Bearer {body['ticket']}"}
+    assert client.get("/api/users/me", headers=ticket_headers).status_code == 401
+
+    assert client.post("/api/events/stream-ticket").status_code == 401
+
+
+def test_stream_rejects_tokens_expired_tickets_and_inactive_users(client, signup):
+    headers = signup("player@example.com")
+    access_token = headers["Authorization"].split()[1]
+    assert client.get("/api/events/stream", params={"ticket": access_token}).status_code == 401
+    assert client.get("/api/events/stream", params={"token": access_token}).status_code == 422
+
+    expired = jwt.encode(
+        {"uid": 1, "purpose": auth.STREAM_TICKET_PURPOSE, "exp": datetime.utcnow() - timedelta(seconds=1)},
+        auth.SECRET_KEY, algorithm=auth.ALGORITHM,
+    )
+    assert client.get("/api/events/stream", params={"ticket": expired}).status_code == 401
+
+    ticket = client.post("/api/events/stream-ticket", headers=headers).json()["ticket"]
+    with database.SessionLocal() as db:
+        db.query(models.User).update({models.User.is_active: False})
+        db.commit()
+    assert client.get("/api/events/stream", params={"ticket": ticket}).status_code == 401
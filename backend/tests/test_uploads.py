@@ -0,0 +1,106 @@
+"""Profile images: thumbnails are only advertised once they exist."""
+import io
+import os
+
+import pytest
+from PIL import Image
+
+import database
+import models
+import uploads
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+def png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 200), "green").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def upload(client, headers, content: bytes):
+    response = client.put("/api/users/me", headers=headers, files={"profile_image": ("me.png", content, "image/png")})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_avatar_is_recorded_once_written(client, signup, upload_dir):
+    headers = signup("player@example.com")
+    uploaded = upload(client, headers, png_bytes())
+    assert uploaded["profile_thumbnail"] is None  # the thumbnails are made after the response
+
+    me = client.get("/api/users/me", headers=headers).json()
+    assert me["profile_thumbnail"] == uploads.thumbnail_name(me["profile_image"], uploads.AVATAR_SIZE)
+    assert (upload_dir / me["profile_thumbnail"]).exists()
+
+
+def test_failed_thumbnail_is_not_advertised(client, signup):
+    headers = signup("player@example.com")
+    upload(client, headers, b"not an image")
+    me = client.get("/api/users/me", headers=headers).json()
+    assert me["profile_image"] and me["profile_thumbnail"] is None
+
+
+def test_backfill_records_existing_uploads(client, signup, upload_dir):
+    signup("player@example.com")
+    (upload_dir / "profile_1_old.png").write_bytes(png_bytes())
+    with database.SessionLocal() as db:
+        db.query(models.User).update({"profile_image": "profile_1_old.png"})
+        db.commit()
+        assert uploads.create_avatar(db, 1, "profile_1_old.png")
+        assert db.get(models.User, 1).profile_thumbnail == "profile_1_old_64.png"
+    assert os.path.exists(upload_dir / "profile_1_old_256.png")
+
+
+def test_oversized_upload_is_rejected_before_it_is_read(client, signup, upload_dir, monkeypatch):
+    monkeypatch.setattr(uploads, "MAX_PROFILE_IMAGE_BYTES", 1024)
+    headers = signup("player@example.com")
+    limit = uploads.MAX_PROFILE_IMAGE_BYTES + uploads.UPLOAD_FORM_OVERHEAD
+    oversized = b"x" * (limit + 1)
+
+    # Declared too large: answered from the headers alone
+    received = []
+
+    async def receive():
+        received.append(True)
+        return {"type": "http.request", "body": oversized, "more_body": False}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def inner(scope, receive, send):
+        raise AssertionError("the app must not see the request")
+
+    scope = {
+        "type": "http", "method": "PUT", "path": "/api/users/me",
+        "headers": [(b"content-length", str(len(oversized)).encode())],
+    }
+    client.portal.call(uploads.UploadLimitMiddleware(inner), scope, receive, send)
+    assert sent[0]["status"] == 413
+    assert received == []
+
+    response = client.put("/api/users/me", headers=headers, files={"profile_image": ("me.png", oversized, "image/png")})
+    assert response.status_code == 413
+    assert response.json()["detail"].startswith("Profile image must be at most")
+
+    # Chunked, so no Content-Length: cut off once the body goes over
+    def chunks():
+        for _ in range(4):
+            yield b"x" * (limit // 2)
+
+    response = client.put(
+        "/api/users/me", headers={**headers, "Content-Type": "multipart/form-data; boundary=b"}, content=chunks(),
+    )
+    assert response.status_code == 413
+
+    # Within the overhead, but the file itself over the limit
+    response = client.put("/api/users/me", headers=headers, files={"profile_image": ("me.png", b"x" * 2048, "image/png")})
+    assert response.status_code == 413
+    assert list(upload_dir.iterdir()) == []
+    assert client.get("/api/users/me", headers=headers).json()["profile_image"] is None
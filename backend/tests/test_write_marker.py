@@ -0,0 +1,48 @@
+import time
+
+from fastapi import Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import database
+from routers import auth
+
+USER_ID = 7
+
+marked = FastAPI()
+marked.add_middleware(auth.WriteMarkerMiddleware)
+
+
+@marked.post("/write")
+def write(db: Session = Depends(database.get_db)):
+    # Runs in the threadpool, like the sync handlers
+    db.info["user_id"] = USER_ID
+    db.execute(text("SELECT 1"))
+    db.commit()
+    return {}
+
+
+@marked.get("/read")
+def read(request: Request):
+    return {"primary": auth.wrote_recently(request, USER_ID)}
+
+
+def test_write_marker_keeps_reads_on_primary(monkeypatch):
+    client = TestClient(marked)
+    assert auth.WRITE_MARKER_HEADER not in client.get("/read").headers
+    marker = client.post("/write").headers[auth.WRITE_MARKER_HEADER]
+
+    def primary(headers: dict) -> bool:
+        return client.get("/read", headers=headers).json()["primary"]
+
+    assert primary({auth.WRITE_MARKER_HEADER: marker})
+    assert not primary({})
+    assert not primary({auth.WRITE_MARKER_HEADER: marker[:-2] + "xx"})
+    assert not primary({auth.WRITE_MARKER_HEADER: auth.create_write_marker(USER_ID + 1, time.time())})
+    # An access token is signed with the same key but is not a marker
+    token = auth.create_access_token({"sub": "player@example.com", "uid": USER_ID})
+    assert not primary({auth.WRITE_MARKER_HEADER: token})
+
+    monkeypatch.setattr(database, "REPLICA_STICKY_SECONDS", 0)
+    assert not primary({auth.WRITE_MARKER_HEADER: marker})
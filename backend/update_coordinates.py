@@ -2,6 +2,8 @@ from sqlalchemy import create_engine, text
 import os
 from dotenv import load_dotenv
 
+import geo
+
 load_dotenv()
 
 # Use the same DATABASE_URL as in your database.py
@@ -9,15 +11,18 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://user:password@
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 
-# SQL command to update NULL latitude and longitude to central US coordinates
+LATITUDE, LONGITUDE = 39.8283, -98.5795
+
+# SQL command to update NULL latitude and longitude to central US coordinates,
+# with the matching geohash so nearby search finds the events there
 update_sql = text("""
     UPDATE events
-    SET latitude = 39.8283, longitude = -98.5795
+    SET latitude = :latitude, longitude = :longitude, geohash = :geohash
     WHERE latitude IS NULL OR longitude IS NULL
 """)
 
 with engine.connect() as conn:
-    conn.execute(update_sql)
+    conn.execute(update_sql, {"latitude": LATITUDE, "longitude": LONGITUDE, "geohash": geo.encode(LATITUDE, LONGITUDE)})
     conn.commit()
 
 print("Updated NULL latitude and longitude values to central US coordinates (39.8283, -98.5795).") 
\ No newline at end of file
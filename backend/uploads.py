@@ -0,0 +1,201 @@
+"""Profile image storage.
+
+Uploads are copied to disk in fixed-size chunks with a size cutoff, so a
+large file never sits in memory in one piece. Files are named after a hash
+of their content (``profile_<user id>_<sha256 prefix><ext>``). A name
+therefore never changes meaning, and ``/uploads`` can be cached by browsers
+and CDNs indefinitely.
+
+``UploadLimitMiddleware`` applies the same limit to the whole request
+body, before the form parser spools it.
+
+Square thumbnails (``<stem>_<size><ext>``) are generated after the response
+has been sent. Only once the avatar size exists is it recorded in
+``User.profile_thumbnail``; until then, or if it cannot be made, clients
+show the original. Without Pillow only the original is served. Run
+``python uploads.py`` to create missing thumbnails for existing files and
+record them.
+"""
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from fastapi.staticfiles import StaticFiles
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+import logs
+import models
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails are skipped without Pillow
+    Image = None
+
+UPLOAD_DIR = "uploads"
+MAX_PROFILE_IMAGE_BYTES = int(os.getenv("MAX_PROFILE_IMAGE_BYTES", str(5 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Multipart framing and the text fields sent alongside the image
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+# Routes taking a profile image, held to the size limit by UploadLimitMiddleware
+UPLOAD_ROUTES = {("PUT", "/api/users/me")}
+THUMBNAIL_SIZES = (64, 256)
+AVATAR_SIZE = 64  # used for the small avatars in event lists
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+logger = logs.get_logger("uploads")
+
+if not os.path.exists(UPLOAD_DIR):
+    os.makedirs(UPLOAD_DIR)
+
+
+def thumbnail_name(filename: str, size: int) -> str:
+    stem, extension = os.path.splitext(filename)
+    return f"{stem}_{size}{extension}"
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Profile image must be at most {MAX_PROFILE_IMAGE_BYTES // (1024 * 1024)} MB"
+    )
+
+
+def store_profile_image(source: BinaryIO, original_filename: str, user_id: int) -> str:
+    """Stream ``source`` into UPLOAD_DIR and return the stored file name.
+
+    Raises 413 once more than MAX_PROFILE_IMAGE_BYTES have been read; the
+    partial file is discarded.
+    """
+    extension = os.path.splitext(original_filename or "")[1].lower()
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload_")
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while True:
+                chunk = source.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_PROFILE_IMAGE_BYTES:
+                    raise _too_large()
+                digest.update(chunk)
+                buffer.write(chunk)
+        filename = f"profile_{user_id}_{digest.hexdigest()[:32]}{extension}"
+        os.replace(temp_path, os.path.join(UPLOAD_DIR, filename))
+        return filename
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def generate_thumbnails(filename: str) -> bool:
+    """Write the missing thumbnails of ``filename``; True if they all exist."""
+    if Image is None:
+        return False
+    path = os.path.join(UPLOAD_DIR, filename)
+    try:
+        with Image.open(path) as image:
+            image_format = image.format
+            for size in THUMBNAIL_SIZES:
+                thumbnail_path = os.path.join(UPLOAD_DIR, thumbnail_name(filename, size))
+                if os.path.exists(thumbnail_path):
+                    continue
+                thumbnail = image.copy()
+                thumbnail.thumbnail((size, size))
+                if image_format == "JPEG" and thumbnail.mode not in ("RGB", "L"):
+                    thumbnail = thumbnail.convert("RGB")
+                thumbnail.save(thumbnail_path, format=image_format)
+    except (OSError, ValueError) as e:
+        logger.warning("Could not create thumbnails for %s: %s", filename, e)
+        return False
+    return True
+
+
+def create_avatar(db: Session, user_id: int, filename: str) -> bool:
+    """Make ``filename``'s thumbnails and record the avatar on the user, if
+    the user still has that image. True if the user row changed; commits."""
+    if not generate_thumbnails(filename):
+        return False
+    result = db.execute(
+        update(models.User)
+        .where(models.User.id == user_id, models.User.profile_image == filename)
+        .values(profile_thumbnail=thumbnail_name(filename, AVATAR_SIZE))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()  # the update advanced the users stamp (see routers.auth)
+    return bool(result.rowcount)
+
+
+def remove_profile_image(filename: Optional[str]):
+    if not filename:
+        return
+    for name in [filename] + [thumbnail_name(filename, size) for size in THUMBNAIL_SIZES]:
+        path = os.path.join(UPLOAD_DIR, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class UploadLimitMiddleware:
+    """Pure ASGI middleware capping the request body of ``UPLOAD_ROUTES``.
+
+    FastAPI parses a form before the handler (or any dependency) runs, so
+    the size has to be checked here: a Content-Length over the limit is
+    answered with 413 without reading the body, and a body without one
+    (chunked) fails with 413 as soon as it goes over while being read.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in UPLOAD_ROUTES:
+            return await self.app(scope, receive, send)
+
+        limit = MAX_PROFILE_IMAGE_BYTES + UPLOAD_FORM_OVERHEAD
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            error = _too_large()
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code, headers={"Connection": "close"})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def receive_within_limit():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise _too_large()
+            return message
+
+        await self.app(scope, receive_within_limit, send)
+
+
+class UploadStaticFiles(StaticFiles):
+    """Serves uploads with long-lived immutable caching (names never get reused)."""
+
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code == 200:
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+if __name__ == "__main__":
+    import database
+
+    # Users whose image has no recorded avatar yet: uploads from before
+    # thumbnails were recorded, or whose thumbnails failed
+    with database.SessionLocal() as db:
+        pending = db.query(models.User.id, models.User.profile_image).filter(
+            models.User.profile_image != None, models.User.profile_thumbnail == None
+        ).all()
+        recorded = sum(create_avatar(db, user_id, filename) for user_id, filename in pending)
+    print(f"Recorded avatars for {recorded} of {len(pending)} users without one")
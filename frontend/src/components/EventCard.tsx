@@ -56,7 +56,7 @@ const EventCard: React.FC<EventCardProps> = ({ event, onRegister, onWithdraw, on
             Time:{' '}
             {format(new Date(event.event_time), 'h:mm a')}
           </p>
-          {event.max_participants ? (
+          {event.max_participants && event.max_participants > 0 ? (
             <p>
               Participants: {event.registrations?.length || 0}/{event.max_participants}
             </p>
@@ -82,7 +82,7 @@ const EventCard: React.FC<EventCardProps> = ({ event, onRegister, onWithdraw, on
             </button>
           )}
           {!isRegistered && onRegister && !event.is_cancelled && (
-            event.max_participants !== null && event.registrations && event.registrations.length >= event.max_participants ? (
+            event.max_participants && event.max_participants > 0 && event.registrations && event.registrations.length >= event.max_participants ? (
               <button
                 className="w-full inline-flex justify-center items-center px-4 py-2 border border-transparent text-sm font-medium rounded-md text-gray-700 bg-gray-100 cursor-not-allowed"
                 disabled
@@ -76,7 +76,7 @@ const Navbar: React.FC = () => {
                     <div className="w-10 h-10 rounded-full overflow-hidden cursor-pointer">
                       {user?.profile_image ? (
                         <img
-                          src={`http://localhost:8000/uploads/${user.profile_image}`}
+                          src={`http://localhost:8000/uploads/${user.profile_thumbnail || user.profile_image}`}
                           alt="Profile"
                           className="w-full h-full object-cover"
                         />
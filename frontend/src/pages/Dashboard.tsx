@@ -1,7 +1,8 @@
 import React, { useState, useEffect } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
-import { getEvents, registerForEvent, cancelEvent } from '../services/api';
-import { Event } from '../types';
+import { getEvents, registerForEvent, cancelEvent, EventFilters } from '../services/api';
+import { applyEventDelta, EventDelta, subscribeToEvents } from '../services/eventStream';
+import { Event, EventRegistration, TennisLevel } from '../types';
 import { format, isThisWeek, isThisMonth, addWeeks, startOfWeek, endOfWeek, isPast, parseISO } from 'date-fns';
 import { useAuth } from '../contexts/AuthContext';
 import LocationMap from '../components/LocationMap';
@@ -31,13 +32,28 @@ const Dashboard: React.FC = () => {
   const [showResults, setShowResults] = useState(false);
   const [selectedLocation, setSelectedLocation] = useState<{ lat: number; lon: number; display_name: string } | null>(null);
   const [mileRange, setMileRange] = useState(20);
+  // Applied by the server; dates are whole (UTC) days
+  const [filters, setFilters] = useState<EventFilters>({});
   const navigate = useNavigate();
 
   useEffect(() => {
     if (selectedLocation) {
       fetchEvents();
     }
-  }, [selectedLocation]);
+  }, [selectedLocation, filters]);
+
+  // Pushed events created outside the chosen dates stay out of the list
+  const inDateRange = (event: Event) => {
+    const day = event.event_date.slice(0, 10);
+    return (!filters.date_from || day >= filters.date_from) && (!filters.date_to || day <= filters.date_to);
+  };
+
+  // Other users' changes arrive as pushed deltas; cancelled events leave the list
+  const applyDelta = (delta: EventDelta) => {
+    setEvents(current => applyEventDelta(current, delta, inDateRange).filter(event => !event.is_cancelled));
+  };
+
+  useEffect(() => subscribeToEvents(applyDelta, () => fetchEvents()), [filters]);
 
   // Auto-hide toast after 3 seconds
   useEffect(() => {
@@ -52,7 +68,7 @@ const Dashboard: React.FC = () => {
   const fetchEvents = async () => {
     try {
       setLoading(true);
-      const data = await getEvents();
+      const data = await getEvents(filters);
       setEvents(data);
       setError(null);
     } catch (err) {
@@ -66,11 +82,15 @@ const Dashboard: React.FC = () => {
   const handleRegister = async (eventId: number) => {
     try {
       console.log('Attempting to register for event:', eventId);
-      await registerForEvent(eventId);
+      const registration = await registerForEvent(eventId) as EventRegistration;
       setToast({ message: 'Successfully registered for event!', type: 'success' });
-      // Force a complete refresh of events data
-      await fetchEvents();
-      console.log('Events after registration:', events);
+      // Patch the list from the response; the pushed copy of this change is a no-op
+      applyDelta({
+        type: 'registration_added',
+        event_id: eventId,
+        participant_count: registration.event?.participant_count ?? null,
+        registration,
+      });
     } catch (err) {
       console.error('Registration error:', err);
       setToast({ message: 'Failed to register for event', type: 'error' });
@@ -80,14 +100,23 @@ const Dashboard: React.FC = () => {
   const handleWithdraw = async (eventId: number) => {
     try {
       console.log('Attempting to withdraw from event:', eventId);
+      const registration = events
+        .find(event => event.id === eventId)
+        ?.registrations?.find(reg => reg.user?.id === user?.id);
       await registerForEvent(eventId, true);
       setToast({ message: 'Successfully withdrew from event!', type: 'success' });
       
-      // Force a complete refresh of events data
-      const updatedEvents = await getEvents();
-      setEvents(updatedEvents);
-      
-      console.log('Events after withdrawal:', updatedEvents);
+      if (registration) {
+        applyDelta({
+          type: 'registration_removed',
+          event_id: eventId,
+          registration_id: registration.id,
+          user_id: registration.user_id,
+          participant_count: null,
+        });
+      } else {
+        await fetchEvents();
+      }
     } catch (err) {
       console.error('Withdrawal error:', err);
       setToast({ message: 'Failed to withdraw from event', type: 'error' });
@@ -98,7 +127,7 @@ const Dashboard: React.FC = () => {
     try {
       await cancelEvent(eventId);
       setToast({ message: 'Event cancelled successfully!', type: 'success' });
-      fetchEvents();
+      applyDelta({ type: 'event_cancelled', event_id: eventId });
     } catch (err) {
       setToast({ message: 'Failed to cancel event', type: 'error' });
     }
@@ -153,6 +182,18 @@ const Dashboard: React.FC = () => {
     searchAddress(value);
   };
 
+  const updateFilter = <K extends keyof EventFilters>(key: K, value: EventFilters[K] | '') => {
+    setFilters(prev => {
+      const next = { ...prev };
+      if (value === '' || value === false) {
+        delete next[key];
+      } else {
+        next[key] = value as EventFilters[K];
+      }
+      return next;
+    });
+  };
+
   const toggleSection = (section: keyof typeof expandedSections) => {
     setExpandedSections(prev => ({
       ...prev,
@@ -302,6 +343,56 @@ const Dashboard: React.FC = () => {
               <span className="text-sm font-medium text-[#C4E538] whitespace-nowrap">{mileRange} miles</span>
             </div>
           </div>
+
+          {/* Event Filters */}
+          <div className="mt-4 flex flex-wrap gap-4 justify-center items-center text-sm text-gray-700">
+            <label className="flex items-center gap-2">
+              From
+              <input
+                type="date"
+                value={filters.date_from || ''}
+                max={filters.date_to}
+                onChange={(e) => updateFilter('date_from', e.target.value)}
+                className="px-2 py-1 border border-gray-300 rounded-md focus:outline-none focus:ring-[#C4E538] focus:border-[#C4E538]"
+              />
+            </label>
+            <label className="flex items-center gap-2">
+              To
+              <input
+                type="date"
+                value={filters.date_to || ''}
+                min={filters.date_from}
+                onChange={(e) => updateFilter('date_to', e.target.value)}
+                className="px-2 py-1 border border-gray-300 rounded-md focus:outline-none focus:ring-[#C4E538] focus:border-[#C4E538]"
+              />
+            </label>
+            <select
+              value={filters.organizer_level || ''}
+              onChange={(e) => updateFilter('organizer_level', e.target.value as TennisLevel | '')}
+              className="px-2 py-1 border border-gray-300 rounded-md focus:outline-none focus:ring-[#C4E538] focus:border-[#C4E538]"
+            >
+              <option value="">Any organiser level</option>
+              <option value="beginner">Beginner</option>
+              <option value="intermediate">Intermediate</option>
+              <option value="advanced">Advanced</option>
+            </select>
+            <label className="flex items-center gap-2">
+              <input
+                type="checkbox"
+                checked={!!filters.open_spots}
+                onChange={(e) => updateFilter('open_spots', e.target.checked)}
+              />
+              Open spots only
+            </label>
+            <label className="flex items-center gap-2">
+              <input
+                type="checkbox"
+                checked={!!filters.exclude_registered}
+                onChange={(e) => updateFilter('exclude_registered', e.target.checked)}
+              />
+              Hide events I joined
+            </label>
+          </div>
         </div>
 
         {/* Events List */}
@@ -383,7 +474,7 @@ const Dashboard: React.FC = () => {
                                 {registration.user?.profile_image ? (
                                   <img
                                     className="h-8 w-8 rounded-full"
-                                    src={`http://localhost:8000/uploads/${registration.user.profile_image}`}
+                                    src={`http://localhost:8000/uploads/${registration.user.profile_thumbnail || registration.user.profile_image}`}
                                     alt=""
                                   />
                                 ) : (
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { getMyEvents, cancelEvent, registerForEvent } from '../services/api';
-import { Event } from '../types';
+import { applyEventDelta, EventDelta, subscribeToEvents } from '../services/eventStream';
+import { Event, EventRegistration } from '../types';
 import { Link } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
 import { format } from 'date-fns';
@@ -8,8 +9,7 @@ import { useNavigate } from 'react-router-dom';
 import LocationMap from '../components/LocationMap';
 
 const ManageEvents: React.FC = () => {
-  const [activeEvents, setActiveEvents] = useState<Event[]>([]);
-  const [cancelledEvents, setCancelledEvents] = useState<Event[]>([]);
+  const [events, setEvents] = useState<Event[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [showCancelled, setShowCancelled] = useState(false);
@@ -17,11 +17,21 @@ const ManageEvents: React.FC = () => {
   const { user } = useAuth();
   const navigate = useNavigate();
   const [selectedEvent, setSelectedEvent] = useState<Event | null>(null);
+  const activeEvents = events.filter(event => !event.is_cancelled);
+  const cancelledEvents = events.filter(event => event.is_cancelled);
 
   useEffect(() => {
     fetchEvents();
   }, []);
 
+  // Registrations and cancellations are pushed as deltas; new events are
+  // added only when the user organises them
+  const applyDelta = (delta: EventDelta) => {
+    setEvents(current => applyEventDelta(current, delta, event => event.organizer_id === user?.id));
+  };
+
+  useEffect(() => subscribeToEvents(applyDelta, () => fetchEvents()), [user?.id]);
+
   // Auto-hide toast after 3 seconds
   useEffect(() => {
     if (toast) {
@@ -36,10 +46,7 @@ const ManageEvents: React.FC = () => {
     try {
       setLoading(true);
       const data = await getMyEvents();
-      const active = data.filter(event => !event.is_cancelled);
-      const cancelled = data.filter(event => event.is_cancelled);
-      setActiveEvents(active);
-      setCancelledEvents(cancelled);
+      setEvents(data);
       setError(null);
     } catch (err) {
       setError('Failed to fetch events');
@@ -52,7 +59,7 @@ const ManageEvents: React.FC = () => {
   const handleCancelEvent = async (eventId: number) => {
     try {
       await cancelEvent(eventId);
-      await fetchEvents();
+      applyDelta({ type: 'event_cancelled', event_id: eventId });
       setToast({ message: 'Event cancelled successfully', type: 'success' });
     } catch (err) {
       console.error('Error cancelling event:', err);
@@ -63,11 +70,23 @@ const ManageEvents: React.FC = () => {
   const handleWithdraw = async (eventId: number) => {
     try {
       console.log('Attempting to withdraw from event:', eventId);
+      const registration = events
+        .find(event => event.id === eventId)
+        ?.registrations?.find(reg => reg.user?.id === user?.id);
       const response = await registerForEvent(eventId, true);
       console.log('Withdrawal response:', response);
       setToast({ message: 'Successfully withdrew from event', type: 'success' });
-      // Refresh events to update the UI
-      await fetchEvents();
+      if (registration) {
+        applyDelta({
+          type: 'registration_removed',
+          event_id: eventId,
+          registration_id: registration.id,
+          user_id: registration.user_id,
+          participant_count: null,
+        });
+      } else {
+        await fetchEvents();
+      }
     } catch (error: any) {
       console.error('Failed to withdraw from event:', error);
       console.error('Error details:', {
@@ -86,9 +105,13 @@ const ManageEvents: React.FC = () => {
   const handleRegister = async (eventId: number) => {
     try {
       console.log('Attempting to register for event:', eventId);
-      await registerForEvent(eventId);
-      // Refresh events after registration
-      await fetchEvents();
+      const registration = await registerForEvent(eventId) as EventRegistration;
+      applyDelta({
+        type: 'registration_added',
+        event_id: eventId,
+        participant_count: registration.event?.participant_count ?? null,
+        registration,
+      });
       setToast({ message: 'Successfully registered for event!', type: 'success' });
     } catch (err: any) {
       console.error('Failed to register for event:', err);
@@ -378,7 +401,7 @@ const ManageEvents: React.FC = () => {
                           <div className="flex-shrink-0">
                             {registration.user?.profile_image ? (
                               <img
-                                src={`http://localhost:8000/uploads/${registration.user.profile_image}`}
+                                src={`http://localhost:8000/uploads/${registration.user.profile_thumbnail || registration.user.profile_image}`}
                                 alt={`${registration.user.first_name} ${registration.user.last_name}`}
                                 className="h-8 w-8 rounded-full"
                               />
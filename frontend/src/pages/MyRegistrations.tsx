@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
-import { getMyRegistrations, registerForEvent, getEvents } from '../services/api';
+import { getEventsAndRegistrations, registerForEvent } from '../services/api';
 import { EventRegistration, Event } from '../types';
 import { format } from 'date-fns';
 import LocationMap from '../components/LocationMap';
@@ -28,12 +28,10 @@ const MyRegistrations: React.FC = () => {
   const fetchRegistrations = async () => {
     try {
       setLoading(true);
-      console.log('Fetching all events...');
-      const allEvents = await getEvents();
+      console.log('Fetching events and registrations...');
+      // Events and the user's registrations in one batched request
+      const { events: allEvents, registrations: userRegistrations } = await getEventsAndRegistrations();
       console.log('Fetched all events:', allEvents);
-      
-      // Get user's registrations
-      const userRegistrations = await getMyRegistrations();
       console.log('Fetched user registrations:', userRegistrations);
       
       // Create a map of event IDs to registrations for quick lookup
@@ -11,12 +11,20 @@ const api = axios.create({
 });
 
 // Add request interceptor to add auth token
+// Responses to writes carry a signed X-Last-Write marker; sending it back
+// keeps this user's reads off a lagging read replica for a few seconds
+const WRITE_MARKER_KEY = 'lastWrite';
+
 api.interceptors.request.use(
   (config) => {
     const token = localStorage.getItem('token');
     if (token) {
       config.headers.Authorization = `Bearer ${token}`;
     }
+    const lastWrite = sessionStorage.getItem(WRITE_MARKER_KEY);
+    if (lastWrite) {
+      config.headers['X-Last-Write'] = lastWrite;
+    }
     return config;
   },
   (error) => {
@@ -27,7 +35,13 @@ api.interceptors.request.use(
 
 // Add response interceptor for better error handling
 api.interceptors.response.use(
-  (response) => response,
+  (response) => {
+    const lastWrite = response.headers['x-last-write'];
+    if (lastWrite) {
+      sessionStorage.setItem(WRITE_MARKER_KEY, lastWrite);
+    }
+    return response;
+  },
   (error) => {
     console.error('API Error:', {
       status: error.response?.status,
@@ -198,16 +212,38 @@ export const updateUser = async (data: UpdateUserData): Promise<User> => {
 };
 
 // Event endpoints
-export const getEvents = async (): Promise<Event[]> => {
+
+// Listings return at most 100 items per request and the next page's cursor
+// in X-Next-Cursor; follow it (from `cursor` if given) to the last page
+const getAllPages = async <T>(path: string, params: object = {}, cursor?: string): Promise<T[]> => {
+  const items: T[] = [];
+  do {
+    const response = await api.get<T[]>(path, { params: cursor ? { ...params, cursor } : params });
+    items.push(...response.data);
+    cursor = response.headers['x-next-cursor'] || undefined;
+  } while (cursor);
+  return items;
+};
+
+// Optional GET /api/events filters, applied by the server
+export interface EventFilters {
+  date_from?: string;
+  date_to?: string;
+  open_spots?: boolean;
+  organizer_level?: TennisLevel;
+  exclude_registered?: boolean;
+}
+
+export const getEvents = async (filters: EventFilters = {}): Promise<Event[]> => {
   try {
     console.log('Fetching events...');
-    const response = await api.get<Event[]>('/api/events');
-    console.log('Events response:', response.data);
+    const events = await getAllPages<Event>('/api/events/', filters);
+    console.log('Events response:', events);
     // Log each event's registrations
-    response.data.forEach(event => {
+    events.forEach(event => {
       console.log(`Event ${event.id} registrations:`, event.registrations);
     });
-    return response.data;
+    return events;
   } catch (error: any) {
     console.error('Get events error:', error);
     throw error;
@@ -216,8 +252,7 @@ export const getEvents = async (): Promise<Event[]> => {
 
 export const getMyEvents = async (): Promise<Event[]> => {
   try {
-    const response = await api.get<Event[]>('/api/events/my-events');
-    return response.data;
+    return await getAllPages<Event>('/api/events/my-events');
   } catch (error: any) {
     console.error('Get my events error:', error);
     throw error;
@@ -283,15 +318,70 @@ export const cancelEvent = async (eventId: number): Promise<void> => {
 export const getMyRegistrations = async (): Promise<EventRegistration[]> => {
   try {
     console.log('Fetching registrations...');
-    const response = await api.get<EventRegistration[]>('/api/events/my-registrations');
-    console.log('Received registrations:', response.data);
-    return response.data;
+    const registrations = await getAllPages<EventRegistration>('/api/events/my-registrations');
+    console.log('Received registrations:', registrations);
+    return registrations;
   } catch (error: any) {
     console.error('Get my registrations error:', error);
     throw error;
   }
 };
 
+// Several endpoints in one request (POST /api/batch), run in order
+export interface BatchOperation {
+  id?: string;
+  method?: 'GET' | 'POST' | 'DELETE';
+  path: string;
+  body?: unknown;
+  params?: Record<string, string | number | boolean>;
+  etag?: string;
+}
+
+export interface BatchResult<T = any> {
+  id?: string;
+  status: number;
+  headers: Record<string, string>;
+  body: T;
+}
+
+// A ticket for opening the live updates stream; valid for about a minute
+export const getStreamTicket = async (): Promise<string> => {
+  const response = await api.post<{ ticket: string; expires_in: number }>('/api/events/stream-ticket');
+  return response.data.ticket;
+};
+
+export const batch = async (requests: BatchOperation[]): Promise<BatchResult[]> => {
+  const response = await api.post<{ results: BatchResult[] }>('/api/batch', { requests });
+  return response.data.results;
+};
+
+const restOfPages = async <T>(path: string, first: BatchResult<T[]>): Promise<T[]> => {
+  const cursor = first.headers['x-next-cursor'];
+  return cursor ? [...first.body, ...(await getAllPages<T>(path, {}, cursor))] : first.body;
+};
+
+// The event listing and the user's registrations, loaded together
+export const getEventsAndRegistrations = async (): Promise<{ events: Event[]; registrations: EventRegistration[] }> => {
+  try {
+    const [events, registrations] = await batch([
+      { id: 'events', path: '/api/events/' },
+      { id: 'registrations', path: '/api/events/my-registrations' },
+    ]);
+    const failed = [events, registrations].find(result => result.status >= 400);
+    if (failed) {
+      throw failed.body;
+    }
+    // The batch carries the first page of each; fetch any further pages
+    return {
+      events: await restOfPages<Event>('/api/events/', events),
+      registrations: await restOfPages<EventRegistration>('/api/events/my-registrations', registrations),
+    };
+  } catch (error: any) {
+    console.error('Get events and registrations error:', error);
+    throw error;
+  }
+};
+
 export const cancelRegistration = async (registrationId: number): Promise<void> => {
   try {
     console.log('Canceling registration:', registrationId);
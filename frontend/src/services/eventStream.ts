@@ -0,0 +1,129 @@
+import { Event, EventRegistration } from '../types';
+import { getStreamTicket } from './api';
+
+const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
+const RECONNECT_DELAY_MS = 3000;
+
+// Changes pushed by GET /api/events/stream after each committed write
+export type EventDelta =
+  | { type: 'event_created'; event: Event }
+  | { type: 'event_cancelled'; event_id: number }
+  | { type: 'registration_added'; event_id: number; participant_count: number | null; registration: EventRegistration }
+  | { type: 'registration_removed'; event_id: number; registration_id: number; user_id: number; participant_count: number | null }
+  | { type: 'resync' };
+
+const withCount = (event: Event, participantCount: number | null): Partial<Event> => {
+  if (participantCount === null) {
+    return {};
+  }
+  return {
+    participant_count: participantCount,
+    // A cap of zero or less means unlimited, as on the server
+    available_spots: event.max_participants && event.max_participants > 0
+      ? Math.max(0, event.max_participants - participantCount)
+      : null,
+  };
+};
+
+// Apply a delta to a loaded list of events. `include` decides whether a newly
+// created event belongs in this list (e.g. only the user's own events).
+export const applyEventDelta = (
+  events: Event[],
+  delta: EventDelta,
+  include: (event: Event) => boolean = () => true
+): Event[] => {
+  switch (delta.type) {
+    case 'event_created':
+      if (!include(delta.event) || events.some(event => event.id === delta.event.id)) {
+        return events;
+      }
+      return [...events, delta.event].sort((a, b) => a.event_date.localeCompare(b.event_date) || a.id - b.id);
+    case 'event_cancelled':
+      return events.map(event => (event.id === delta.event_id ? { ...event, is_cancelled: true } : event));
+    case 'registration_added':
+      return events.map(event => {
+        if (event.id !== delta.event_id || event.registrations?.some(reg => reg.id === delta.registration.id)) {
+          return event;
+        }
+        return {
+          ...event,
+          ...withCount(event, delta.participant_count),
+          registrations: [...(event.registrations || []), delta.registration],
+        };
+      });
+    case 'registration_removed':
+      return events.map(event => {
+        if (event.id !== delta.event_id) {
+          return event;
+        }
+        return {
+          ...event,
+          ...withCount(event, delta.participant_count),
+          registrations: (event.registrations || []).filter(reg => reg.id !== delta.registration_id),
+        };
+      });
+    default:
+      return events;
+  }
+};
+
+// Listen for deltas. `onResync` is called when deltas may have been missed
+// (a reconnect, or the server dropping a backlog) and the list should be
+// reloaded. Returns a function that closes the stream.
+export const subscribeToEvents = (onDelta: (delta: EventDelta) => void, onResync: () => void): (() => void) => {
+  if (!localStorage.getItem('token') || typeof EventSource === 'undefined') {
+    return () => {};
+  }
+
+  let source: EventSource | null = null;
+  let retry: ReturnType<typeof setTimeout> | undefined;
+  let closed = false;
+  let opened = false;
+
+  const reconnect = () => {
+    if (!closed) {
+      retry = setTimeout(connect, RECONNECT_DELAY_MS);
+    }
+  };
+
+  // Stream tickets expire within a minute, so rather than letting EventSource
+  // retry with a stale one, every connection fetches a fresh ticket
+  const connect = async () => {
+    let ticket: string;
+    try {
+      ticket = await getStreamTicket();
+    } catch (error) {
+      reconnect();
+      return;
+    }
+    if (closed) {
+      return;
+    }
+    source = new EventSource(`${API_URL}/api/events/stream?ticket=${encodeURIComponent(ticket)}`);
+    source.onopen = () => {
+      if (opened) {
+        onResync();
+      }
+      opened = true;
+    };
+    source.onmessage = (message) => {
+      const delta: EventDelta = JSON.parse(message.data);
+      if (delta.type === 'resync') {
+        onResync();
+      } else {
+        onDelta(delta);
+      }
+    };
+    source.onerror = () => {
+      source?.close();
+      reconnect();
+    };
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(retry);
+    source?.close();
+  };
+};
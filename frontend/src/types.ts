@@ -11,6 +11,7 @@ export interface User {
   sex: Sex;
   tennis_level: TennisLevel;
   profile_image?: string;
+  profile_thumbnail?: string;
   created_at: string;
 }
 
@@ -56,6 +57,7 @@ export interface Event {
   is_cancelled: boolean;
   organizer_id: number;
   registrations?: EventRegistration[];
+  participant_count?: number;
   available_spots?: number | null;
 }
 
@@ -70,6 +72,7 @@ export interface EventRegistration {
     id: number;
     username: string;
     profile_image?: string;
+    profile_thumbnail?: string;
     first_name?: string;
     last_name?: string;
     tennis_level?: TennisLevel;